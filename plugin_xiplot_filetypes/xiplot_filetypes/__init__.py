@@ -1,26 +1,62 @@
 from io import BytesIO
+from pathlib import Path
 
 import pandas as pd
 
 
 def read_parquet():
-    return pd.read_parquet, ".parquet"
+    def read(data, columns=None):
+        return pd.read_parquet(data, columns=columns)
+
+    return read, ".parquet"
 
 
 def write_parquet():
     return pd.DataFrame.to_parquet, ".parquet", "application/octet-stream"
 
 
+def _arrow_source(data, mmap=False):
+    """Open files on disk (memory-mapped if `mmap`), otherwise read from the
+    file-like object.
+
+    A memory-mapped file must not be overwritten in place while the data is
+    referenced (reading it could crash the process), and on Windows it
+    cannot be replaced at all. Therefore files are only memory-mapped if the
+    caller asks for it, e.g. when the data is not kept in a cache.
+    """
+    import pyarrow as pa
+
+    if isinstance(data, (str, Path)):
+        if mmap:
+            return pa.memory_map(str(data), "r")
+        return pa.OSFile(str(data), "rb")
+    if isinstance(data, BytesIO):
+        return pa.BufferReader(data.getbuffer())
+    return pa.PythonFile(data, mode="r")
+
+
+def _arrow_to_pandas(table):
+    # Columns without nulls are zero-copy views of the (read or
+    # memory-mapped) data
+    return table.to_pandas(split_blocks=True)
+
+
 def read_feather():
     try:
-        df = pd.DataFrame()
-        ft = BytesIO()
-        df.reset_index().to_feather(ft)
-        pd.read_feather(ft)
+        import pyarrow.feather
     except ImportError:
         return
 
-    return pd.read_feather, ".feather"
+    def read(data, columns=None, mmap=False):
+        source = _arrow_source(data, mmap)
+        table = pyarrow.feather.read_table(
+            source, columns=columns, memory_map=False
+        )
+        if not mmap and isinstance(data, (str, Path)):
+            source.close()
+        return _arrow_to_pandas(table)
+
+    return read, ".feather", dict(mmap=True)
 
 
 def write_feather():
@@ -30,3 +66,42 @@ def write_feather():
         return
 
     return pd.DataFrame.to_feather, ".feather", "application/octet-stream"
+
+
+def read_arrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc
+    except ImportError:
+        return
+
+    def read(data, columns=None, mmap=False):
+        source = _arrow_source(data, mmap)
+        try:
+            table = pyarrow.ipc.open_file(source).read_all()
+        except pa.ArrowInvalid:
+            # Not the random access file format, try the streaming format
+            source.seek(0)
+            table = pyarrow.ipc.open_stream(source).read_all()
+        if not mmap and isinstance(data, (str, Path)):
+            source.close()
+        if columns is not None:
+            table = table.select(columns)
+        return _arrow_to_pandas(table)
+
+    return read, ".arrow", dict(mmap=True)
+
+
+def write_arrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc
+    except ImportError:
+        return
+
+    def write(df, file):
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        with pyarrow.ipc.new_file(file, table.schema) as writer:
+            writer.write_table(table)
+
+    return write, ".arrow", "application/vnd.apache.arrow.file"
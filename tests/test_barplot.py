@@ -7,6 +7,7 @@ from selenium.webdriver.common.keys import Keys
 
 from tests.util_test import render_plot, start_server
 from xiplot.plots.barplot import Barplot
+from xiplot.utils.auxiliary import CLUSTER_COLUMN_NAME
 
 render = Barplot.register_callbacks(
     dash.Dash(__name__), lambda x: x, lambda x: x
@@ -121,6 +122,23 @@ def test_teba004_set_order(dash_duo):
 
 def test_create_barplot():
     df = pd.DataFrame({"col1": [1, 2], "col2": [3, 4]})
-    output = render("col1", "col2", ["all"], "reldiff", 1, df, pd.DataFrame())
+    output = render("col1", "col2", ["all"], "reldiff", df, pd.DataFrame())
     fig = output[0]
     assert str(type(fig)) == "<class 'plotly.graph_objs._figure.Figure'>"
+
+
+def test_barplot_lists():
+    df = pd.DataFrame(
+        {"col1": [["a", "b"], ["b"], [], ["c", "a"]], "col2": [1, 2, 3, 4]}
+    )
+    aux = pd.DataFrame(
+        {CLUSTER_COLUMN_NAME: pd.Categorical(["c1", "c1", "c2", "c2"])}
+    )
+    fig = render("col1", "frequency", ["all"], "total", df, aux)[0]
+    assert list(fig.layout.xaxis.categoryarray) == ["b", "a", "c"]
+    assert list(fig.data[0].y) == [0.5, 0.75, 0.5]
+
+    fig = render("col1", "col2", ["c1", "c2"], "reldiff", df, aux)[0]
+    assert list(fig.layout.xaxis.categoryarray) == ["a", "b", "c"]
+    assert [t.name for t in fig.data] == ["c1", "c2"]
+    assert list(fig.data[0].y) == [1.0, 1.5]
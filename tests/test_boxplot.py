@@ -54,7 +54,6 @@ def test_boxplot_create():
             "col2",
             plot,
             "Clusters",
-            0,
             pd.DataFrame({"col1": [1, 2], "col2": [3, 4]}),
             pd.DataFrame(index=range(2)),
             None,
@@ -2,8 +2,27 @@ from io import BytesIO
 
 import numpy as np
 import pandas as pd
+import pytest
 
-from xiplot.utils.dataframe import read_only_dataframe, write_functions
+from xiplot.utils.dataframe import (
+    DATAFRAME_CACHE,
+    DATAFRAME_FORMATS,
+    builtin_read_functions,
+    builtin_write_functions,
+    compact_dataframe,
+    read_csv_chunked,
+    read_dataframe_from_path_cached,
+    read_dataframe_with_extension,
+    read_ndjson,
+    read_only_dataframe,
+    read_progress,
+    set_dataframe_cache_memory,
+    sniff_json_orient,
+    write_dataframe_and_metadata,
+    write_functions,
+    write_only_dataframe,
+)
+from xiplot.utils.registry import FormatRegistry
 
 
 def test_read_write():
@@ -33,3 +52,377 @@ def test_read_write():
         bytes2 = write(fn, read1)
         read2 = read_only_dataframe(bytes2, "b" + ext)
         assert read1.equals(read2), "Is not consistent: " + ext
+
+
+def test_read_cached(tmp_path):
+    path = tmp_path / "data.csv"
+    pd.DataFrame(dict(x=np.arange(5), y=np.arange(5) * 2)).to_csv(
+        path, index=False
+    )
+    set_dataframe_cache_memory(1024 * 1024)
+
+    df1, aux1, meta1 = read_dataframe_from_path_cached(path, path.name)
+    assert len(DATAFRAME_CACHE) == 1
+    df1["x"] = 0
+    meta1["plots"] = {}
+    df2, aux2, meta2 = read_dataframe_from_path_cached(path, path.name)
+    assert len(DATAFRAME_CACHE) == 1
+    assert df2["x"].tolist() == list(range(5))
+    assert "plots" not in meta2 and meta2["filename"] == "data.csv"
+
+    pd.DataFrame(dict(x=np.arange(7))).to_csv(path, index=False)
+    df3, _, _ = read_dataframe_from_path_cached(path, path.name)
+    assert df3.shape == (7, 1)
+
+    set_dataframe_cache_memory(0)
+    read_dataframe_from_path_cached(path, path.name)
+    assert len(DATAFRAME_CACHE) == 0
+    set_dataframe_cache_memory(256 * 1024 * 1024)
+
+
+def test_read_csv_chunked():
+    orig = pd.DataFrame(
+        dict(
+            x=np.arange(100),
+            y=np.arange(100) / 4,
+            s=["a"] * 10 + [str(i) for i in range(90)],
+        )
+    )
+    data = BytesIO()
+    orig.to_csv(data, index=False)
+    size = len(data.getvalue())
+    data.seek(0)
+
+    progress = []
+    with read_progress(lambda *args: progress.append(args)):
+        df = read_csv_chunked(data, chunksize=16)
+    assert df.equals(orig)
+    assert len(progress) == 7
+    assert progress[-1] == (100, size, size)
+
+    # Columns that are numbers in some chunks and text in others
+    orig = pd.DataFrame(
+        dict(
+            n=[str(i) for i in range(90)] + ["b"] * 10,
+            b=[True] * 50 + [None] * 10 + [False] * 40,
+        )
+    )
+    data = BytesIO()
+    orig.to_csv(data, index=False)
+    data.seek(0)
+    df = read_csv_chunked(data, chunksize=16)
+    data.seek(0)
+    assert df.equals(pd.read_csv(data, low_memory=False))
+    assert df["n"].tolist() == orig["n"].tolist()
+
+
+def test_compact_dataframe():
+    orig = pd.DataFrame(
+        dict(
+            i=np.arange(1000),
+            f=np.arange(1000) / 4,
+            r=np.linspace(0, 1, 1000),
+            c=["a", "b"] * 500,
+            s=[f"s{i}" for i in range(1000)],
+        )
+    )
+    df, saved = compact_dataframe(orig)
+    assert df.dtypes["i"] == np.int16
+    assert df.dtypes["f"] == np.float32
+    assert df.dtypes["r"] == np.float64
+    assert df.dtypes["c"] == "category"
+    assert df.dtypes["s"] == object
+    assert saved == (
+        orig.memory_usage(deep=True).sum() - df.memory_usage(deep=True).sum()
+    )
+    assert saved > 0
+    assert np.array_equal(df["f"], orig["f"])
+
+    df, _ = compact_dataframe(orig, rtol=1e-6)
+    assert df.dtypes["r"] == np.float32
+    assert np.allclose(df["r"], orig["r"], rtol=1e-6)
+
+    # Columns with unhashable values are left as they are
+    orig = pd.DataFrame(dict(l=[[1, 2], [3]] * 500, d=[{"a": 1}] * 1000))
+    df, _ = compact_dataframe(orig)
+    assert df.dtypes["l"] == object
+    assert df.dtypes["d"] == object
+    assert df["l"][1] == [3]
+
+
+def test_read_columns():
+    orig = pd.DataFrame(dict(x=np.arange(5), y=np.arange(5) * 2, z=["a"] * 5))
+    for fn, ext, mime in write_functions():
+        if "example" in mime:
+            continue
+        data = BytesIO()
+        fn(orig, data)
+        data.seek(0)
+        df = read_only_dataframe(data, "a" + ext, ["x", "z"])
+        assert sorted(df.columns) == ["x", "z"], ext
+        assert df["x"].tolist() == list(range(5)), ext
+
+
+def test_read_mmap(tmp_path):
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return
+    if not any(r.mmap for r in DATAFRAME_FORMATS.readers(".arrow")):
+        return
+    orig = pd.DataFrame(dict(x=np.arange(10000, dtype=float)))
+    path = tmp_path / "data.arrow"
+    with open(path, "wb") as file:
+        write_only_dataframe(orig, path.name, file)
+
+    # Files are read into memory, unless memory-mapping is asked for
+    allocated = pa.total_allocated_bytes()
+    df = read_only_dataframe(path, path.name)
+    assert pa.total_allocated_bytes() - allocated >= orig["x"].nbytes
+    assert df.equals(orig)
+    allocated = pa.total_allocated_bytes()
+    df2 = read_only_dataframe(path, path.name, mmap=True)
+    assert pa.total_allocated_bytes() == allocated
+    assert df2.equals(orig)
+
+
+def test_bundle_compression():
+    orig = pd.DataFrame(dict(x=np.arange(50), y=[f"a{i}" for i in range(50)]))
+    aux = pd.DataFrame(dict(Xiplot_selected=np.arange(50) > 25))
+    for codec in ["gz", "bz2", "xz", "none"]:
+        for _, ext, mime in write_functions():
+            if "example" in mime:
+                continue
+            file = BytesIO()
+            name, _ = write_dataframe_and_metadata(
+                orig, aux, {}, "data" + ext, file, compression=codec
+            )
+            file.seek(0)
+            df, aux2, meta = read_dataframe_with_extension(file, name)
+            assert df.equals(orig), (codec, ext)
+            assert aux2.equals(aux), (codec, ext)
+            assert meta["filename"] == "data" + ext
+
+
+def test_upload_route(tmp_path, monkeypatch):
+    import dash
+
+    from xiplot.utils import upload
+
+    monkeypatch.setattr(upload, "UPLOAD_DIR", tmp_path)
+    monkeypatch.setattr(upload, "UPLOADS", dict())
+    monkeypatch.setattr(upload, "UPLOAD_URL_PREFIX", None)
+    DATAFRAME_CACHE.clear()
+
+    app = dash.Dash(__name__)
+    app.layout = dash.html.Div()
+    upload.register_upload_route(app)
+    assert upload.is_upload_route_enabled()
+    client = app.server.test_client()
+
+    df = pd.DataFrame({"a": np.arange(1000), "b": np.arange(1000) / 4})
+    data = df.to_csv(index=False).encode()
+    url = upload.UPLOAD_URL_PREFIX + "test-upload-1"
+
+    assert client.post(url + "?offset=100", data=data[:100]).status_code == 409
+    assert client.post(url, data=data[:100]).status_code == 200
+    assert client.post(url + "?offset=0", data=data[:100]).status_code == 409
+    assert client.post(url + "?offset=100", data=data[100:]).status_code == 200
+    response = client.post(url + "/complete?filename=data.csv")
+    assert response.status_code == 200
+    digest = response.json["hash"]
+    assert response.json["size"] == len(data)
+
+    df2, _, meta = upload.read_uploaded_dataframe(
+        tmp_path / "data.csv", "data.csv", digest
+    )
+    assert df.equals(df2)
+    assert meta["filename"] == "data.csv"
+    assert list(tmp_path.iterdir()) == []
+
+    # The same content is not parsed again
+    calls = []
+    monkeypatch.setattr(
+        "xiplot.utils.dataframe.read_dataframe_with_extension",
+        lambda *args: calls.append(args),
+    )
+    url = upload.UPLOAD_URL_PREFIX + "test-upload-2"
+    client.post(url, data=data)
+    response = client.post(url + "/complete?filename=data.csv")
+    assert response.json["hash"] == digest
+    df3, _, _ = upload.read_uploaded_dataframe(
+        tmp_path / "data.csv", "data.csv", digest
+    )
+    assert df.equals(df3)
+    assert calls == []
+    assert list(tmp_path.iterdir()) == []
+
+    # Failed parses are not kept after they expire
+    def fail(*args):
+        raise ValueError("broken")
+
+    monkeypatch.setattr(upload, "PARSES", dict())
+    monkeypatch.setattr(upload, "UPLOAD_TTL", -1.0)
+    monkeypatch.setattr(
+        "xiplot.utils.dataframe.read_dataframe_with_extension", fail
+    )
+    url = upload.UPLOAD_URL_PREFIX + "test-upload-3"
+    client.post(url, data=b"broken")
+    response = client.post(url + "/complete?filename=broken.csv")
+    assert response.status_code == 200
+    key = ("upload", response.json["hash"], "broken.csv")
+    with pytest.raises(ValueError):
+        upload.PARSES[key][0].result()
+    assert upload.PARSES[key][1] < float("inf")
+    upload.expire_uploads()
+    assert upload.PARSES == dict()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_format_registry():
+    calls = []
+
+    def read_plugin():
+        calls.append("read")
+        return (lambda data: pd.DataFrame()), ".test", dict(mmap=True)
+
+    def missing_plugin():
+        calls.append("missing")
+
+    plugins = {
+        "read": [("test", "", read_plugin), ("-", "", missing_plugin)],
+        "write": [],
+    }
+
+    def get_plugins(kind):
+        return plugins[kind]
+
+    registry = FormatRegistry(
+        get_plugins, builtin_read_functions, builtin_write_functions
+    )
+    assert registry.read_extensions() == [
+        ".test",
+        ".csv",
+        ".json",
+        ".ndjson",
+        ".jsonl",
+    ]
+    assert registry.write_extensions() == [".csv", ".json"]
+    registry.readers(".test")
+    registry.readers()
+    assert calls == ["read", "missing"]
+
+    reader = registry.readers(".test")[0]
+    assert reader.name == "test"
+    assert reader.mmap and not reader.columns and not reader.streaming
+    csv = registry.readers(".csv")[0]
+    assert csv.columns and csv.streaming
+    assert registry.readers(".xyz") == []
+    assert registry.writers(".json")[0].mime == "application/json"
+
+    # Reloading the plugins rebuilds the registry
+    plugins = {"read": [], "write": []}
+    assert ".test" not in registry.read_extensions()
+    registry.invalidate()
+    registry.readers()
+    assert calls == ["read", "missing"]
+
+
+def test_read_json_orients():
+    df = pd.DataFrame({"a": [1, 2, 3], "b": ["x", "y", "z"], "c": [0.5] * 3})
+    for orient, expected in [
+        ("split", "split"),
+        ("columns", "columns"),
+        ("records", "records"),
+        ("values", "values"),
+        ("table", "table"),
+    ]:
+        data = df.to_json(orient=orient).encode()
+        assert sniff_json_orient(data[:32]) == expected, orient
+        df2 = read_only_dataframe(BytesIO(data), "data.json")
+        assert df2.shape == df.shape, orient
+        assert df2.iloc[:, 1].tolist() == df["b"].tolist(), orient
+
+    # A column called "data" in the columns orient
+    data = pd.DataFrame({"data": [1, 2]}).to_json(orient="columns").encode()
+    assert sniff_json_orient(data) == "columns"
+    assert read_only_dataframe(BytesIO(data), "a.json")["data"].tolist() == [
+        1,
+        2,
+    ]
+
+    data = df.to_json(orient="records", lines=True).encode()
+    for ext in [".ndjson", ".jsonl"]:
+        df2 = read_only_dataframe(BytesIO(data), "data" + ext)
+        assert df.equals(df2)
+    progress = []
+    with read_progress(lambda *args: progress.append(args)):
+        df2 = read_ndjson(BytesIO(data), ["c", "a"], chunksize=2)
+    assert df[["c", "a"]].equals(df2)
+    assert progress[-1] == (3, len(data), len(data))
+
+
+def test_read_json_orjson(monkeypatch):
+    from xiplot.utils import dataframe
+
+    df = pd.DataFrame(
+        {
+            "f": [1.0, 2.0, 3.0],
+            "b": [True, None, False],
+            "created_at": ["2020-01-01", "2020-01-02", None],
+            "l": [[1], [2, 3], []],
+            "s": ["1", "2", "3"],
+            "2": ["x", "y", "z"],
+        }
+    )
+    data = BytesIO()
+    dataframe.write_json(df, data)
+    data = data.getvalue()
+    df1 = dataframe.parse_json(data, "split")
+    monkeypatch.setattr(dataframe, "get_json_loads", lambda: None)
+    df2 = dataframe.parse_json(data, "split")
+    assert df1.dtypes.to_dict() == df2.dtypes.to_dict()
+    assert df1.equals(df2)
+
+
+def test_prefetch(tmp_path, monkeypatch):
+    from xiplot.utils.prefetch import Prefetch, PrefetchCancelled, Prefetcher
+
+    DATAFRAME_CACHE.clear()
+    df = pd.DataFrame({"a": np.arange(1000), "b": np.arange(1000) / 4})
+    path = tmp_path / "data.csv"
+    df.to_csv(path, index=False)
+
+    prefetcher = Prefetcher()
+    assert prefetcher.prefetch(path)
+    assert prefetcher.prefetch(path)
+    progress = []
+    prefetcher.wait(path, lambda *args: progress.append(args))
+    assert len(prefetcher.prefetches) == 0
+
+    # The prefetched file is read from the cache
+    monkeypatch.setattr(
+        "xiplot.utils.dataframe.read_dataframe_with_extension", None
+    )
+    df2, _, _ = read_dataframe_from_path_cached(path, path.name)
+    assert df.equals(df2)
+    # Cached files are not prefetched again
+    assert not prefetcher.prefetch(path)
+
+    # A cancelled prefetch stops at the next progress report
+    monkeypatch.undo()
+    DATAFRAME_CACHE.clear()
+    prefetch = Prefetch()
+    prefetch.cancelled.set()
+    prefetcher._run(path, prefetch)
+    assert isinstance(prefetch.future.exception(), PrefetchCancelled)
+    assert len(DATAFRAME_CACHE) == 0
+
+    # Prefetches are cancelled once nobody has the file selected
+    prefetcher.prefetches[str(path)] = prefetch = Prefetch()
+    prefetch.selections = 2
+    prefetcher.cancel(path)
+    assert not prefetch.cancelled.is_set()
+    prefetcher.cancel(path)
+    assert prefetch.cancelled.is_set()
+    assert len(prefetcher.prefetches) == 0
@@ -1,4 +1,5 @@
 import dash
+import numpy as np
 import pandas as pd
 from selenium.webdriver.common.by import By
 
@@ -9,12 +10,14 @@ from tests.util_test import (
     start_server,
 )
 from xiplot.plots.distplot import Distplot
-from xiplot.utils.auxiliary import get_selected
+from xiplot.utils.auxiliary import CLUSTER_COLUMN_NAME, get_selected
+from xiplot.utils.density import RUG_MAX_POINTS
 
 (
     render,
     handle_hover_events,
     handle_click_events,
+    render_overlay,
 ) = Distplot.register_callbacks(dash.Dash(__name__), lambda x: x, lambda x: x)
 
 
@@ -50,7 +53,6 @@ def test_distplot_create():
     fig = render(
         "col1",
         "Clusters",
-        0,
         pd.DataFrame({"col1": [1, 2], "col2": [3, 4]}),
         pd.DataFrame(index=range(2)),
         None,
@@ -69,3 +71,23 @@ def test_distplot_click():
 def test_distplot_hover():
     hover = [{"points": [{"customdata": 1}]}]
     assert handle_hover_events(hover)[0] == 1
+
+
+def test_distplot_kde():
+    n = RUG_MAX_POINTS * 4
+    df = pd.DataFrame({"col1": np.random.default_rng(0).normal(size=n)})
+    aux = pd.DataFrame(
+        {CLUSTER_COLUMN_NAME: pd.Categorical(["c1", "c2"] * (n // 2))}
+    )
+    fig = render("col1", CLUSTER_COLUMN_NAME, df, aux, None)
+    assert [t.name for t in fig.data] == ["c1", "c2", "c1", "c2"]
+    x, y = fig.data[0].x, fig.data[0].y
+    assert abs(np.sum(y) * (x[1] - x[0]) - 1.0) < 0.01
+    values = df["col1"][::2]
+    assert x[0] == values.min() and x[-1] == values.max()
+
+    # The rug is downsampled, but keeps the rows as customdata
+    rows = np.asarray(fig.data[2].customdata)
+    assert len(rows) == RUG_MAX_POINTS
+    assert all(rows % 2 == 0)
+    assert all(fig.data[2].x == df["col1"][rows])
@@ -4,8 +4,10 @@ import pandas as pd
 
 try:
     from xiplot_filetypes import (
+        read_arrow,
         read_feather,
         read_parquet,
+        write_arrow,
         write_feather,
         write_parquet,
     )
@@ -17,8 +19,10 @@ except ImportError:
         0, str(Path(__file__).parent.parent / "plugin_xiplot_filetypes")
     )
     from xiplot_filetypes import (
+        read_arrow,
         read_feather,
         read_parquet,
+        write_arrow,
         write_feather,
         write_parquet,
     )
@@ -38,3 +42,26 @@ def test_parquet():
     write_parquet()[0](df, io)
     df2 = read_parquet()[0](io)
     assert df.equals(df2)
+
+
+def test_arrow():
+    df = pd.DataFrame({"a": [1, 2, 3], "b": ["a", "b", "c"]})
+    io = BytesIO()
+    write_arrow()[0](df, io)
+    df2 = read_arrow()[0](io)
+    assert df.equals(df2)
+
+
+def test_columns(tmp_path):
+    df = pd.DataFrame({"a": [1, 2, 3], "b": ["a", "b", "c"], "c": [0.5] * 3})
+    for read, write in [
+        (read_arrow, write_arrow),
+        (read_feather, write_feather),
+        (read_parquet, write_parquet),
+    ]:
+        fn, ext = read()[:2]
+        path = tmp_path / ("data" + ext)
+        with open(path, "wb") as file:
+            write()[0](df, file)
+        df2 = fn(path, columns=["c", "a"])
+        assert df[["c", "a"]].equals(df2), ext
@@ -1,16 +1,18 @@
 import time
 
 import dash
+import numpy as np
 import pandas as pd
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 
 from tests.util_test import render_plot, start_server
 from xiplot.plots.histogram import Histogram
+from xiplot.utils.auxiliary import CLUSTER_COLUMN_NAME, SELECTED_COLUMN_NAME
 
-render = Histogram.register_callbacks(
+render, render_overlay = Histogram.register_callbacks(
     dash.Dash(__name__), lambda x: x, lambda x: x
-)[0]
+)
 
 
 def test_tehi001_render_histogram(dash_duo):
@@ -67,7 +69,36 @@ def test_tehi003_clear_clusters(dash_duo):
 
 def test_create_histogram():
     df = pd.DataFrame({"col1": [1, 2], "col2": [3, 4]})
-    output = render("col1", "all", 1, df, pd.DataFrame())
+    output = render("col1", "all", df, pd.DataFrame())
     fig = output
 
     assert str(type(fig)) == "<class 'plotly.graph_objs._figure.Figure'>"
+
+
+def test_histogram_overlay():
+    df = pd.DataFrame({"col1": [1, 2, 3], "col2": [3, 4, 5]})
+    aux = pd.DataFrame({SELECTED_COLUMN_NAME: [True, False, True]})
+
+    fig = render("col1", "all", df, aux)
+    assert len(fig.layout.shapes) == 0
+
+    overlay = render_overlay("col1", 1, aux, None, df)
+    assert [s["x0"] for s in overlay["shapes"]] == [2, 1, 3]
+    assert overlay["traces"] == []
+
+
+def test_histogram_bins():
+    df = pd.DataFrame({"col1": [1, 2, 2, 3, 3, 3, np.nan]})
+    aux = pd.DataFrame(
+        {CLUSTER_COLUMN_NAME: pd.Categorical(["c1"] * 3 + ["c2"] * 4)}
+    )
+    fig = render("col1", ["all", "c2"], df, aux)
+    assert [t.name for t in fig.data] == ["all", "c2"]
+    assert list(fig.data[0].x) == [1, 2, 3]
+    assert list(fig.data[0].y) == [1 / 6, 2 / 6, 3 / 6]
+    assert list(fig.data[1].y) == [0, 0, 1]
+
+    # Other data with the same size and range does not reuse the bins
+    df = pd.DataFrame({"col1": [1, 1.5, 1.5, 3, 3, 3, np.nan]})
+    fig = render("col1", ["all"], df, aux)
+    assert list(fig.data[0].x) != [1, 2, 3]
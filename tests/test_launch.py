@@ -9,3 +9,31 @@ def test_dash001_launch(dash_duo):
     dash_duo.wait_for_page()
 
     assert dash_duo.get_logs() == [], "browser console should contain no error"
+
+
+def test_store_stats_route(tmp_path, monkeypatch):
+    from xiplot.utils import auxiliary, catalog, lazy
+
+    # The setup changes these globals
+    for module, name in [
+        (auxiliary, "AUX_SERVER_SIDE"),
+        (auxiliary, "AUX_BASES"),
+        (lazy, "LAZY_LOADING"),
+        (catalog, "CATALOG_DIR"),
+    ]:
+        monkeypatch.setattr(module, name, getattr(module, name))
+
+    # The statistics are only served when asked for
+    for cache_stats in [False, True]:
+        app = setup_xiplot_dash_app(
+            unsafe_local_server=True,
+            data_dir="data",
+            cache_dir=tmp_path,
+            cache_stats=cache_stats,
+        )
+        response = app.server.test_client().get("/_xiplot/store-stats")
+        stats = response.get_json(silent=True)
+        if cache_stats:
+            assert stats["entries"] == 0 and "cache_dir" not in stats
+        else:
+            assert stats is None
@@ -9,12 +9,13 @@ from tests.util_test import (
     start_server,
 )
 from xiplot.plots.lineplot import Lineplot
-from xiplot.utils.auxiliary import get_selected
+from xiplot.utils.auxiliary import SELECTED_COLUMN_NAME, get_selected
 
 (
     render,
     handle_hover_events,
     handle_click_events,
+    render_overlay,
 ) = Lineplot.register_callbacks(dash.Dash(__name__), lambda x: x, lambda x: x)
 
 
@@ -51,7 +52,6 @@ def test_lineplot_create():
         "col1",
         "col2",
         "Clusters",
-        0,
         pd.DataFrame({"col1": [1, 2], "col2": [3, 4]}),
         pd.DataFrame(index=range(2)),
         None,
@@ -70,3 +70,11 @@ def test_lineplot_click():
 def test_lineplot_hover():
     hover = [{"points": [{"customdata": [1]}]}]
     assert handle_hover_events(hover)[0] == 1
+
+
+def test_lineplot_overlay():
+    df = pd.DataFrame({"col1": [1, 2, 3], "col2": [3, 4, 5]})
+    aux = pd.DataFrame({SELECTED_COLUMN_NAME: [True, False, False]})
+    overlay = render_overlay("col1", "col2", 2, aux, None, df)
+    assert len(overlay["shapes"]) == 2
+    assert list(overlay["traces"][0]["x"]) == [1]
@@ -1,19 +1,27 @@
 import time
 
 import dash
+import numpy as np
 import pandas as pd
+from dash.exceptions import PreventUpdate
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 
 from tests.util_test import render_plot, start_server
 from xiplot.plots.scatterplot import Scatterplot
-from xiplot.utils.auxiliary import get_clusters, get_selected
+from xiplot.utils.auxiliary import (
+    SELECTED_COLUMN_NAME,
+    get_clusters,
+    get_selected,
+)
+from xiplot.utils.scatterplot import set_scatter_aggregation
 
 (
     tmp,
     handle_click_events,
     handle_hover_events,
     handle_cluster_drawing,
+    render_overlay,
 ) = Scatterplot.register_callbacks(
     dash.Dash(__name__), lambda x: x, lambda x: x
 )
@@ -106,7 +114,7 @@ def test_create_scatterplot():
 
 
 def test_handle_click_events():
-    click = [{"points": [{"customdata": [{"index": 0}]}]}]
+    click = [{"points": [{"customdata": [0]}]}]
     output = handle_click_events(click, pd.DataFrame(index=range(2)))
 
     aux = output["aux"]
@@ -119,7 +127,7 @@ def test_handle_click_events():
 
 
 def test_handle_hover_events():
-    hover = [{"points": [{"customdata": [{"index": 1}]}]}]
+    hover = [{"points": [{"customdata": [1]}]}]
     output = handle_hover_events(hover)
 
     hovered_row = output["hover_store"]
@@ -130,8 +138,61 @@ def test_handle_hover_events():
 
 
 def test_handle_cluster_drawing():
-    selected_points = [{"points": [{"customdata": [{"index": 1}]}]}]
+    selected_points = [{"points": [{"customdata": [1]}]}]
     aux = handle_cluster_drawing(
         selected_points, pd.DataFrame(index=range(2)), "c1", False
     )
     assert all(get_clusters(aux) == ["c2", "c1"])
+
+
+def test_aggregate_scatterplot():
+    df = pd.DataFrame({"col1": np.arange(100.0), "col2": np.arange(100.0)})
+    aux = pd.DataFrame({SELECTED_COLUMN_NAME: [i == 3 for i in range(100)]})
+    try:
+        set_scatter_aggregation(50, bins=8)
+        fig = tmp("col1", "col2", None, None, 0, df, aux, None)
+        assert len(fig.data) == 1
+        assert fig.data[0].type == "heatmap"
+        assert fig.data[0].text.sum() == 100
+        overlay = render_overlay("col1", "col2", aux, None, None, df)
+        assert overlay["traces"][0]["customdata"][0][0] == 3
+        assert overlay["selected"]["rows"] == [3]
+
+        zoom = {"xaxis.range[0]": 9.5, "xaxis.range[1]": 29.5}
+        fig = tmp("col1", "col2", None, None, 0, df, aux, None, zoom)
+        assert fig.data[0].type == "scattergl"
+        assert len(fig.data[0].x) == 20
+        assert fig.data[0].customdata[0][0] == 10
+        overlay = render_overlay("col1", "col2", aux, None, zoom, df)
+        assert "traces" not in overlay
+    finally:
+        set_scatter_aggregation()
+
+
+def test_scatterplot_check_relayout():
+    plot = {"type": "scatterplot", "index": 0}
+    zoom = {"xaxis.range[0]": 9.5, "xaxis.range[1]": 29.5}
+    for relayout, aggregated in [({"autosize": True}, None), (zoom, False)]:
+        try:
+            Scatterplot.check_relayout(plot, relayout, aggregated)
+            assert False, (relayout, aggregated)
+        except PreventUpdate:
+            pass
+    assert Scatterplot.check_relayout(plot, zoom, True) == zoom
+    assert Scatterplot.check_relayout(plot, zoom, None) == zoom
+    x_axis = Scatterplot.get_id(0, "x_axis_dropdown")
+    assert Scatterplot.check_relayout(x_axis, zoom, True) is None
+
+
+def test_scatterplot_overlay():
+    df = pd.DataFrame({"col1": [1, 2, 3], "col2": [3, 4, 5]})
+    aux = pd.DataFrame({SELECTED_COLUMN_NAME: [False, True, True]})
+    overlay = render_overlay("col1", "col2", aux, None, None, df)
+    assert overlay["selected"]["rows"] == [1, 2]
+    assert "traces" not in overlay
+
+    # The selection is not part of the base figure
+    fig = tmp("col1", "col2", None, None, 0, df, aux, None)
+    assert fig.data[0].selectedpoints is None
+    fig = Scatterplot.render(df, aux, "col1", "col2")
+    assert list(fig.data[0].selectedpoints) == [1, 2]
@@ -1,8 +1,37 @@
+import os
+import time
+
+import numpy as np
 import pandas as pd
 
-from xiplot.utils.auxiliary import decode_aux, encode_aux, toggle_selected
+from xiplot.utils.auxiliary import (
+    AUX_CACHE,
+    aux_content,
+    decode_aux,
+    encode_aux,
+    get_clusters,
+    get_selected,
+    merge_df_aux,
+    pack_bitmap,
+    patch_aux,
+    set_aux_server_side,
+    toggle_selected,
+    unpack_bitmap,
+    update_selected,
+)
+from xiplot.utils.cache import LRUCache
 from xiplot.utils.components import ColumnDropdown
+from xiplot.utils.dataframe import get_numeric_columns
+from xiplot.utils.lazy import LazyDataFrame, read_lazy_dataframe
+from xiplot.utils.overlay import apply_overlay, create_overlay
 from xiplot.utils.regex import dropdown_regex, get_columns_by_regex
+from xiplot.utils.store import (
+    ServerSideStoreBackend,
+    SpillingServerSideStoreBackend,
+    get_memory_usage,
+    get_store_codec,
+    is_store_codec_supported,
+)
 
 
 def test_add_matching_values():
@@ -42,3 +71,386 @@ def test_aux():
     assert df.equals(decode_aux(encode_aux(df)))
     df = toggle_selected(df, [])
     assert df.equals(toggle_selected(toggle_selected(df, 1), [1]))
+
+
+def test_aux_cache():
+    df = pd.DataFrame({"a": [1, 2, 3], "c": ["a", "b", "a"]})
+    store = encode_aux(df)
+    assert store == encode_aux(df.copy())
+    assert store["version"] != encode_aux(df.iloc[::-1])["version"]
+    aux1 = decode_aux(store)
+    aux1["a"] = 0
+    aux2 = decode_aux(store)
+    assert aux2 is not aux1
+    assert df.equals(aux2)
+    assert df.equals(decode_aux(store["table"]))
+
+
+def test_aux_patch():
+    df = pd.DataFrame({"a": [1, 2, 3, 4]})
+    store = encode_aux(df)
+    store = toggle_selected(store, [1, 2])
+    store = toggle_selected(store, 2)
+    assert "patches" in store and "table" in store
+    store = patch_aux(store, "Xiplot_cluster", [0, 1], "c1", fill="c2")
+    store = patch_aux(store, "Xiplot_cluster", [3], "c3")
+    aux = decode_aux(store)
+    assert get_selected(aux).to_list() == [False, True, False, False]
+    assert get_clusters(aux).to_list() == ["c1", "c1", "c2", "c3"]
+    assert aux["a"].to_list() == [1, 2, 3, 4]
+    assert decode_aux(encode_aux(aux)).equals(aux)
+
+    df2 = toggle_selected(df.copy(), [1])
+    patch_aux(df2, "Xiplot_cluster", [0, 1], "c1", fill="c2")
+    patch_aux(df2, "Xiplot_cluster", [3], "c3")
+    assert df2["Xiplot_cluster"].to_list() == aux["Xiplot_cluster"].to_list()
+
+
+def test_aux_server_side():
+    backend = ServerSideStoreBackend()
+    set_aux_server_side(True, backend)
+    try:
+        df = pd.DataFrame({"a": [1, 2, 3, 4]})
+        store = toggle_selected(encode_aux(df), [1])
+        assert "patches" in store and "table" not in store
+        AUX_CACHE.clear()
+        assert get_selected(decode_aux(store)).to_list()[1]
+
+        # The full table is sent when the base is no longer on the server
+        for key in list(backend.store):
+            backend.delete(key)
+        store = toggle_selected(store, [2])
+        assert "table" in store
+        AUX_CACHE.clear()
+        assert get_selected(decode_aux(store)).to_list()[1:3] == [True, True]
+    finally:
+        set_aux_server_side(False, LRUCache(maxsize=32))
+
+
+def test_aux_content():
+    store = encode_aux(pd.DataFrame({"a": [1, 2, 3, 4]}))
+    content = aux_content(store)
+    store = toggle_selected(store, [1, 2])
+    assert aux_content(store) == content
+    store = update_selected(store, [], "invert")
+    assert aux_content(store) == content
+    assert aux_content(encode_aux(decode_aux(store))) == content
+    store = patch_aux(store, "Xiplot_cluster", [0], "c1", fill="c2")
+    assert aux_content(store) != content
+
+    # Re-encoding the patched table does not change the content
+    import xiplot.utils.auxiliary as auxiliary
+
+    max_patches = auxiliary.AUX_MAX_PATCHES
+    try:
+        auxiliary.AUX_MAX_PATCHES = 1
+        content = aux_content(store)
+        store = toggle_selected(store, [3])
+        assert "patches" not in store
+        assert aux_content(store) == content
+    finally:
+        auxiliary.AUX_MAX_PATCHES = max_patches
+
+
+def test_overlay():
+    import plotly.graph_objects as go
+
+    fig = go.Figure(go.Scatter(x=[1, 2, 3], y=[1, 2, 3]))
+    fig.add_vline(2)
+    overlay = create_overlay(fig, [0, 2], dict(color="red"))
+    assert len(overlay["shapes"]) == 1 and len(overlay["traces"]) == 1
+
+    base = go.Figure(go.Scatter(x=[4, 5], y=[4, 5], customdata=[[2], [1]]))
+    apply_overlay(base, overlay)
+    assert list(base.data[0].selectedpoints) == [0]
+    assert base.data[0].selected.marker.color == "red"
+    assert len(base.data) == 2 and len(base.layout.shapes) == 1
+
+
+def test_selection_bitmap():
+    mask = np.random.default_rng(0).random(1001) > 0.5
+    assert (unpack_bitmap(pack_bitmap(mask)) == mask).all()
+    assert unpack_bitmap(pack_bitmap(mask), 1003)[-2:].sum() == 0
+
+    n = 100_000
+    store = encode_aux(pd.DataFrame({"Xiplot_selected": np.zeros(n, bool)}))
+    assert len(store["selected"]["bits"]) < n / 4
+    store = update_selected(store, np.arange(0, n, 2))
+    assert len(str(store["patches"])) < n / 4
+    store = update_selected(store, np.arange(0, n, 3), "union")
+    store = update_selected(store, np.arange(n // 2), "intersect")
+    store = update_selected(store, [], "invert")
+    index = np.arange(n)
+    expected = ~(((index % 2 == 0) | (index % 3 == 0)) & (index < n // 2))
+    assert (get_selected(decode_aux(store)) == expected).all()
+
+
+def test_store_codec():
+    df = pd.DataFrame(
+        {
+            "a": np.arange(5, dtype="int32"),
+            "b": np.linspace(0.0, 1.0, 5, dtype="float32"),
+            "c": pd.Categorical(["x", "y", "x", "z", "y"]),
+            "d": [f"s{i}" for i in range(5)],
+        }
+    )
+    for codec in ["json", "arrow"]:
+        if not is_store_codec_supported(codec):
+            continue
+        df_to_store, df_from_store = get_store_codec(codec)
+        df2 = df_from_store(df_to_store(df))
+        assert df2.shape == df.shape
+        assert df2["d"].to_list() == df["d"].to_list()
+        if codec == "arrow":
+            assert df.equals(df2)
+            assert (df.dtypes == df2.dtypes).all()
+
+
+def test_store_backend_eviction():
+    df = pd.DataFrame({"a": np.arange(1000, dtype=float)})
+    size = get_memory_usage(df)
+    store = ServerSideStoreBackend(max_memory=int(size * 2.5))
+    for i, key in enumerate("abc"):
+        store.set(key, df + i)
+    assert not store.has("a") and store.has("b") and store.has("c")
+    assert df.equals(store.get("b") - 1)
+    store.set("d", df)
+    assert store.has("b") and not store.has("c")
+    stats = store.get_stats()
+    assert stats["evictions"] == 2 and stats["entries"] == 2
+    assert stats["memory"] == 2 * size and stats["hits"] == 1
+
+    store = ServerSideStoreBackend(ttl=0.05)
+    store.set("a", df)
+    time.sleep(0.1)
+    assert store.get("a", ignore_expired=True) is df
+    time.sleep(0.1)
+    assert store.get("a") is None
+    assert store.get_stats()["expirations"] == 1
+
+
+def test_store_backend_sessions():
+    import flask
+
+    df = pd.DataFrame({"a": np.arange(1000, dtype=float)})
+    size = get_memory_usage(df)
+    store = ServerSideStoreBackend(session_max_memory=int(size * 1.5))
+    app = flask.Flask(__name__)
+    app.secret_key = "test"
+
+    for session in ["s1", "s2"]:
+        with app.test_request_context():
+            flask.session["session_id"] = session
+            store.set(session + "a", df.copy())
+            store.set(session + "b", df.copy())
+
+    assert store.get("s1b") is store.get("s2b")
+    assert not store.has("s1a") and not store.has("s2a")
+    stats = store.get_stats()
+    assert stats["memory"] == size and stats["sessions"] == 2
+    assert stats["shared_frames"] == 1 and stats["deduplications"] == 3
+    assert stats["evictions"] == 2
+
+
+def test_store_backend_spilling(tmp_path):
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return
+    df = pd.DataFrame({"a": np.arange(1000, dtype=float), "b": ["x"] * 1000})
+    store = SpillingServerSideStoreBackend(
+        tmp_path, max_memory=int(get_memory_usage(df) * 1.5)
+    )
+    store.set("a", df)
+    store.set("b", df.assign(a=0.0))
+    stats = store.get_stats()
+    assert stats["spills"] == 1 and stats["spilled_entries"] == 1
+    assert store.has("a")
+    assert df.equals(store.get("a"))
+    store.set("a", df.iloc[:10])
+    assert store.get_stats()["spilled_bytes"] == 0
+    assert list(store.cache_dir.iterdir()) == []
+    assert store.get("a").shape[0] == 10
+
+
+def test_lazy_dataframe(tmp_path):
+    orig = pd.DataFrame(
+        dict(
+            a=np.arange(10),
+            b=np.arange(10) / 2,
+            c=[f"c{i}" for i in range(10)],
+            d=np.ones(10),
+        )
+    )
+    path = tmp_path / "data.parquet"
+    orig.to_parquet(path)
+    df, aux, meta = read_lazy_dataframe(path, path.name)
+    assert isinstance(df, LazyDataFrame)
+    assert meta["filename"] == "data.parquet"
+    assert df.shape == (10, 4) and len(aux.columns) == 0
+
+    aux["Xiplot_cluster"] = pd.Categorical(["c1"] * 10)
+    merged = merge_df_aux(df, aux)
+    assert merged.columns.to_list() == ["a", "b", "c", "d", "Xiplot_cluster"]
+    assert ColumnDropdown.get_columns(df, aux, numeric=True) == ["a", "b", "d"]
+    assert get_numeric_columns(merged, ["c", "b"]) == ["b"]
+    assert len(df._data.loaded) == 0
+
+    assert df["b"].equals(orig["b"])
+    assert merge_df_aux(df, aux, ["a", None]).columns.to_list() == [
+        "a",
+        "Xiplot_cluster",
+    ]
+    assert sorted(df._data.loaded) == ["a", "b"]
+    assert merged[["d", "Xiplot_cluster"]].to_numpy().shape == (10, 2)
+    assert sorted(df._data.loaded) == ["a", "b", "d"]
+    assert df.to_pandas().equals(orig)
+
+    # Columns are not mixed from different versions of the file
+    df, _, _ = read_lazy_dataframe(path, path.name)
+    assert df["a"].equals(orig["a"])
+    pd.concat((orig, orig)).to_parquet(path)
+    try:
+        df["b"]
+        assert False
+    except Exception as e:
+        assert "has changed" in str(e)
+
+
+def test_store_backend_lazy(tmp_path):
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return
+    orig = pd.DataFrame({"a": np.arange(1000.0), "b": np.arange(1000.0)})
+    path = tmp_path / "data.parquet"
+    orig.to_parquet(path)
+    size = get_memory_usage(orig["a"])
+
+    # Columns that are loaded after storing count towards the memory
+    store = ServerSideStoreBackend()
+    df, _, _ = read_lazy_dataframe(path, path.name)
+    store.set("a", df)
+    memory = store.get_stats()["memory"]
+    df["a"]
+    assert store.get_stats()["memory"] == memory + size
+    df["b"]
+    assert store.get_stats()["memory"] == memory + 2 * size
+
+    # Lazy frames are spilled by unloading their columns
+    store = SpillingServerSideStoreBackend(tmp_path, max_memory=size * 3)
+    df, _, _ = read_lazy_dataframe(path, path.name)
+    store.set("a", df)
+    df["a"], df["b"]
+    assert len(df._data.loaded) == 2
+    store.set("b", orig[["a"]])
+    assert store.has("a") and len(df._data.loaded) == 0
+    stats = store.get_stats()
+    assert stats["spills"] == 1 and stats["memory"] < 2 * size
+    assert store.get("a")["b"].equals(orig["b"])
+
+
+def test_download_route(monkeypatch):
+    import dash
+
+    from xiplot.utils import download
+
+    monkeypatch.setattr(download, "DOWNLOADS", dict())
+    monkeypatch.setattr(download, "DOWNLOAD_URL_PREFIX", None)
+    monkeypatch.setattr(download, "DOWNLOAD_DIR", None)
+    assert not download.is_download_route_enabled()
+
+    app = dash.Dash(__name__)
+    app.layout = dash.html.Div()
+    download.register_download_route(app)
+    assert download.is_download_route_enabled()
+
+    def write(file):
+        file.write(b"x" * 100_000)
+        return "data ä.csv", "text/csv"
+
+    url = download.create_download(write)
+    client = app.server.test_client()
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.data == b"x" * 100_000
+    assert response.headers["Content-Length"] == "100000"
+    assert response.headers["Content-Type"].startswith("text/csv")
+    assert "filename*=UTF-8''data%20%C3%A4.csv" in (
+        response.headers["Content-Disposition"]
+    )
+    response.close()
+    assert client.get(url).status_code == 404
+    assert len(download.DOWNLOADS) == 0
+
+    monkeypatch.setattr(download, "DOWNLOAD_TTL", -1.0)
+    url = download.create_download(write)
+    path = next(iter(download.DOWNLOADS.values()))[0]
+    download.expire_downloads()
+    assert len(download.DOWNLOADS) == 0
+    assert client.get(url).status_code == 404
+    assert not os.path.exists(path)
+
+
+def test_data_catalog(tmp_path, monkeypatch):
+    try:
+        import pyarrow.feather
+    except ImportError:
+        return
+    from xiplot.utils import catalog as cat
+    from xiplot.utils.dataframe import get_data_filepaths
+
+    data_dir, index_dir = tmp_path / "data", tmp_path / "cache"
+    data_dir.mkdir()
+    df = pd.DataFrame({"a": np.arange(10), "b": ["x"] * 10})
+    df.to_csv(data_dir / "a.csv", index=False)
+    pyarrow.feather.write_feather(df.iloc[:5], data_dir / "b.feather")
+
+    catalog = cat.DataCatalog(data_dir, index_dir)
+    assert catalog.refresh()
+    # The data is not parsed, the footers and the first lines are read
+    assert catalog.get(data_dir / "a.csv")["rows"] == 10
+    assert catalog.get(data_dir / "a.csv")["columns"] == ["a", "b"]
+    assert "dtypes" not in catalog.get(data_dir / "a.csv")
+    assert catalog.get(data_dir / "a.csv")["size"] > 0
+    assert catalog.get(data_dir / "b.feather")["rows"] == 5
+    assert catalog.get(data_dir / "b.feather")["columns"] == ["a", "b"]
+    assert catalog.get(data_dir / "b.feather")["dtypes"] == [
+        "int64",
+        "object",
+    ]
+    # The index is saved in the cache directory, not with the data
+    assert catalog.path.parent == index_dir and catalog.path.exists()
+    assert len(get_data_filepaths(data_dir)) == 2
+
+    # The saved index is used by new catalogs, only changes are described
+    described = []
+    describe = cat.describe_data_file
+    monkeypatch.setattr(
+        cat,
+        "describe_data_file",
+        lambda fp: described.append(fp.name) or describe(fp),
+    )
+    catalog = cat.DataCatalog(data_dir, index_dir)
+    assert catalog.get(data_dir / "b.feather")["rows"] == 5
+    assert not catalog.refresh()
+    assert described == []
+
+    pyarrow.feather.write_feather(df.iloc[:3], data_dir / "b.feather")
+    (data_dir / "a.csv").unlink()
+    assert catalog.get(data_dir / "b.feather") is None
+    assert catalog.refresh()
+    assert described == ["b.feather"]
+    assert catalog.get(data_dir / "b.feather")["rows"] == 3
+    assert "a.csv" not in cat.DataCatalog(data_dir, index_dir).entries
+
+    # Without an index directory nothing is written
+    catalog = cat.DataCatalog(data_dir)
+    assert catalog.refresh()
+    assert catalog.path is None
+    assert len(list(data_dir.iterdir())) == 1
+
+    path = tmp_path / "c.ndjson"
+    path.write_text('{"a": 1, "b": "x"}\n{"a": 2, "b": "y"}')
+    entry = cat.describe_data_file(path)
+    assert entry["rows"] == 2 and entry["columns"] == ["a", "b"]
@@ -1,23 +1,24 @@
 import uuid
-from collections import defaultdict
-from itertools import product
 
 import dash
 import dash_mantine_components as dmc
 import numpy as np
 import pandas as pd
 import plotly.express as px
-from dash import MATCH, Input, Output, ctx, dcc, html
+import plotly.graph_objects as go
+from dash import MATCH, Input, Output, State, ctx, dcc, html
 from dash.exceptions import PreventUpdate
 
 from xiplot.plots import APlot
-from xiplot.plugin import ID_HOVERED
+from xiplot.plugin import ID_AUXILIARY_CONTENT, ID_HOVERED
 from xiplot.utils.auxiliary import (
     SELECTED_COLUMN_NAME,
     decode_aux,
     get_clusters,
     merge_df_aux,
+    merge_df_aux_columns,
 )
+from xiplot.utils.barplot import explode_column, reldiff_scores, top_k
 from xiplot.utils.cluster import cluster_colours
 from xiplot.utils.components import (
     ClusterDropdown,
@@ -26,6 +27,11 @@ from xiplot.utils.components import (
     PlotData,
 )
 from xiplot.utils.layouts import layout_wrapper
+from xiplot.utils.overlay import (
+    apply_overlay,
+    create_overlay,
+    register_overlay_callback,
+)
 
 
 class Barplot(APlot):
@@ -34,7 +40,7 @@ class Barplot(APlot):
         PdfButton.register_callback(app, cls.name(), {"type": "barplot"})
 
         @app.callback(
-            Output({"type": "barplot", "index": MATCH}, "figure"),
+            Output(cls.get_id(MATCH, "base"), "data"),
             Output(
                 {"type": "barplot-notify-container", "index": MATCH},
                 "children",
@@ -43,10 +49,10 @@ class Barplot(APlot):
             Input(cls.get_id(MATCH, "y_axis_dropdown"), "value"),
             Input(ClusterDropdown.get_id(MATCH), "value"),
             Input({"type": "order_dropdown", "index": MATCH}, "value"),
-            Input(ID_HOVERED, "data"),
             Input("data_frame_store", "data"),
-            Input("auxiliary_store", "data"),
+            State("auxiliary_store", "data"),
             Input("plotly-template", "data"),
+            Input(ID_AUXILIARY_CONTENT, "data"),
             prevent_initial_call=False,
         )
         def tmp(
@@ -54,10 +60,10 @@ class Barplot(APlot):
             y_axis,
             selected_clusters,
             order,
-            hover,
             df,
             aux,
             template=None,
+            aux_content=None,
         ):
             try:
                 if ctx.triggered_id == "data_frame_store":
@@ -74,10 +80,11 @@ class Barplot(APlot):
                         y_axis,
                         selected_clusters,
                         order,
-                        hover,
+                        None,
                         df_from_store(df),
                         decode_aux(aux),
                         template,
+                        overlay=False,
                     ),
                     dash.no_update,
                 )
@@ -91,6 +98,27 @@ class Barplot(APlot):
                     autoClose=10000,
                 )
 
+        @app.callback(
+            Output(cls.get_id(MATCH, "overlay"), "data"),
+            Input(cls.get_id(MATCH, "y_axis_dropdown"), "value"),
+            Input(ID_HOVERED, "data"),
+            Input("auxiliary_store", "data"),
+            Input("plotly-template", "data"),
+            State("data_frame_store", "data"),
+            prevent_initial_call=False,
+        )
+        def overlay(y_axis, hover, aux, template, df):
+            return Barplot.render_overlay(
+                y_axis, hover, df_from_store(df), decode_aux(aux), template
+            )
+
+        register_overlay_callback(
+            app,
+            {"type": "barplot", "index": MATCH},
+            cls.get_id(MATCH, "base"),
+            cls.get_id(MATCH, "overlay"),
+        )
+
         PlotData.register_callback(
             cls.name(),
             app,
@@ -121,7 +149,7 @@ class Barplot(APlot):
             numeric=True,
         )
 
-        return [tmp]
+        return [tmp, overlay]
 
     @staticmethod
     def render(
@@ -133,8 +161,11 @@ class Barplot(APlot):
         df,
         aux,
         template=None,
+        overlay=True,
     ):
-        df = merge_df_aux(df, aux)
+        if overlay:
+            overlay = Barplot.render_overlay(y_axis, hover, df, aux, template)
+        df = merge_df_aux(df, aux, [x_axis, y_axis])
         if "frequency" not in df.columns:
             df["frequency"] = [1 for _ in range(len(df))]
 
@@ -146,39 +177,33 @@ class Barplot(APlot):
             selected_clusters = clusters.categories
         selected_clusters = set(selected_clusters)
 
-        Xs = []
-        Ys = []
-        Cs = []
-
-        if type(df[x_axis][0]) in [np.ndarray, list]:
+        exploded = type(df[x_axis][0]) in [np.ndarray, list]
+        if exploded:
+            rows, Xs = explode_column(df[x_axis])
             if y_axis == "frequency":
-                df["frequency"] = [
-                    f / max(len(xs), 1)
-                    for f, xs in zip(df["frequency"], df[x_axis])
-                ]
-
-            for xs, y, c in zip(df[x_axis], df[y_axis], clusters):
-                for x in xs:
-                    if c in selected_clusters:
-                        Xs.append(x)
-                        Ys.append(y)
-                        Cs.append(c)
-
-                    if c != "all" and "all" in selected_clusters:
-                        Xs.append(x)
-                        Ys.append(y)
-                        Cs.append("all")
+                df["frequency"] = df["frequency"].to_numpy() / np.maximum(
+                    np.bincount(rows, minlength=df.shape[0]), 1
+                )
         else:
-            for x, y, c in zip(df[x_axis], df[y_axis], clusters):
-                if c in selected_clusters:
-                    Xs.append(x)
-                    Ys.append(y)
-                    Cs.append(c)
-
-                if c != "all" and "all" in selected_clusters:
-                    Xs.append(x)
-                    Ys.append(y)
-                    Cs.append("all")
+            rows = np.arange(df.shape[0])
+            Xs = df[x_axis].to_numpy()
+        Ys = df[y_axis].to_numpy()[rows]
+
+        # Every value is added to its own cluster (if selected) and to "all"
+        categories = np.asarray(clusters.categories, dtype=object)
+        codes = np.asarray(clusters.codes)[rows]
+        in_cluster = np.append(
+            np.isin(categories, list(selected_clusters)), False
+        )[codes]
+        in_all = np.append(categories != "all", True)[codes]
+        if "all" not in selected_clusters:
+            in_all[:] = False
+        labels = np.append(categories, np.nan)[codes]
+        Cs = np.concatenate(
+            (labels[in_cluster], np.full(np.count_nonzero(in_all), "all"))
+        )
+        Xs = np.concatenate((Xs[in_cluster], Xs[in_all]))
+        Ys = np.concatenate((Ys[in_cluster], Ys[in_all]))
 
         flat_df = pd.DataFrame(
             {
@@ -194,60 +219,29 @@ class Barplot(APlot):
 
         grouping = flat_df.groupby([x_axis, "Clusters"])[y_axis]
 
-        if y_axis == "frequency" and type(df[x_axis][0]) not in [
-            np.ndarray,
-            list,
-        ]:
+        if y_axis == "frequency" and not exploded:
             dff = grouping.sum().to_frame().reset_index()
         else:
             dff = grouping.mean().to_frame().reset_index()
             dff["Error"] = grouping.sem().values
 
+        keys, bars = pd.factorize(dff[x_axis])
+        values = dff[y_axis].to_numpy(dtype=np.float64)
         if order == "total" or len(selected_clusters) <= 1:
-            order_lookup = defaultdict(lambda: 0.0)
-
-            for x, y in zip(dff[x_axis].values, dff[y_axis].values):
-                order_lookup[x] += abs(y)
+            scores = np.bincount(
+                keys, weights=np.abs(values), minlength=len(bars)
+            )
         elif order == "reldiff":
-            value_lookup = defaultdict(list)
-
+            groups, names = pd.factorize(dff["Clusters"])
+            matrix = np.full((len(bars), len(names)), np.nan)
+            matrix[keys, groups] = values
+            errors = np.ones_like(matrix)
             if "Error" in dff.columns:
-                for x, y, e in zip(
-                    dff[x_axis].values, dff[y_axis].values, dff["Error"].values
-                ):
-                    value_lookup[x].append((y, e))
-            else:
-                for x, y in zip(dff[x_axis].values, dff[y_axis].values):
-                    value_lookup[x].append((y, 1))
-
-            order_lookup = dict()
-
-            for x, vs in value_lookup.items():
-                if len(vs) <= 1:
-                    order_lookup[x] = 0.0
-                else:
-                    maxdiff = 0.0
-
-                    for (v1, e1), (v2, e2) in product(vs, vs):
-                        if e1 == 0.0 and e2 == 0.0:
-                            e1 = 0.001
-
-                        diff = abs(v1 - v2) / np.sqrt(e1 * e1 + e2 * e2)
+                errors[keys, groups] = dff["Error"].to_numpy(np.float64)
+            scores = reldiff_scores(matrix, errors)
 
-                        maxdiff = max(maxdiff, diff)
-
-                    order_lookup[x] = maxdiff
-
-        top_bars = sorted(
-            order_lookup.keys(), key=lambda x: order_lookup[x], reverse=True
-        )[:10]
-
-        dff.drop(
-            index=[
-                i for i, x in zip(dff.index, dff[x_axis]) if x not in top_bars
-            ],
-            inplace=True,
-        )
+        top_bars = list(bars[top_k(scores, 10)])
+        dff = dff[dff[x_axis].isin(top_bars)]
 
         fig = px.bar(
             dff,
@@ -273,22 +267,32 @@ class Barplot(APlot):
             yaxis=dict(fixedrange=True),
         )
 
-        if y_axis != "frequency":
-            if hover is not None:
+        return apply_overlay(fig, overlay)
+
+    @staticmethod
+    def render_overlay(y_axis, hover, df, aux, template=None):
+        """Draw the hovered and the selected rows as horizontal lines."""
+        if y_axis == "frequency":
+            return create_overlay()
+        df = merge_df_aux_columns(df, aux, [y_axis])
+        if y_axis not in df.columns:
+            return create_overlay()
+        fig = go.Figure()
+        if hover is not None:
+            fig.add_hline(
+                df[y_axis][hover],
+                line=dict(color="rgba(0.5,0.5,0.5,0.5)", dash="dash"),
+                layer="below",
+            )
+
+        if SELECTED_COLUMN_NAME in aux:
+            color = "#DDD" if template and "dark" in template else "#333"
+            for x in df[y_axis][aux[SELECTED_COLUMN_NAME]]:
                 fig.add_hline(
-                    df[y_axis][hover],
-                    line=dict(color="rgba(0.5,0.5,0.5,0.5)", dash="dash"),
-                    layer="below",
+                    x, line=dict(color=color, width=0.5), layer="below"
                 )
 
-            if SELECTED_COLUMN_NAME in aux:
-                color = "#DDD" if template and "dark" in template else "#333"
-                for x in df[y_axis][aux[SELECTED_COLUMN_NAME]]:
-                    fig.add_hline(
-                        x, line=dict(color=color, width=0.5), layer="below"
-                    )
-
-        return fig
+        return create_overlay(fig)
 
     @classmethod
     def create_layout(cls, index, df, columns, config=dict()):
@@ -342,6 +346,8 @@ class Barplot(APlot):
 
         return [
             dcc.Graph(id={"type": "barplot", "index": index}),
+            dcc.Store(id=cls.get_id(index, "base")),
+            dcc.Store(id=cls.get_id(index, "overlay")),
             layout_wrapper(
                 component=ColumnDropdown(
                     cls.get_id(index, "x_axis_dropdown"),
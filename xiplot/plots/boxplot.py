@@ -1,11 +1,13 @@
 import dash
 import plotly.express as px
+import plotly.graph_objects as go
 from dash import ALL, MATCH, Input, Output, State, dcc
 from dash.exceptions import PreventUpdate
 
 from xiplot.plots import APlot
 from xiplot.plugin import (
     ID_AUXILIARY,
+    ID_AUXILIARY_CONTENT,
     ID_CLICKED,
     ID_HOVERED,
     placeholder_figure,
@@ -15,6 +17,7 @@ from xiplot.utils.auxiliary import (
     SELECTED_COLUMN_NAME,
     decode_aux,
     merge_df_aux,
+    merge_df_aux_columns,
     toggle_selected,
 )
 from xiplot.utils.cluster import cluster_colours
@@ -26,6 +29,11 @@ from xiplot.utils.components import (
 )
 from xiplot.utils.dataframe import get_default_column
 from xiplot.utils.layouts import layout_wrapper
+from xiplot.utils.overlay import (
+    apply_overlay,
+    create_overlay,
+    register_overlay_callback,
+)
 
 
 class Boxplot(APlot):
@@ -34,15 +42,15 @@ class Boxplot(APlot):
         PdfButton.register_callback(app, cls.name(), cls.get_id(MATCH))
 
         @app.callback(
-            Output(cls.get_id(MATCH), "figure"),
+            Output(cls.get_id(MATCH, "base"), "data"),
             Input(cls.get_id(MATCH, "x_axis"), "value"),
             Input(cls.get_id(MATCH, "y_axis"), "value"),
             Input(cls.get_id(MATCH, "plot"), "value"),
             Input(cls.get_id(MATCH, "color"), "value"),
-            Input(ID_HOVERED, "data"),
             Input("data_frame_store", "data"),
-            Input("auxiliary_store", "data"),
+            State("auxiliary_store", "data"),
             Input("plotly-template", "data"),
+            Input(ID_AUXILIARY_CONTENT, "data"),
             prevent_initial_call=False,
         )
         def render(
@@ -50,10 +58,10 @@ class Boxplot(APlot):
             y_axis,
             plot,
             color,
-            hover,
             df,
             aux,
             template=None,
+            aux_content=None,
         ):
             return cls.render(
                 df_from_store(df),
@@ -62,10 +70,32 @@ class Boxplot(APlot):
                 y_axis,
                 plot,
                 color,
-                hover,
+                None,
                 template,
+                overlay=False,
             )
 
+        @app.callback(
+            Output(cls.get_id(MATCH, "overlay"), "data"),
+            Input(cls.get_id(MATCH, "y_axis"), "value"),
+            Input(ID_HOVERED, "data"),
+            Input("auxiliary_store", "data"),
+            Input("plotly-template", "data"),
+            State("data_frame_store", "data"),
+            prevent_initial_call=False,
+        )
+        def render_overlay(y_axis, hover, aux, template, df):
+            return cls.render_overlay(
+                df_from_store(df), decode_aux(aux), y_axis, hover, template
+            )
+
+        register_overlay_callback(
+            app,
+            cls.get_id(MATCH),
+            cls.get_id(MATCH, "base"),
+            cls.get_id(MATCH, "overlay"),
+        )
+
         def get_row(hover):
             try:
                 for p in hover:
@@ -129,10 +159,13 @@ class Boxplot(APlot):
         color=None,
         hover=None,
         template=None,
+        overlay=True,
     ):
         if y_axis is None:
             return placeholder_figure("Please select y axis")
-        df = merge_df_aux(df, aux)
+        if overlay:
+            overlay = Boxplot.render_overlay(df, aux, y_axis, hover, template)
+        df = merge_df_aux(df, aux, [x_axis, y_axis, color])
         df["__Xiplot_index__"] = range(df.shape[0])
         if x_axis not in df.columns:
             return placeholder_figure("Please select x axis")
@@ -173,6 +206,15 @@ class Boxplot(APlot):
         else:
             return placeholder_figure("Unsupported plot type")
 
+        return apply_overlay(fig, overlay)
+
+    @staticmethod
+    def render_overlay(df, aux, y_axis, hover=None, template=None):
+        """Draw the hovered and the selected rows as horizontal lines."""
+        df = merge_df_aux_columns(df, aux, [y_axis])
+        if y_axis not in df.columns:
+            return create_overlay()
+        fig = go.Figure()
         if hover is not None:
             fig.add_hline(
                 df[y_axis][hover],
@@ -185,7 +227,7 @@ class Boxplot(APlot):
                 fig.add_hline(
                     x, line=dict(color=color, width=0.5), layer="below"
                 )
-        return fig
+        return create_overlay(fig)
 
     @classmethod
     def create_layout(cls, index, df, columns=None, config=dict()):
@@ -199,6 +241,8 @@ class Boxplot(APlot):
 
         return [
             dcc.Graph(id=cls.get_id(index)),
+            dcc.Store(id=cls.get_id(index, "base")),
+            dcc.Store(id=cls.get_id(index, "overlay")),
             FlexRow(
                 layout_wrapper(
                     component=ColumnDropdown(
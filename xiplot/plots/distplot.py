@@ -1,11 +1,14 @@
 import dash
+import numpy as np
 import plotly.express as px
+import plotly.graph_objects as go
 from dash import ALL, MATCH, Input, Output, State, dcc
 from dash.exceptions import PreventUpdate
 
 from xiplot.plots import APlot
 from xiplot.plugin import (
     ID_AUXILIARY,
+    ID_AUXILIARY_CONTENT,
     ID_CLICKED,
     ID_HOVERED,
     placeholder_figure,
@@ -15,6 +18,7 @@ from xiplot.utils.auxiliary import (
     SELECTED_COLUMN_NAME,
     decode_aux,
     merge_df_aux,
+    merge_df_aux_columns,
     toggle_selected,
 )
 from xiplot.utils.cluster import cluster_colours
@@ -24,7 +28,13 @@ from xiplot.utils.components import (
     PdfButton,
     PlotData,
 )
+from xiplot.utils.density import get_kde, sample_rug
 from xiplot.utils.layouts import layout_wrapper
+from xiplot.utils.overlay import (
+    apply_overlay,
+    create_overlay,
+    register_overlay_callback,
+)
 
 
 class Distplot(APlot):
@@ -37,24 +47,45 @@ class Distplot(APlot):
         PdfButton.register_callback(app, cls.name(), cls.get_id(MATCH))
 
         @app.callback(
-            Output(cls.get_id(MATCH), "figure"),
+            Output(cls.get_id(MATCH, "base"), "data"),
             Input(cls.get_id(MATCH, "variable"), "value"),
             Input(cls.get_id(MATCH, "color"), "value"),
-            Input(ID_HOVERED, "data"),
             Input("data_frame_store", "data"),
-            Input("auxiliary_store", "data"),
+            State("auxiliary_store", "data"),
             Input("plotly-template", "data"),
+            Input(ID_AUXILIARY_CONTENT, "data"),
             prevent_initial_call=False,
         )
         def render(
             variable,
             color,
-            hover,
             df,
             aux,
             template=None,
+            aux_content=None,
         ):
             return cls.render(
+                df_from_store(df),
+                decode_aux(aux),
+                variable,
+                color,
+                None,
+                template,
+                overlay=False,
+            )
+
+        @app.callback(
+            Output(cls.get_id(MATCH, "overlay"), "data"),
+            Input(cls.get_id(MATCH, "variable"), "value"),
+            Input(cls.get_id(MATCH, "color"), "value"),
+            Input(ID_HOVERED, "data"),
+            Input("auxiliary_store", "data"),
+            Input("plotly-template", "data"),
+            State("data_frame_store", "data"),
+            prevent_initial_call=False,
+        )
+        def render_overlay(variable, color, hover, aux, template, df):
+            return cls.render_overlay(
                 df_from_store(df),
                 decode_aux(aux),
                 variable,
@@ -63,6 +94,13 @@ class Distplot(APlot):
                 template,
             )
 
+        register_overlay_callback(
+            app,
+            cls.get_id(MATCH),
+            cls.get_id(MATCH, "base"),
+            cls.get_id(MATCH, "overlay"),
+        )
+
         def get_row(hover):
             try:
                 for p in hover:
@@ -109,7 +147,7 @@ class Distplot(APlot):
             app, cls.get_id(ALL, "color"), df_from_store, category=True
         )
 
-        return render, handle_hover_events, handle_click_events
+        return render, handle_hover_events, handle_click_events, render_overlay
 
     @staticmethod
     def render(
@@ -119,60 +157,101 @@ class Distplot(APlot):
         color=None,
         hover=None,
         template=None,
+        overlay=True,
     ):
-        # `plotly.figure_factory` checks if scipy is installed and caches the
-        # result. This causes issues if scipy is lazily loaded in WASM.
-        import scipy  # noqa: F401, isort: skip
-        import plotly.figure_factory as ff
-
-        df = merge_df_aux(df, aux)
-        df["__Xiplot_index__"] = range(df.shape[0])
+        if overlay:
+            overlay = Distplot.render_overlay(
+                df, aux, variable, color, hover, template
+            )
+        df = merge_df_aux(df, aux, [variable, color])
         if variable not in df.columns:
             return placeholder_figure("Please select a variable")
+        values = df[variable].to_numpy(dtype=np.float64)
+        finite = np.isfinite(values)
+
         if color not in df.columns:
-            fig = ff.create_distplot(
-                [df[variable]], [variable], show_hist=False
+            groups = [variable]
+            rows = [np.flatnonzero(finite)]
+        else:
+            categories = df[color].astype("category").cat
+            codes = np.where(finite, categories.codes, -1)
+            groups, rows = [], []
+            for i, c in enumerate(categories.categories):
+                group = np.flatnonzero(codes == i)
+                if len(group) > 1 and values[group].std(ddof=1) > 1e-6:
+                    groups.append(str(c))
+                    rows.append(group)
+
+        colors1 = px.colors.qualitative.Plotly
+        colors2 = cluster_colours()
+        curves, rugs = [], []
+        for i, (name, group) in enumerate(zip(groups, rows)):
+            marker = dict(color=colors2.get(name, colors1[i % len(colors1)]))
+            x, y = get_kde(values[group], (variable, color, name))
+            curves.append(
+                go.Scatter(
+                    x=x,
+                    y=y,
+                    mode="lines",
+                    name=name,
+                    legendgroup=name,
+                    marker=marker,
+                )
             )
+            rug = sample_rug(group)
+            rugs.append(
+                go.Scatter(
+                    x=values[rug],
+                    y=[name] * len(rug),
+                    customdata=rug,
+                    yaxis="y2",
+                    mode="markers",
+                    name=name,
+                    legendgroup=name,
+                    showlegend=False,
+                    marker=dict(marker, symbol="line-ns-open"),
+                )
+            )
+
+        fig = go.Figure(curves + rugs)
+        fig.update_layout(
+            template=template,
+            barmode="overlay",
+            hovermode="closest",
+            xaxis=dict(anchor="y2", zeroline=False, title=variable),
+            yaxis=dict(anchor="free", position=0.0, title="Density"),
+            yaxis2=dict(anchor="x", dtick=1, showticklabels=False),
+        )
+        if color not in df.columns:
             fig.update_layout(
-                template=template,
                 showlegend=False,
-                xaxis_title=variable,
-                yaxis_title="Density",
                 yaxis_domain=[0.11, 1],
                 yaxis2_domain=[0, 0.09],
             )
-            fig.data[1]["customdata"] = df["__Xiplot_index__"]
-
         else:
-            df[color] = df[color].astype("category")
-            df2 = df.groupby(color)
-            cats = [
-                c
-                for c in df[color].cat.categories
-                if df2[variable].get_group(c).std() > 1e-6
-            ]
-            data = [df2[variable].get_group(g) for g in cats]
-            customdata = [df2["__Xiplot_index__"].get_group(g) for g in cats]
-            groups = [str(g) for g in cats]
-            colors1 = px.colors.qualitative.Plotly
-            colors2 = cluster_colours()
-            colors = []
-            for i, n in enumerate(groups):
-                colors.append(colors2.get(n, colors1[i % len(colors1)]))
-            fig = ff.create_distplot(
-                data, groups, show_hist=False, colors=colors
-            )
             fig.update_layout(
-                template=template,
                 legend=dict(title=color, traceorder="normal"),
-                xaxis_title=variable,
-                yaxis_title="Density",
-                yaxis_domain=[0.16, 1] if len(cats) < 4 else [0.26, 1],
-                yaxis2_domain=[0, 0.14] if len(cats) < 4 else [0, 0.24],
+                yaxis_domain=[0.16, 1] if len(groups) < 4 else [0.26, 1],
+                yaxis2_domain=[0, 0.14] if len(groups) < 4 else [0, 0.24],
             )
-            for i, d in enumerate(customdata):
-                fig.data[i + len(cats)]["customdata"] = d
 
+        return apply_overlay(fig, overlay)
+
+    @staticmethod
+    def render_overlay(
+        df,
+        aux,
+        variable,
+        color=None,
+        hover=None,
+        template=None,
+    ):
+        """Draw the hovered and the selected rows as vertical lines, and the
+        selected rows as markers in the rug plot."""
+        df = merge_df_aux_columns(df, aux, [variable, color])
+        if variable not in df.columns:
+            return create_overlay()
+        fig = go.Figure()
         if hover is not None:
             fig.add_vline(
                 df[variable][hover],
@@ -200,7 +279,7 @@ class Distplot(APlot):
                 mode="markers",
                 showlegend=False,
             )
-        return fig
+        return create_overlay(fig)
 
     @classmethod
     def create_layout(cls, index, df, columns=None, config=dict()):
@@ -213,6 +292,8 @@ class Distplot(APlot):
 
         return [
             dcc.Graph(id=cls.get_id(index)),
+            dcc.Store(id=cls.get_id(index, "base")),
+            dcc.Store(id=cls.get_id(index, "overlay")),
             FlexRow(
                 layout_wrapper(
                     component=ColumnDropdown(
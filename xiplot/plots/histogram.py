@@ -1,15 +1,17 @@
-import pandas as pd
+import numpy as np
 import plotly.express as px
-from dash import ALL, MATCH, Input, Output, ctx, dcc
+import plotly.graph_objects as go
+from dash import ALL, MATCH, Input, Output, State, ctx, dcc
 from dash.exceptions import PreventUpdate
 
 from xiplot.plots import APlot
-from xiplot.plugin import ID_HOVERED
+from xiplot.plugin import ID_AUXILIARY_CONTENT, ID_HOVERED
 from xiplot.utils.auxiliary import (
     SELECTED_COLUMN_NAME,
     decode_aux,
     get_clusters,
     merge_df_aux,
+    merge_df_aux_columns,
 )
 from xiplot.utils.cluster import cluster_colours
 from xiplot.utils.components import (
@@ -19,7 +21,13 @@ from xiplot.utils.components import (
     PlotData,
 )
 from xiplot.utils.dataframe import get_numeric_columns
+from xiplot.utils.histogram import grouped_histogram
 from xiplot.utils.layouts import layout_wrapper
+from xiplot.utils.overlay import (
+    apply_overlay,
+    create_overlay,
+    register_overlay_callback,
+)
 
 
 class Histogram(APlot):
@@ -28,16 +36,18 @@ class Histogram(APlot):
         PdfButton.register_callback(app, cls.name(), {"type": "histogram"})
 
         @app.callback(
-            Output({"type": "histogram", "index": MATCH}, "figure"),
+            Output(cls.get_id(MATCH, "base"), "data"),
             Input(cls.get_id(MATCH, "x_axis_dropdown"), "value"),
             Input(ClusterDropdown.get_id(MATCH), "value"),
-            Input(ID_HOVERED, "data"),
             Input("data_frame_store", "data"),
-            Input("auxiliary_store", "data"),
+            State("auxiliary_store", "data"),
             Input("plotly-template", "data"),
+            Input(ID_AUXILIARY_CONTENT, "data"),
             prevent_initial_call=False,
         )
-        def tmp(x_axis, selected_clusters, hover, df, aux, template=None):
+        def tmp(
+            x_axis, selected_clusters, df, aux, template=None, aux_content=None
+        ):
             # Try branch for testing
             try:
                 if ctx.triggered_id == "data_frame_store":
@@ -50,12 +60,34 @@ class Histogram(APlot):
             return Histogram.render(
                 x_axis,
                 selected_clusters,
-                hover,
+                None,
                 df_from_store(df),
                 decode_aux(aux),
                 template,
+                overlay=False,
+            )
+
+        @app.callback(
+            Output(cls.get_id(MATCH, "overlay"), "data"),
+            Input(cls.get_id(MATCH, "x_axis_dropdown"), "value"),
+            Input(ID_HOVERED, "data"),
+            Input("auxiliary_store", "data"),
+            Input("plotly-template", "data"),
+            State("data_frame_store", "data"),
+            prevent_initial_call=False,
+        )
+        def overlay(x_axis, hover, aux, template, df):
+            return Histogram.render_overlay(
+                x_axis, hover, df_from_store(df), decode_aux(aux), template
             )
 
+        register_overlay_callback(
+            app,
+            {"type": "histogram", "index": MATCH},
+            cls.get_id(MATCH, "base"),
+            cls.get_id(MATCH, "overlay"),
+        )
+
         PlotData.register_callback(
             cls.name(),
             app,
@@ -73,50 +105,69 @@ class Histogram(APlot):
             numeric=True,
         )
 
-        return [tmp]
+        return [tmp, overlay]
 
     @staticmethod
-    def render(x_axis, selected_clusters, hover, df, aux, template=None):
-        df = merge_df_aux(df, aux)
+    def render(
+        x_axis,
+        selected_clusters,
+        hover,
+        df,
+        aux,
+        template=None,
+        overlay=True,
+    ):
+        if overlay:
+            overlay = Histogram.render_overlay(
+                x_axis, hover, df, aux, template
+            )
+        df = merge_df_aux(df, aux, [x_axis])
         clusters = get_clusters(aux, df.shape[0])
         if type(selected_clusters) == str:
             selected_clusters = [selected_clusters]
         if not selected_clusters:
             selected_clusters = clusters.categories
 
-        props_dict = {"all": []}
-        for s in selected_clusters:
-            if s != "all":
-                props_dict[s] = []
-
-        for c, p in zip(clusters, df[x_axis]):
-            if c != "all" and c in selected_clusters:
-                props_dict[c].append(p)
-            props_dict["all"].append(p)
-
-        clusters_col = []
-        x = []
-        for s in selected_clusters:
-            clusters_col += [s for _ in props_dict[s]]
-            x += props_dict[s]
-
-        dff = pd.DataFrame({"Clusters": clusters_col, x_axis: x})
-
-        fig_property = px.histogram(
-            dff,
-            x=x_axis,
-            color="Clusters",
-            hover_data={
-                "Clusters": False,
-                x_axis: False,
-            },
-            color_discrete_map=cluster_colours(),
-            opacity=0.5,
-            histnorm="probability density",
-            template=template,
+        # The counts of the clusters (and "all") are computed on the server
+        names = [c for c in selected_clusters if c != "all"]
+        codes = clusters.categories.get_indexer(names)
+        names = [c for c, i in zip(names, codes) if i >= 0]
+        codes = codes[codes >= 0]
+        groups = np.full(len(clusters.categories), -1)
+        groups[codes] = np.arange(len(codes))
+        groups = np.where(clusters.codes >= 0, groups[clusters.codes], -1)
+        edges, counts = grouped_histogram(
+            df[x_axis].to_numpy(dtype=np.float64, na_value=np.nan),
+            groups,
+            len(codes),
+            key=x_axis,
         )
+        rows = dict(zip(names, counts))
+        rows["all"] = counts[-1]
 
+        widths = np.diff(edges)
+        centers = edges[:-1] + widths / 2
+        colours = cluster_colours()
+        fig_property = go.Figure(layout=dict(template=template))
+        for i, s in enumerate(selected_clusters):
+            if s not in rows:
+                continue
+            total = max(rows[s].sum(), 1)
+            fig_property.add_bar(
+                x=centers,
+                y=rows[s] / (total * widths),
+                width=widths,
+                name=str(s),
+                marker_color=colours.get(
+                    s, px.colors.qualitative.Plotly[i % 10]
+                ),
+                opacity=0.5,
+                hovertemplate="%{y:.2%}",
+            )
         fig_property.update_layout(
+            bargap=0,
+            xaxis_title=x_axis,
+            yaxis_title="probability density",
             hovermode="x unified",
             showlegend=False,
             barmode="overlay",
@@ -125,8 +176,15 @@ class Histogram(APlot):
             ),
         )
 
+        return apply_overlay(fig_property, overlay)
+
+    @staticmethod
+    def render_overlay(x_axis, hover, df, aux, template=None):
+        """Draw the hovered and the selected rows as vertical lines."""
+        df = merge_df_aux_columns(df, aux, [x_axis])
+        fig = go.Figure()
         if hover is not None:
-            fig_property.add_vline(
+            fig.add_vline(
                 df[x_axis][hover],
                 line=dict(color="rgba(0.5,0.5,0.5,0.5)", dash="dash"),
                 layer="below",
@@ -134,11 +192,11 @@ class Histogram(APlot):
         if SELECTED_COLUMN_NAME in aux:
             color = "#DDD" if template and "dark" in template else "#333"
             for x in df[x_axis][aux[SELECTED_COLUMN_NAME]]:
-                fig_property.add_vline(
+                fig.add_vline(
                     x, line=dict(color=color, width=0.5), layer="below"
                 )
 
-        return fig_property
+        return create_overlay(fig)
 
     @classmethod
     def create_layout(cls, index, df, columns, config=dict()):
@@ -177,6 +235,8 @@ class Histogram(APlot):
 
         return [
             dcc.Graph(id={"type": "histogram", "index": index}),
+            dcc.Store(id=cls.get_id(index, "base")),
+            dcc.Store(id=cls.get_id(index, "overlay")),
             layout_wrapper(
                 component=ColumnDropdown(
                     cls.get_id(index, "x_axis_dropdown"),
@@ -1,11 +1,13 @@
 import dash
 import plotly.express as px
+import plotly.graph_objects as go
 from dash import ALL, MATCH, Input, Output, State, dcc
 from dash.exceptions import PreventUpdate
 
 from xiplot.plots import APlot
 from xiplot.plugin import (
     ID_AUXILIARY,
+    ID_AUXILIARY_CONTENT,
     ID_CLICKED,
     ID_HOVERED,
     placeholder_figure,
@@ -15,6 +17,7 @@ from xiplot.utils.auxiliary import (
     SELECTED_COLUMN_NAME,
     decode_aux,
     merge_df_aux,
+    merge_df_aux_columns,
     toggle_selected,
 )
 from xiplot.utils.cluster import cluster_colours
@@ -26,6 +29,11 @@ from xiplot.utils.components import (
 )
 from xiplot.utils.dataframe import get_default_column
 from xiplot.utils.layouts import layout_wrapper
+from xiplot.utils.overlay import (
+    apply_overlay,
+    create_overlay,
+    register_overlay_callback,
+)
 
 
 class Lineplot(APlot):
@@ -34,24 +42,24 @@ class Lineplot(APlot):
         PdfButton.register_callback(app, cls.name(), cls.get_id(MATCH))
 
         @app.callback(
-            Output(cls.get_id(MATCH), "figure"),
+            Output(cls.get_id(MATCH, "base"), "data"),
             Input(cls.get_id(MATCH, "x_axis"), "value"),
             Input(cls.get_id(MATCH, "y_axis"), "value"),
             Input(cls.get_id(MATCH, "color"), "value"),
-            Input(ID_HOVERED, "data"),
             Input("data_frame_store", "data"),
-            Input("auxiliary_store", "data"),
+            State("auxiliary_store", "data"),
             Input("plotly-template", "data"),
+            Input(ID_AUXILIARY_CONTENT, "data"),
             prevent_initial_call=False,
         )
         def render(
             x_axis,
             y_axis,
             color,
-            hover,
             df,
             aux,
             template=None,
+            aux_content=None,
         ):
             return cls.render(
                 df_from_store(df),
@@ -59,10 +67,38 @@ class Lineplot(APlot):
                 x_axis,
                 y_axis,
                 color,
+                None,
+                template,
+                overlay=False,
+            )
+
+        @app.callback(
+            Output(cls.get_id(MATCH, "overlay"), "data"),
+            Input(cls.get_id(MATCH, "x_axis"), "value"),
+            Input(cls.get_id(MATCH, "y_axis"), "value"),
+            Input(ID_HOVERED, "data"),
+            Input("auxiliary_store", "data"),
+            Input("plotly-template", "data"),
+            State("data_frame_store", "data"),
+            prevent_initial_call=False,
+        )
+        def render_overlay(x_axis, y_axis, hover, aux, template, df):
+            return cls.render_overlay(
+                df_from_store(df),
+                decode_aux(aux),
+                x_axis,
+                y_axis,
                 hover,
                 template,
             )
 
+        register_overlay_callback(
+            app,
+            cls.get_id(MATCH),
+            cls.get_id(MATCH, "base"),
+            cls.get_id(MATCH, "overlay"),
+        )
+
         def get_row(hover):
             try:
                 for p in hover:
@@ -113,7 +149,7 @@ class Lineplot(APlot):
             app, cls.get_id(ALL, "color"), df_from_store, category=True
         )
 
-        return render, handle_hover_events, handle_click_events
+        return render, handle_hover_events, handle_click_events, render_overlay
 
     @staticmethod
     def render(
@@ -124,8 +160,13 @@ class Lineplot(APlot):
         color=None,
         hover=None,
         template=None,
+        overlay=True,
     ):
-        df = merge_df_aux(df, aux)
+        if overlay:
+            overlay = Lineplot.render_overlay(
+                df, aux, x_axis, y_axis, hover, template
+            )
+        df = merge_df_aux(df, aux, [x_axis, y_axis, color])
         df["__Xiplot_index__"] = range(df.shape[0])
         if x_axis not in df.columns or y_axis not in df.columns:
             return placeholder_figure("Please select x and y axis")
@@ -140,6 +181,16 @@ class Lineplot(APlot):
             custom_data=["__Xiplot_index__"],
             template=template,
         )
+        return apply_overlay(fig, overlay)
+
+    @staticmethod
+    def render_overlay(df, aux, x_axis, y_axis, hover=None, template=None):
+        """Draw crosshairs at the hovered row and markers at the selected
+        rows."""
+        df = merge_df_aux_columns(df, aux, [x_axis, y_axis])
+        if x_axis not in df.columns or y_axis not in df.columns:
+            return create_overlay()
+        fig = go.Figure()
         if hover is not None:
             fig.add_vline(
                 df[x_axis][hover],
@@ -162,7 +213,7 @@ class Lineplot(APlot):
                     marker=dict(size=15, color=color),
                 )
                 fig.add_traces(trace.data)
-        return fig
+        return create_overlay(fig)
 
     @classmethod
     def create_layout(cls, index, df, columns=None, config=dict()):
@@ -175,6 +226,8 @@ class Lineplot(APlot):
 
         return [
             dcc.Graph(id=cls.get_id(index)),
+            dcc.Store(id=cls.get_id(index, "base")),
+            dcc.Store(id=cls.get_id(index, "overlay")),
             FlexRow(
                 layout_wrapper(
                     component=ColumnDropdown(
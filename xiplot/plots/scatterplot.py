@@ -4,24 +4,37 @@ import dash
 import numpy as np
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
 from dash import ALL, MATCH, Input, Output, State, ctx, dcc
 from dash.exceptions import PreventUpdate
 
 from xiplot.plots import APlot
+from xiplot.plugin import ID_AUXILIARY_CONTENT
 from xiplot.utils.auxiliary import (
     CLUSTER_COLUMN_NAME,
     SELECTED_COLUMN_NAME,
     decode_aux,
-    encode_aux,
-    get_clusters,
-    get_selected,
     merge_df_aux,
+    merge_df_aux_columns,
+    patch_aux,
+    toggle_selected,
 )
 from xiplot.utils.cluster import cluster_colours
 from xiplot.utils.components import ColumnDropdown, PdfButton, PlotData
 from xiplot.utils.dataframe import get_default_column, get_numeric_columns
 from xiplot.utils.layouts import layout_wrapper
-from xiplot.utils.scatterplot import get_row
+from xiplot.utils.overlay import (
+    apply_overlay,
+    create_overlay,
+    register_overlay_callback,
+)
+from xiplot.utils.scatterplot import (
+    aggregate_points,
+    get_row,
+    get_visible_rows,
+    is_aggregated,
+    is_viewport_change,
+)
 
 
 class Scatterplot(APlot):
@@ -30,15 +43,18 @@ class Scatterplot(APlot):
         PdfButton.register_callback(app, cls.name(), {"type": "scatterplot"})
 
         @app.callback(
-            Output({"type": "scatterplot", "index": MATCH}, "figure"),
+            Output(cls.get_id(MATCH, "base"), "data"),
             Input(cls.get_id(MATCH, "x_axis_dropdown"), "value"),
             Input(cls.get_id(MATCH, "y_axis_dropdown"), "value"),
             Input(cls.get_id(MATCH, "color_dropdown"), "value"),
             Input(cls.get_id(MATCH, "symbol_dropdown"), "value"),
             Input({"type": "jitter-slider", "index": MATCH}, "value"),
             Input("data_frame_store", "data"),
-            Input("auxiliary_store", "data"),
+            State("auxiliary_store", "data"),
             Input("plotly-template", "data"),
+            Input({"type": "scatterplot", "index": MATCH}, "relayoutData"),
+            Input(ID_AUXILIARY_CONTENT, "data"),
+            State(cls.get_id(MATCH, "aggregated"), "data"),
             prevent_initial_call=False,
         )
         def tmp(
@@ -50,18 +66,30 @@ class Scatterplot(APlot):
             df,
             aux,
             template=None,
+            relayout=None,
+            aux_content=None,
+            aggregated=None,
         ):
             # Try branch for testing
             try:
-                if ctx.triggered_id == "data_frame_store":
-                    raise PreventUpdate()
-            except PreventUpdate:
-                raise
+                trigger = ctx.triggered_id
             except Exception:
-                pass
+                trigger = None
+
+            if trigger == "data_frame_store":
+                raise PreventUpdate()
+
+            relayout = Scatterplot.check_relayout(
+                trigger, relayout, aggregated
+            )
+            df = df_from_store(df)
+            if aggregated is None:
+                Scatterplot.check_relayout(
+                    trigger, relayout, Scatterplot.is_aggregated(df)
+                )
 
             fig = Scatterplot.render(
-                df_from_store(df),
+                df,
                 decode_aux(aux),
                 x_axis,
                 y_axis,
@@ -69,6 +97,8 @@ class Scatterplot(APlot):
                 symbol,
                 jitter,
                 template,
+                relayout,
+                overlay=False,
             )
 
             if fig is None:
@@ -76,6 +106,55 @@ class Scatterplot(APlot):
 
             return fig
 
+        @app.callback(
+            Output(cls.get_id(MATCH, "overlay"), "data"),
+            Input(cls.get_id(MATCH, "x_axis_dropdown"), "value"),
+            Input(cls.get_id(MATCH, "y_axis_dropdown"), "value"),
+            Input("auxiliary_store", "data"),
+            Input("plotly-template", "data"),
+            Input({"type": "scatterplot", "index": MATCH}, "relayoutData"),
+            State("data_frame_store", "data"),
+            State(cls.get_id(MATCH, "aggregated"), "data"),
+            prevent_initial_call=False,
+        )
+        def render_overlay(
+            x_axis, y_axis, aux, template, relayout, df, aggregated=None
+        ):
+            try:
+                trigger = ctx.triggered_id
+            except Exception:
+                trigger = None
+
+            relayout = Scatterplot.check_relayout(
+                trigger, relayout, aggregated
+            )
+            df = df_from_store(df)
+            if aggregated is None:
+                Scatterplot.check_relayout(
+                    trigger, relayout, Scatterplot.is_aggregated(df)
+                )
+
+            return Scatterplot.render_overlay(
+                df, decode_aux(aux), x_axis, y_axis, template, relayout
+            )
+
+        @app.callback(
+            Output(cls.get_id(MATCH, "aggregated"), "data"),
+            Input("data_frame_store", "data"),
+            Input(cls.get_id(MATCH, "aggregated"), "id"),
+            prevent_initial_call=False,
+        )
+        def update_aggregated(df, _id):
+            # Remembered, so that zooming does not need to load the data
+            return Scatterplot.is_aggregated(df_from_store(df))
+
+        register_overlay_callback(
+            app,
+            {"type": "scatterplot", "index": MATCH},
+            cls.get_id(MATCH, "base"),
+            cls.get_id(MATCH, "overlay"),
+        )
+
         @app.callback(
             Output({"type": "jitter-slider", "index": MATCH}, "max"),
             Input({"type": "x_axis_dropdown", "index": MATCH}, "value"),
@@ -116,13 +195,9 @@ class Scatterplot(APlot):
 
             if aux is None:
                 return dash.no_update
-            aux = decode_aux(aux)
-            selected = get_selected(aux)
-            selected[row] = not selected[row]
-            aux[SELECTED_COLUMN_NAME] = selected
 
             return dict(
-                aux=encode_aux(aux),
+                aux=toggle_selected(aux, row),
                 click_store=row,
                 scatter=[None] * len(click),
             )
@@ -162,38 +237,23 @@ class Scatterplot(APlot):
             if not selected_data:
                 return dash.no_update
 
-            updated = False
-
-            aux = decode_aux(aux)
-            clusters = get_clusters(aux)
-            if not selection_mode:
-                clusters = clusters.set_categories(["c1", "c2"])
-                clusters[:] = "c2"
-            else:
-                if cluster_id not in clusters.categories:
-                    clusters = clusters.add_categories([cluster_id])
-
+            rows = []
             for trigger in selected_data:
                 if not trigger or not trigger["points"]:
                     continue
 
-                updated = updated or len(trigger["points"]) > 0
-
                 try:
-                    if selection_mode:
-                        for p in trigger["points"]:
-                            clusters[p["customdata"][0]["index"]] = cluster_id
-                    else:
-                        for p in trigger["points"]:
-                            clusters[p["customdata"][0]["index"]] = "c1"
+                    for p in trigger["points"]:
+                        rows.append(int(p["customdata"][0]))
                 except Exception:
                     return dash.no_update
 
-            if not updated:
+            if len(rows) == 0:
                 return dash.no_update
 
-            aux[CLUSTER_COLUMN_NAME] = clusters
-            return encode_aux(aux)
+            if selection_mode:
+                return patch_aux(aux, CLUSTER_COLUMN_NAME, rows, cluster_id)
+            return patch_aux(aux, CLUSTER_COLUMN_NAME, rows, "c1", fill="c2")
 
         PlotData.register_callback(
             cls.name(),
@@ -242,6 +302,7 @@ class Scatterplot(APlot):
             handle_click_events,
             handle_hover_events,
             handle_cluster_drawing,
+            render_overlay,
         ]
 
     @staticmethod
@@ -254,8 +315,15 @@ class Scatterplot(APlot):
         symbol=None,
         jitter=None,
         template=None,
+        relayout=None,
+        overlay=True,
     ):
-        df = merge_df_aux(df, aux)
+        if overlay:
+            overlay = Scatterplot.render_overlay(
+                df, aux, x_axis, y_axis, template, relayout
+            )
+        df = merge_df_aux(df, aux, [x_axis, y_axis, color, symbol])
+        x_title, y_title = x_axis, y_axis
         if jitter:
             jitter = float(jitter)
         if type(jitter) == float:
@@ -271,24 +339,34 @@ class Scatterplot(APlot):
                 df[["jitter-x", "jitter-y"]] = jitter_df
 
                 # Set jitter results to the axes but keep the title of the axes
-                x_title, y_title = x_axis, y_axis
                 x_axis, y_axis = "jitter-x", "jitter-y"
 
-        sizes = [0.5] * df.shape[0]
+        rows = np.arange(len(df))
+        if is_aggregated(len(df)):
+            # Only render the points in the viewport, or their density if
+            # there are too many of them
+            x = df[x_axis].to_numpy("float64")
+            y = df[y_axis].to_numpy("float64")
+            x_range, y_range, rows = get_visible_rows(x, y, relayout)
+            if is_aggregated(len(rows)):
+                fig = Scatterplot.render_aggregated(
+                    x[rows],
+                    y[rows],
+                    x_range,
+                    y_range,
+                    x_title,
+                    y_title,
+                    json.dumps([x_axis, y_axis]),
+                    template,
+                )
+                return apply_overlay(fig, overlay)
+            df = df.iloc[rows].reset_index(drop=True)
+
         if color and color in df:
-            colors = df[color].copy()
+            df["__Color__"] = df[color]
         else:
-            colors = [""] * df.shape[0]
-        if SELECTED_COLUMN_NAME in aux:
-            for id in np.where(aux[SELECTED_COLUMN_NAME])[0]:
-                if isinstance(colors, pd.Series):
-                    colors = pd.Categorical(colors).add_categories("*")
-                sizes[id] = 5
-                colors[id] = "*"
-
-        df["__Sizes__"] = sizes
-        df["__Color__"] = colors
-        df["__Auxiliary__"] = [{"index": i} for i in range(len(df))]
+            df["__Color__"] = ""
+        df["__Auxiliary__"] = rows
 
         fig = px.scatter(
             data_frame=df,
@@ -296,14 +374,10 @@ class Scatterplot(APlot):
             y=y_axis,
             color="__Color__",
             symbol=symbol if symbol in df else None,
-            size="__Sizes__" if 5 in sizes else None,
             opacity=1,
-            color_discrete_map={
-                "*": "#DDD" if template and "dark" in template else "#333",
-                **cluster_colours(),
-            },
+            color_discrete_map=cluster_colours(),
             custom_data=["__Auxiliary__"],
-            hover_data={"__Color__": False, "__Sizes__": False},
+            hover_data={"__Color__": False},
             render_mode="webgl",
             template=template,
         )
@@ -312,11 +386,136 @@ class Scatterplot(APlot):
         )
         fig.update(layout_coloraxis_showscale=False)
         fig.update_traces(marker={"line": {"width": 0}})
+        # px also packs the hidden hover_data into the customdata, only
+        # send the integer row indices
+        fig.for_each_trace(
+            lambda t: t.update(
+                customdata=np.asarray(t.customdata)[:, :1].astype(np.int64)
+            )
+        )
 
         if jitter:
             fig.update_xaxes(title=x_title)
             fig.update_yaxes(title=y_title)
 
+        return apply_overlay(fig, overlay)
+
+    @staticmethod
+    def render_overlay(df, aux, x_axis, y_axis, template=None, relayout=None):
+        """Highlight the selected points, which are drawn on top of the
+        density heatmap if the scatterplot is aggregated."""
+        if SELECTED_COLUMN_NAME in aux:
+            selected = np.flatnonzero(aux[SELECTED_COLUMN_NAME])
+        else:
+            selected = np.zeros(0, dtype=np.int64)
+        color = "#DDD" if template and "dark" in template else "#333"
+
+        fig = None
+        if len(selected) > 0 and Scatterplot.is_aggregated(df):
+            df = merge_df_aux_columns(df, aux, [x_axis, y_axis])
+            x = df[x_axis].to_numpy("float64")
+            y = df[y_axis].to_numpy("float64")
+            if is_aggregated(len(get_visible_rows(x, y, relayout)[2])):
+                fig = go.Figure(
+                    go.Scattergl(
+                        x=x[selected],
+                        y=y[selected],
+                        mode="markers",
+                        marker=dict(size=5, color=color),
+                        customdata=selected[:, np.newaxis],
+                    )
+                )
+
+        return create_overlay(
+            fig, selected=selected, marker=dict(size=10, color=color)
+        )
+
+    @classmethod
+    def check_relayout(cls, trigger, relayout, aggregated=None):
+        """Check whether the plot has to be re-rendered after the trigger.
+
+        Args:
+            trigger: The id of the triggering component.
+            relayout: The relayout data of the plot.
+            aggregated: Whether the plot might be aggregated, None if unknown.
+
+        Raises:
+            PreventUpdate: If the plot is not changed by a zoom.
+
+        Returns:
+            The relayout data that applies to the plot.
+        """
+        if not isinstance(trigger, dict):
+            return relayout
+        if trigger["type"] == "scatterplot":
+            # Zooming only changes the aggregated scatterplots
+            if not is_viewport_change(relayout) or aggregated is False:
+                raise PreventUpdate()
+        elif trigger["type"] in (
+            cls.get_id(None, "x_axis_dropdown")["type"],
+            cls.get_id(None, "y_axis_dropdown")["type"],
+        ):
+            # The zoom of the previous axes does not apply
+            return None
+        return relayout
+
+    @staticmethod
+    def is_aggregated(df) -> bool:
+        """Check if the scatterplot of the data might be aggregated, in which
+        case it depends on the zoom."""
+        return is_aggregated(len(df))
+
+    @staticmethod
+    def render_aggregated(
+        x,
+        y,
+        x_range,
+        y_range,
+        x_title,
+        y_title,
+        uirevision,
+        template=None,
+    ):
+        """Render the density of the points in the viewport as a heatmap."""
+        counts, x_centers, y_centers = aggregate_points(x, y, x_range, y_range)
+        density = np.log1p(counts.astype(np.float64))
+        density[counts == 0] = np.nan
+
+        fig = go.Figure(
+            go.Heatmap(
+                x=x_centers,
+                y=y_centers,
+                z=density,
+                text=counts,
+                colorscale="Viridis",
+                showscale=False,
+                hoverongaps=False,
+                hovertemplate="%{text} points<extra></extra>",
+            )
+        )
+        fig.update_layout(
+            template=template,
+            showlegend=False,
+            uirevision=uirevision,
+            xaxis=dict(title=x_title, range=list(x_range)),
+            yaxis=dict(title=y_title, range=list(y_range)),
+            annotations=[
+                dict(
+                    text=(
+                        f"Density of {len(x):,} points, zoom in to see the"
+                        " individual points"
+                    ),
+                    xref="paper",
+                    yref="paper",
+                    x=0,
+                    y=1,
+                    xanchor="left",
+                    yanchor="bottom",
+                    showarrow=False,
+                )
+            ],
+        )
+
         return fig
 
     @classmethod
@@ -352,10 +551,11 @@ class Scatterplot(APlot):
         scatter_symbol = config.get("symbol", CLUSTER_COLUMN_NAME)
         jitter_slider = config.get("jitter", 0.0)
 
-        df["__Auxiliary__"] = [{"index": i} for i in range(len(df))]
-
         return [
             dcc.Graph(id={"type": "scatterplot", "index": index}),
+            dcc.Store(id=cls.get_id(index, "base")),
+            dcc.Store(id=cls.get_id(index, "overlay")),
+            dcc.Store(id=cls.get_id(index, "aggregated")),
             layout_wrapper(
                 component=ColumnDropdown(
                     cls.get_id(index, "x_axis_dropdown"),
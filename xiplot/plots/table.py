@@ -20,8 +20,8 @@ from xiplot.utils.auxiliary import (
     CLUSTER_COLUMN_NAME,
     SELECTED_COLUMN_NAME,
     decode_aux,
-    encode_aux,
     merge_df_aux,
+    update_selected,
 )
 from xiplot.utils.cluster import cluster_colours
 from xiplot.utils.components import (
@@ -30,6 +30,7 @@ from xiplot.utils.components import (
     FlexRow,
     PlotData,
 )
+from xiplot.utils.lazy import to_pandas
 from xiplot.utils.regex import get_columns_by_regex
 from xiplot.utils.table import get_sort_by, get_updated_item
 
@@ -111,12 +112,7 @@ class Table(APlot):
             except Exception:
                 selected_rows_checkbox = selected_rows_checkbox[0]
 
-            aux = decode_aux(aux)
-            result = [False] * aux.shape[0]
-            for row in selected_rows_checkbox:
-                result[row] = True
-            aux[SELECTED_COLUMN_NAME] = result
-            return encode_aux(aux)
+            return update_selected(aux, selected_rows_checkbox)
 
         @app.callback(
             output=dict(
@@ -238,7 +234,6 @@ class Table(APlot):
     def create_new_layout(cls, index, df, columns, config=dict()):
         import jsonschema
 
-        df = df.rename_axis("index_copy")
         columns = df.columns.to_list()
         jsonschema.validate(
             instance=config,
@@ -281,6 +276,8 @@ class Table(APlot):
         filter_query = config.get("query", "")
         page_current = config.get("page", 0)
 
+        df = to_pandas(df[columns]).rename_axis("index_copy")
+
         for c in columns:
             if type(df[c][0]) == np.ndarray:
                 df = df.astype({c: str})
@@ -35,6 +35,9 @@ from xiplot.utils.components import (  # noqa: F401
 # IDs for important `dcc.Store` components:
 ID_DATAFRAME = "data_frame_store"  # Main dataframe (readonly)
 ID_AUXILIARY = "auxiliary_store"  # Additional dataframe (editable)
+# `dcc.Store` that changes when the auxiliary data changes in other ways than
+# the selection (plots that draw the selection as an overlay depend on this)
+ID_AUXILIARY_CONTENT = "auxiliary_content_store"
 ID_METADATA = "metadata_store"
 ID_HOVERED = "lastly_hovered_point_store"
 ID_CLICKED = "lastly_clicked_point_store"
@@ -1,4 +1,8 @@
+import secrets
+from warnings import warn
+
 import dash_extensions.enrich as enrich
+import flask
 import pandas as pd
 from dash_extensions.enrich import (
     CycleBreakerTransform,
@@ -8,28 +12,84 @@ from dash_extensions.enrich import (
 )
 
 from xiplot.app import XiPlot
-from xiplot.utils.store import ServerSideStoreBackend
+from xiplot.utils.auxiliary import set_aux_server_side
+from xiplot.utils.catalog import set_catalog_dir
+from xiplot.utils.dataframe import (
+    set_bundle_compression,
+    set_dataframe_cache_memory,
+    set_dataframe_compaction,
+)
+from xiplot.utils.download import register_download_route
+from xiplot.utils.lazy import LazyDataFrame, set_lazy_loading
+from xiplot.utils.scatterplot import set_scatter_aggregation
+from xiplot.utils.store import (
+    ServerSideStoreBackend,
+    SpillingServerSideStoreBackend,
+    get_store_codec,
+    is_store_codec_supported,
+)
+from xiplot.utils.upload import register_upload_route
 
 
 def setup_xiplot_dash_app(
-    unsafe_local_server=False, data_dir="", plugin_dir="", **kwargs
+    unsafe_local_server=False,
+    data_dir="",
+    plugin_dir="",
+    store_codec="json",
+    cache_max_memory=None,
+    cache_ttl=None,
+    cache_dir=None,
+    cache_stats=False,
+    cache_session_max_memory=None,
+    file_cache_max_memory=None,
+    compact_data=False,
+    compact_rtol=0.0,
+    bundle_compression="gz",
+    bundle_compression_level=None,
+    scatter_aggregate_threshold=200_000,
+    **kwargs,
 ):
     dash_transforms = [
         MultiplexerTransform(),
         CycleBreakerTransform(),
     ]
 
+    backend = None
+
+    if file_cache_max_memory is not None:
+        set_dataframe_cache_memory(file_cache_max_memory)
+    set_dataframe_compaction(compact_data, rtol=compact_rtol)
+    set_bundle_compression(bundle_compression, bundle_compression_level)
+    set_scatter_aggregation(scatter_aggregate_threshold)
+    # The data catalog is only saved in the cache directory, never in the
+    # data directory
+    set_catalog_dir(cache_dir or None)
+
     if unsafe_local_server:
+        set_lazy_loading(True)
+        backend_kwargs = dict(
+            max_memory=cache_max_memory,
+            ttl=cache_ttl,
+            session_max_memory=cache_session_max_memory,
+        )
+        if cache_dir:
+            backend = SpillingServerSideStoreBackend(
+                cache_dir, **backend_kwargs
+            )
+        else:
+            backend = ServerSideStoreBackend(**backend_kwargs)
+        set_aux_server_side(True, backend)
+        # The cached values are scoped to the (cookie-based) user session
         dash_transforms.append(
             ServersideOutputTransform(
-                backend=ServerSideStoreBackend(),
-                session_check=False,
+                backend=backend,
+                session_check=True,
                 arg_check=False,
             )
         )
 
         def df_from_store(df):
-            if isinstance(df, pd.DataFrame):
+            if isinstance(df, (pd.DataFrame, LazyDataFrame)):
                 return df.copy(deep=False)
             return df
 
@@ -37,12 +97,14 @@ def setup_xiplot_dash_app(
             return df
 
     else:
+        if not is_store_codec_supported(store_codec):
+            warn(
+                f"The store codec '{store_codec}' is not supported, falling"
+                " back to 'json'"
+            )
+            store_codec = "json"
 
-        def df_from_store(df):
-            return pd.read_json(df, orient="split")
-
-        def df_to_store(df):
-            return df.to_json(date_format="iso", orient="split")
+        df_to_store, df_from_store = get_store_codec(store_codec)
 
     dash = DashProxy(
         "xiplot.app",
@@ -51,6 +113,18 @@ def setup_xiplot_dash_app(
         prevent_initial_callbacks=True,
         **kwargs,
     )
+    register_download_route(dash)
+    register_upload_route(dash)
+
+    if backend is not None:
+        if not dash.server.secret_key:
+            dash.server.secret_key = secrets.token_hex(32)
+
+    if backend is not None and cache_stats:
+        # Opt-in, since the statistics cover all the sessions
+        @dash.server.route("/_xiplot/store-stats")
+        def store_stats():
+            return flask.jsonify(backend.get_stats())
 
     _app = XiPlot(  # noqa: F841
         app=dash,
@@ -18,6 +18,7 @@ from xiplot.utils.cluster import KMeans, cluster_colours
 from xiplot.utils.components import ClusterDropdown, ColumnDropdown, FlexRow
 from xiplot.utils.dataframe import get_numeric_columns
 from xiplot.utils.layouts import layout_wrapper
+from xiplot.utils.lazy import to_pandas
 from xiplot.utils.regex import get_columns_by_regex
 
 
@@ -405,7 +406,7 @@ class Cluster(Tab):
 
         columns = get_numeric_columns(df)
         new_features = get_columns_by_regex(columns, features)
-        x = scaler.fit_transform(df[new_features])
+        x = scaler.fit_transform(to_pandas(df[new_features]))
         x = imputer.fit_transform(x)
 
         km = KMeans(n_clusters=int(n_clusters)).fit_predict(x)
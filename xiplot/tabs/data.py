@@ -1,4 +1,5 @@
 import base64
+import sys
 import uuid
 from collections import OrderedDict
 from io import BytesIO
@@ -11,7 +12,7 @@ from dash.exceptions import PreventUpdate
 from dash_extensions.enrich import ServersideOutput
 
 from xiplot.tabs import Tab
-from xiplot.utils import generate_id
+from xiplot.utils import generate_id, lazy
 from xiplot.utils.auxiliary import (
     CLUSTER_COLUMN_NAME,
     SELECTED_COLUMN_NAME,
@@ -19,22 +20,86 @@ from xiplot.utils.auxiliary import (
     encode_aux,
     get_clusters,
 )
+from xiplot.utils.cache import LRUCache
+from xiplot.utils.catalog import get_catalog
 from xiplot.utils.cluster import cluster_colours
 from xiplot.utils.components import FlexRow, PlotData
 from xiplot.utils.dataframe import (
+    DATAFRAME_FORMATS,
+    compact_loaded_dataframe,
     get_data_filepaths,
+    read_dataframe_from_path_cached,
     read_dataframe_with_extension,
+    read_progress,
     write_dataframe_and_metadata,
-    write_functions,
     write_only_dataframe,
 )
+from xiplot.utils.download import (
+    CLIENTSIDE_DOWNLOAD,
+    create_download,
+    is_download_route_enabled,
+)
 from xiplot.utils.io import FinallyCloseBytesIO
 from xiplot.utils.layouts import layout_wrapper
+from xiplot.utils.lazy import read_lazy_dataframe, to_pandas
+from xiplot.utils.prefetch import PREFETCHER
+from xiplot.utils.upload import (
+    UPLOAD_DIR,
+    clientside_upload,
+    is_upload_route_enabled,
+    read_uploaded_dataframe,
+)
 
 
 class Data(Tab):
     @staticmethod
     def register_callbacks(app, df_from_store, df_to_store, data_dir=""):
+        # Progress of the data files that are being loaded, by load token
+        # (see `data-load-token`), None once the load has finished
+        load_progress = LRUCache(maxsize=256)
+
+        # Index the data files in the background, see `refresh_catalog`
+        get_catalog(data_dir).refresh_in_background()
+
+        @app.callback(
+            Output("data-prefetch-file", "data"),
+            Input("data_files", "value"),
+            State("data-prefetch-file", "data"),
+        )
+        def prefetch_file(filepath, previous):
+            if previous is not None:
+                PREFETCHER.cancel(previous)
+            if not filepath or Path(filepath).parent == Path("uploads"):
+                return None
+
+            # Start parsing the selected file before "Load" is clicked
+            filepath = Path(data_dir) / Path(filepath).name
+            return str(filepath) if PREFETCHER.prefetch(filepath) else None
+
+        @app.callback(
+            Output("data_files", "options"),
+            Output("data-catalog-version", "data"),
+            Input("data-catalog-interval", "n_intervals"),
+            State("data-catalog-version", "data"),
+            State("data_files", "options"),
+        )
+        def refresh_catalog(n_intervals, version, options):
+            catalog = get_catalog(data_dir)
+            # Only the new and changed files are described again
+            catalog.refresh_in_background()
+            if catalog.version == version:
+                raise PreventUpdate()
+
+            uploads = [
+                option
+                for option in options or []
+                if Path(option["value"]).parent == Path("uploads")
+            ]
+            return (
+                uploads + generate_data_file_options(data_dir),
+                catalog.version,
+            )
+
         try:
             import dash_uploader as du
 
@@ -64,7 +129,7 @@ class Data(Tab):
                 )
 
                 try:
-                    df, aux, meta = read_dataframe_with_extension(
+                    df, aux, meta = read_uploaded_dataframe(
                         upload_path, upload_path.name
                     )
                 except Exception as err:
@@ -95,8 +160,8 @@ class Data(Tab):
                             autoClose=10000,
                         ),
                     )
-                finally:
-                    upload_path.unlink()
+
+                df, _ = compact_loaded_dataframe(df)
 
                 return (
                     df_to_store(df),
@@ -109,85 +174,198 @@ class Data(Tab):
                 )
 
         except (ImportError, AttributeError):
+            if is_upload_route_enabled():
+                # Send the file to the upload route in chunks instead of
+                # sending the base64 contents to the upload callback
+                app.clientside_callback(
+                    clientside_upload(),
+                    Output("file_uploader", "contents"),
+                    Output("file_uploader", "filename"),
+                    Output("file_uploader_chunked", "data"),
+                    Input("file_uploader", "contents"),
+                    State("file_uploader", "filename"),
+                )
 
-            @app.callback(
-                ServersideOutput("uploaded_data_file_store", "data"),
-                ServersideOutput("uploaded_auxiliary_store", "data"),
-                Output("uploaded_metadata_store", "data"),
-                Output("data_files", "options"),
-                Output("data_files", "value"),
-                Output("file_uploader", "contents"),
-                Output("file_uploader", "filename"),
-                Output("data-tab-upload-notify-container", "children"),
-                Input("file_uploader", "contents"),
-                State("file_uploader", "filename"),
-            )
-            def upload(contents, upload_name):
-                if contents is None:
-                    raise PreventUpdate()
+                @app.callback(
+                    ServersideOutput("uploaded_data_file_store", "data"),
+                    ServersideOutput("uploaded_auxiliary_store", "data"),
+                    Output("uploaded_metadata_store", "data"),
+                    Output("data_files", "options"),
+                    Output("data_files", "value"),
+                    Output("data-tab-upload-notify-container", "children"),
+                    Input("file_uploader_chunked", "data"),
+                )
+                def upload_chunked(upload):
+                    if upload is None:
+                        raise PreventUpdate()
 
-                upload_name = Path(upload_name)
-                _content_type, content_string = contents.split(",")
-                decoded = base64.b64decode(content_string)
+                    upload_name = Path(upload["filename"])
 
-                try:
-                    df, aux, meta = read_dataframe_with_extension(
-                        BytesIO(decoded), upload_name
+                    try:
+                        if "error" in upload:
+                            raise Exception(upload["error"])
+                        df, aux, meta = read_uploaded_dataframe(
+                            UPLOAD_DIR / upload_name.name,
+                            upload_name.name,
+                            upload["hash"],
+                        )
+                    except Exception as err:
+                        return (
+                            dash.no_update,
+                            dash.no_update,
+                            dash.no_update,
+                            dash.no_update,
+                            dash.no_update,
+                            dmc.Notification(
+                                id=str(uuid.uuid4()),
+                                color="yellow",
+                                title="Warning",
+                                message=[
+                                    html.Div(
+                                        [
+                                            f"The file {upload_name} ",
+                                            html.I("(upload)"),
+                                            (
+                                                " could not be loaded as a"
+                                                f" data frame: {err}."
+                                            ),
+                                        ]
+                                    )
+                                ],
+                                action="show",
+                                autoClose=10000,
+                            ),
+                        )
+
+                    df, _ = compact_loaded_dataframe(df)
+
+                    return (
+                        df_to_store(df),
+                        encode_aux(aux),
+                        meta,
+                        generate_dataframe_options(upload_name, data_dir),
+                        str(Path("uploads") / upload_name.name),
+                        None,
                     )
-                except Exception as err:
+
+            else:
+
+                @app.callback(
+                    ServersideOutput("uploaded_data_file_store", "data"),
+                    ServersideOutput("uploaded_auxiliary_store", "data"),
+                    Output("uploaded_metadata_store", "data"),
+                    Output("data_files", "options"),
+                    Output("data_files", "value"),
+                    Output("file_uploader", "contents"),
+                    Output("file_uploader", "filename"),
+                    Output("data-tab-upload-notify-container", "children"),
+                    Input("file_uploader", "contents"),
+                    State("file_uploader", "filename"),
+                )
+                def upload(contents, upload_name):
+                    if contents is None:
+                        raise PreventUpdate()
+
+                    upload_name = Path(upload_name)
+                    _content_type, content_string = contents.split(",")
+                    decoded = base64.b64decode(content_string)
+
+                    try:
+                        df, aux, meta = read_dataframe_with_extension(
+                            BytesIO(decoded), upload_name
+                        )
+                    except Exception as err:
+                        return (
+                            dash.no_update,
+                            dash.no_update,
+                            dash.no_update,
+                            dash.no_update,
+                            dash.no_update,
+                            None,
+                            None,
+                            dmc.Notification(
+                                id=str(uuid.uuid4()),
+                                color="yellow",
+                                title="Warning",
+                                message=[
+                                    html.Div(
+                                        [
+                                            f"The file {upload_name} ",
+                                            html.I("(upload)"),
+                                            (
+                                                " could not be loaded as a data"
+                                                f" frame: {err}."
+                                            ),
+                                        ]
+                                    )
+                                ],
+                                action="show",
+                                autoClose=10000,
+                            ),
+                        )
+
+                    df, _ = compact_loaded_dataframe(df)
+
                     return (
-                        dash.no_update,
-                        dash.no_update,
-                        dash.no_update,
-                        dash.no_update,
-                        dash.no_update,
+                        df_to_store(df),
+                        encode_aux(aux),
+                        meta,
+                        generate_dataframe_options(upload_name, data_dir),
+                        str(Path("uploads") / upload_name.name),
+                        None,
                         None,
                         None,
-                        dmc.Notification(
-                            id=str(uuid.uuid4()),
-                            color="yellow",
-                            title="Warning",
-                            message=[
-                                html.Div(
-                                    [
-                                        f"The file {upload_name} ",
-                                        html.I("(upload)"),
-                                        (
-                                            " could not be loaded as a data"
-                                            f" frame: {err}."
-                                        ),
-                                    ]
-                                )
-                            ],
-                            action="show",
-                            autoClose=10000,
-                        ),
                     )
 
-                return (
-                    df_to_store(df),
-                    encode_aux(aux),
-                    meta,
-                    generate_dataframe_options(upload_name, data_dir),
-                    str(Path("uploads") / upload_name.name),
-                    None,
-                    None,
-                    None,
-                )
+        # Every click of "Load" gets a unique token that identifies its
+        # progress, also between sessions that load the same file
+        app.clientside_callback(
+            """
+            function (n_clicks) {
+                return Date.now().toString(36) + "-" +
+                    Math.random().toString(36).slice(2);
+            }
+            """,
+            Output("data-load-token", "data"),
+            Input("submit-button", "n_clicks"),
+        )
 
         @app.callback(
             ServersideOutput("data_frame_store", "data"),
             Output("auxiliary_store", "data"),
             Output("metadata_store", "data"),
             Output("data-tab-notify-container", "children"),
-            Input("submit-button", "n_clicks"),
+            Output("data-load-progress-interval", "disabled"),
+            Output("data-tab-progress-notify-container", "children"),
+            Input("data-load-token", "data"),
             Input("uploaded_data_file_store", "data"),
             Input("uploaded_auxiliary_store", "data"),
             Input("uploaded_metadata_store", "data"),
             State("data_files", "value"),
         )
         def choose_file(
-            data_btn,
+            token,
+            uploaded_data,
+            uploaded_aux,
+            uploaded_meta,
+            filepath,
+        ):
+            if ctx.triggered_id == "data-load-token":
+                load_progress.set(token, (0, 0, None))
+            try:
+                result = load_file(
+                    token, uploaded_data, uploaded_aux, uploaded_meta, filepath
+                )
+            except PreventUpdate:
+                result = (dash.no_update,) * 4
+            finally:
+                # The progress is always hidden, even if the load failed
+                if ctx.triggered_id == "data-load-token":
+                    load_progress.set(token, None)
+            return (*result, True, hide_load_progress())
+
+        def load_file(
+            token,
             uploaded_data,
             uploaded_aux,
             uploaded_meta,
@@ -197,8 +375,6 @@ class Data(Tab):
 
             if not filepath:
                 return (
-                    dash.no_update,
-                    dash.no_update,
                     dash.no_update,
                     dash.no_update,
                     dash.no_update,
@@ -216,7 +392,7 @@ class Data(Tab):
 
             notification = None
 
-            if trigger == "submit-button":
+            if trigger == "data-load-token":
                 if str(list(filepath.parents)[0]) == "uploads":
                     df_store = uploaded_data
                     aux_store = uploaded_aux
@@ -241,16 +417,30 @@ class Data(Tab):
                 else:
                     filepath = Path(data_dir) / filepath.name
 
+                    def report_progress(rows, nbytes, total):
+                        load_progress.set(token, (rows, nbytes, total))
+
                     try:
-                        df, aux, meta = read_dataframe_with_extension(
-                            filepath, filepath.name
+                        df, aux, meta = (
+                            read_lazy_dataframe(filepath, filepath.name)
+                            if lazy.LAZY_LOADING
+                            else (None, None, None)
                         )
+                        if df is None:
+                            # The file may already be parsed (or being
+                            # parsed) since it was selected
+                            PREFETCHER.wait(filepath, report_progress)
+                            with read_progress(report_progress):
+                                df, aux, meta = (
+                                    read_dataframe_from_path_cached(
+                                        filepath, filepath.name
+                                    )
+                                )
                     except Exception as err:
                         return (
                             dash.no_update,
                             dash.no_update,
                             dash.no_update,
-                            dash.no_update,
                             dmc.Notification(
                                 id=str(uuid.uuid4()),
                                 color="yellow",
@@ -264,17 +454,26 @@ class Data(Tab):
                             ),
                         )
 
+                    df, saved = compact_loaded_dataframe(df)
+
                     df_store = df_to_store(df)
                     aux_store = encode_aux(aux)
 
+                    message = (
+                        f"The data file {meta['filename']} was loaded"
+                        " successfully!"
+                    )
+                    if saved > 0:
+                        message += (
+                            f" Compacting the data saved {saved / 2**20:.1f}"
+                            " MB of memory."
+                        )
+
                     notification = dmc.Notification(
                         id=str(uuid.uuid4()),
                         color="green",
                         title="Success",
-                        message=(
-                            f"The data file {meta['filename']} was loaded"
-                            " successfully!"
-                        ),
+                        message=message,
                         action="show",
                         autoClose=5000,
                     )
@@ -384,8 +583,68 @@ class Data(Tab):
                 notification,
             )
 
+        def is_load_finished(token):
+            return (
+                load_progress.has(token) and load_progress.get(token) is None
+            )
+
+        @app.callback(
+            Output("data-load-progress-interval", "disabled"),
+            Output("data-tab-progress-notify-container", "children"),
+            Input("data-load-token", "data"),
+            State("data_files", "value"),
+        )
+        def start_load_progress(token, filepath):
+            if not filepath or str(list(Path(filepath).parents)[0]) == (
+                "uploads"
+            ):
+                raise PreventUpdate()
+            if is_load_finished(token):
+                # The file was loaded before this callback ran
+                raise PreventUpdate()
+
+            return False, dmc.Notification(
+                id="data-load-progress",
+                title="Loading",
+                message=f"Loading the data file {Path(filepath).name}...",
+                loading=True,
+                autoClose=False,
+                action="show",
+            )
+
+        @app.callback(
+            Output("data-load-progress-interval", "disabled"),
+            Output("data-tab-progress-notify-container", "children"),
+            Input("data-load-progress-interval", "n_intervals"),
+            State("data-load-token", "data"),
+            State("data_files", "value"),
+        )
+        def update_load_progress(n_intervals, token, filepath):
+            if token is None or is_load_finished(token):
+                # E.g. the progress was shown after the load had finished
+                return True, hide_load_progress()
+
+            progress = load_progress.get(token)
+            if progress is None or not filepath:
+                raise PreventUpdate()
+
+            rows, nbytes, total = progress
+            message = f"Read {rows:,} rows"
+            if total:
+                message += f" ({nbytes / 2**20:.1f} of {total / 2**20:.1f} MB)"
+
+            return dash.no_update, dmc.Notification(
+                id="data-load-progress",
+                title=f"Loading {Path(filepath).name}",
+                message=message,
+                loading=True,
+                autoClose=False,
+                action="update",
+            )
+
         @app.callback(
             Output("data-download", "data"),
+            Output("data-download-url", "data"),
             Output("data-tab-download-notify-container", "children"),
             Input("download-data-file-button", "n_clicks"),
             Input("download-plots-file-button", "n_clicks"),
@@ -407,106 +666,108 @@ class Data(Tab):
             plot_data,
             file_extension,
         ):
-            df = df_from_store(df)
+            df = to_pandas(df_from_store(df))
             aux = decode_aux(aux)
 
             if filepath is None or df is None:
-                return dash.no_update, dmc.Notification(
-                    id=str(uuid.uuid4()),
-                    color="yellow",
-                    title="Warning",
-                    message="You have not yet loaded any data file.",
-                    action="show",
-                    autoClose=10000,
+                return (
+                    dash.no_update,
+                    dash.no_update,
+                    dmc.Notification(
+                        id=str(uuid.uuid4()),
+                        color="yellow",
+                        title="Warning",
+                        message="You have not yet loaded any data file.",
+                        action="show",
+                        autoClose=10000,
+                    ),
                 )
 
             filepath = Path(filepath)
 
-            with FinallyCloseBytesIO() as file:
-                if ctx.triggered_id == "download-data-file-button":
-                    try:
-                        filename, mime = write_only_dataframe(
-                            df, meta["filename"], file, file_extension
-                        )
-                    except Exception as err:
-                        return dash.no_update, dmc.Notification(
-                            id=str(uuid.uuid4()),
-                            color="yellow",
-                            title="Warning",
-                            message=[
-                                html.Div(
-                                    [
-                                        (
-                                            "Failed to download the data file"
-                                            f" for {filepath.name}"
-                                        ),
-                                        (
-                                            html.I(" (upload)")
-                                            if ctx.triggered_id
-                                            == "uploaded_data_file_store"
-                                            else None
-                                        ),
-                                        f": {err}.",
-                                    ]
-                                )
-                            ],
-                            action="show",
-                            autoClose=10000,
-                        )
+            if ctx.triggered_id == "download-data-file-button":
+                error_message = "Failed to download the data file"
 
-                if ctx.triggered_id == "download-plots-file-button":
-                    try:
-                        for data in plot_data:
-                            index = data["index"]
-                            del data["index"]
-                            meta["plots"][index] = data
-
-                        filename, mime = write_dataframe_and_metadata(
-                            df,
-                            aux,
-                            meta,
-                            meta["filename"],
-                            file,
-                            file_extension,
-                        )
-                    except Exception as err:
-                        return dash.no_update, dmc.Notification(
-                            id=str(uuid.uuid4()),
-                            color="yellow",
-                            title="Warning",
-                            message=[
-                                html.Div(
-                                    [
-                                        (
-                                            "Failed to download plots and data"
-                                            f" file for {filepath.name}"
-                                        ),
-                                        (
-                                            html.I(" (upload)")
-                                            if ctx.triggered_id
-                                            == "uploaded_data_file_store"
-                                            else None
-                                        ),
-                                        f": {err}.",
-                                    ]
-                                )
-                            ],
-                            action="show",
-                            autoClose=10000,
-                        )
+                def write(file):
+                    return write_only_dataframe(
+                        df, meta["filename"], file, file_extension
+                    )
 
-                encoded = base64.b64encode(file.getvalue()).decode("ascii")
+            elif ctx.triggered_id == "download-plots-file-button":
+                error_message = "Failed to download plots and data file"
+
+                def write(file):
+                    for data in plot_data:
+                        index = data["index"]
+                        del data["index"]
+                        meta["plots"][index] = data
+
+                    return write_dataframe_and_metadata(
+                        df,
+                        aux,
+                        meta,
+                        meta["filename"],
+                        file,
+                        file_extension,
+                    )
 
+            else:
+                raise PreventUpdate()
+
+            try:
+                if is_download_route_enabled():
+                    return dash.no_update, create_download(write), None
+
+                with FinallyCloseBytesIO() as file:
+                    filename, mime = write(file)
+                    encoded = base64.b64encode(file.getbuffer()).decode(
+                        "ascii"
+                    )
+            except Exception as err:
                 return (
-                    dict(
-                        base64=True,
-                        content=encoded,
-                        filename=filename,
-                        type=mime,
+                    dash.no_update,
+                    dash.no_update,
+                    dmc.Notification(
+                        id=str(uuid.uuid4()),
+                        color="yellow",
+                        title="Warning",
+                        message=[
+                            html.Div(
+                                [
+                                    f"{error_message} for {filepath.name}",
+                                    (
+                                        html.I(" (upload)")
+                                        if ctx.triggered_id
+                                        == "uploaded_data_file_store"
+                                        else None
+                                    ),
+                                    f": {err}.",
+                                ]
+                            )
+                        ],
+                        action="show",
+                        autoClose=10000,
                     ),
-                    None,
                 )
 
+            return (
+                dict(
+                    base64=True,
+                    content=encoded,
+                    filename=filename,
+                    type=mime,
+                ),
+                dash.no_update,
+                None,
+            )
+
+        app.clientside_callback(
+            CLIENTSIDE_DOWNLOAD,
+            Output("data-download-url", "clear_data"),
+            Input("data-download-url", "data"),
+            prevent_initial_call=True,
+        )
+
     @staticmethod
     def create_layout(data_dir=""):
         try:
@@ -536,12 +797,7 @@ class Data(Tab):
                     layout_wrapper(
                         component=FlexRow(
                             dcc.Dropdown(
-                                [
-                                    {"label": fp.name, "value": str(fp)}
-                                    for fp in get_data_filepaths(
-                                        data_dir=data_dir
-                                    )
-                                ],
+                                generate_data_file_options(data_dir),
                                 id="data_files",
                             ),
                             html.Button(
@@ -577,6 +833,7 @@ class Data(Tab):
                             dcc.Download(
                                 id="data-download",
                             ),
+                            dcc.Store(id="data-download-url"),
                         ],
                     ),
                 ],
@@ -597,9 +854,27 @@ class Data(Tab):
                 dcc.Store(id="uploaded_data_file_store"),
                 dcc.Store(id="uploaded_auxiliary_store"),
                 dcc.Store(id="uploaded_metadata_store"),
+                dcc.Store(id="file_uploader_chunked"),
+                dcc.Store(id="data-catalog-version"),
+                dcc.Store(id="data-load-token"),
+                dcc.Store(id="data-prefetch-file"),
+                dcc.Interval(
+                    id="data-catalog-interval",
+                    interval=10000,
+                    disabled=sys.platform == "emscripten",
+                ),
                 html.Div(
                     id="data-tab-notify-container", style={"display": "none"}
                 ),
+                html.Div(
+                    id="data-tab-progress-notify-container",
+                    style={"display": "none"},
+                ),
+                dcc.Interval(
+                    id="data-load-progress-interval",
+                    interval=500,
+                    disabled=True,
+                ),
                 html.Div(
                     id="data-tab-upload-notify-container",
                     style={"display": "none"},
@@ -612,9 +887,13 @@ class Data(Tab):
         )
 
 
+def hide_load_progress():
+    return dmc.Notification(id="data-load-progress", message="", action="hide")
+
+
 class WriteFormatDropdown(dcc.Dropdown):
     def __init__(self, **kwargs):
-        options = [ext for _, ext, _ in write_functions()]
+        options = DATAFRAME_FORMATS.write_extensions()
         super().__init__(
             options=options,
             multi=False,
@@ -630,7 +909,43 @@ def generate_dataframe_options(upload_path, data_dir):
             "label": html.Div([upload_path.name, " ", html.I("(upload)")]),
             "value": str(Path("uploads") / upload_path.name),
         }
-    ] + [
-        {"label": fp.name, "value": str(fp)}
+    ] + generate_data_file_options(data_dir)
+
+
+def generate_data_file_options(data_dir):
+    catalog = get_catalog(data_dir)
+    return [
+        generate_data_file_option(fp, catalog.get(fp))
         for fp in get_data_filepaths(data_dir=data_dir)
     ]
+
+
+def generate_data_file_option(filepath, entry=None):
+    """Create a dropdown option for a data file, showing the number of rows
+    and columns from its catalog `entry` (if it has been indexed)."""
+    if entry is None or "rows" not in entry:
+        return {"label": filepath.name, "value": str(filepath)}
+
+    columns = entry.get("columns", [])
+    if "dtypes" in entry:
+        columns = [f"{c} ({t})" for c, t in zip(columns, entry["dtypes"])]
+    title = ", ".join(columns[:50])
+    if len(columns) > 50:
+        title += f", ... ({len(columns) - 50} more)"
+
+    return {
+        "label": html.Div(
+            [
+                filepath.name,
+                " ",
+                html.Small(
+                    f"({entry['rows']} rows, {len(columns)} columns,"
+                    f" {entry['size'] / 2**20:.1f} MB)",
+                    className="data-file-info",
+                ),
+            ]
+        ),
+        "value": str(filepath),
+        "search": filepath.name,
+        "title": title,
+    }
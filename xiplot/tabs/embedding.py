@@ -9,6 +9,7 @@ from xiplot.tabs import Tab
 from xiplot.utils.auxiliary import decode_aux, encode_aux, merge_df_aux
 from xiplot.utils.components import ColumnDropdown, FlexRow
 from xiplot.utils.layouts import layout_wrapper
+from xiplot.utils.lazy import to_pandas
 from xiplot.utils.regex import get_columns_by_regex
 
 
@@ -17,7 +18,7 @@ def get_pca_columns(df, features):
     from sklearn.impute import SimpleImputer
     from sklearn.preprocessing import StandardScaler
 
-    x = df[features]
+    x = to_pandas(df[features])
     x = StandardScaler().fit_transform(x)
 
     mean_imputer = SimpleImputer(strategy="mean")
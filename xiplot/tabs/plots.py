@@ -14,12 +14,14 @@ from xiplot.plots.lineplot import Lineplot
 from xiplot.plots.scatterplot import Scatterplot
 from xiplot.plots.smiles import Smiles
 from xiplot.plots.table import Table
+from xiplot.plugin import ID_AUXILIARY_CONTENT
 from xiplot.tabs import Tab
 from xiplot.tabs.plugins import get_plugins_cached
 from xiplot.utils import generate_id
 from xiplot.utils.auxiliary import merge_df_aux
 from xiplot.utils.components import DeleteButton, FlexRow
 from xiplot.utils.layouts import layout_wrapper
+from xiplot.utils.overlay import register_aux_content_callback
 
 
 class Plots(Tab):
@@ -37,8 +39,7 @@ class Plots(Tab):
                 Heatmap,
                 Table,
                 Smiles,
-            ]
-            + [plot for (_, _, plot) in get_plugins_cached("plot")]
+            ] + [plot for (_, _, plot) in get_plugins_cached("plot")]
         }
 
     @staticmethod
@@ -48,6 +49,8 @@ class Plots(Tab):
                 app, df_from_store=df_from_store, df_to_store=df_to_store
             )
 
+        register_aux_content_callback(app, ID_AUXILIARY_CONTENT)
+
         @app.callback(
             Output("plots-tab-settings-session", "children"),
             Output("plots", "children"),
@@ -308,6 +311,7 @@ class Plots(Tab):
                 html.Div(
                     id="plots-tab-settings-session", style={"display": "none"}
                 ),
+                dcc.Store(id=ID_AUXILIARY_CONTENT),
             ],
             style={"display": "none"},
         )
@@ -1,10 +1,27 @@
-from typing import Optional, Sequence, Union
+import base64
+import hashlib
+import json
+from typing import Any, Dict, List, Literal, Optional, Sequence, Union
 
+import numpy as np
 import pandas as pd
 
+from xiplot.utils.cache import LRUCache
+from xiplot.utils.lazy import LazyDataFrame
+
 CLUSTER_COLUMN_NAME = "Xiplot_cluster"
 SELECTED_COLUMN_NAME = "Xiplot_selected"
 
+# Decoded auxiliary frames keyed by the version of the encoded store data
+AUX_CACHE = LRUCache(maxsize=16)
+# Base frames of patched stores that do not carry their table (see
+# `set_aux_server_side`), replaced by the session-scoped server-side store
+AUX_BASES = LRUCache(maxsize=32)
+AUX_SERVER_SIDE = False
+# Patched stores are compacted into a full table above these limits
+AUX_MAX_PATCHES = 64
+AUX_MAX_PATCHED_ROWS = 2**16
+
 
 def get_clusters(aux: pd.DataFrame, n: Optional[int] = None) -> pd.Categorical:
     """Get the cluster column from the auxiliary data.
@@ -57,34 +74,415 @@ def toggle_selected(
     Returns:
         Updated auxiliary data frame.
     """
-    encode = not isinstance(aux, pd.DataFrame)
-    if encode:
-        aux = decode_aux(aux)
-    selected = get_selected(aux, n)
     if isinstance(rows, int):
         rows = (rows,)
-    for row in rows:
-        selected[row] = not selected[row]
-    aux[SELECTED_COLUMN_NAME] = selected
-    if encode:
-        aux = encode_aux(aux)
-    return aux
+    if n is not None and isinstance(aux, pd.DataFrame):
+        aux[SELECTED_COLUMN_NAME] = get_selected(aux, n).to_numpy()
+    return patch_aux(aux, SELECTED_COLUMN_NAME, rows, op="toggle")
+
+
+def update_selected(
+    aux: Union[Dict[str, Any], pd.DataFrame],
+    rows: Union[Sequence[int], np.ndarray],
+    op: Literal["set", "toggle", "union", "intersect", "invert"] = "set",
+) -> Union[Dict[str, Any], pd.DataFrame]:
+    """Update the selected column with a set operation.
+
+    Args:
+        aux: Auxiliary data from `encode_aux` (or a data frame, which is
+            modified in place).
+        rows: Row indices or a boolean mask.
+        op: "set" the selection to the rows, "toggle" the rows, add the
+            rows to the selection ("union"), keep only the selected rows
+            that are also in `rows` ("intersect"), or "invert" the whole
+            selection (ignoring `rows`). Defaults to "set".
+
+    Returns:
+        Updated auxiliary data (of the same kind as `aux`).
+    """
+    if op == "set":
+        return patch_aux(aux, SELECTED_COLUMN_NAME, rows, True, fill=False)
+    if op == "union":
+        return patch_aux(aux, SELECTED_COLUMN_NAME, rows, True)
+    return patch_aux(aux, SELECTED_COLUMN_NAME, rows, op=op)
+
+
+def pack_bitmap(mask: Union[Sequence[bool], np.ndarray]) -> Dict[str, Any]:
+    """Pack a boolean mask into a (base64 encoded) bitmap.
+
+    Args:
+        mask: Boolean mask.
+
+    Returns:
+        The length of the mask and the packed bits.
+    """
+    mask = np.asarray(mask, dtype=bool)
+    bits = base64.b64encode(np.packbits(mask).tobytes()).decode("ascii")
+    return dict(n=int(mask.shape[0]), bits=bits)
+
+
+def unpack_bitmap(
+    bitmap: Dict[str, Any], n: Optional[int] = None
+) -> np.ndarray:
+    """Unpack a bitmap from `pack_bitmap` into a boolean mask.
+
+    Args:
+        bitmap: Packed bitmap.
+        n: Length of the mask (the bitmap is padded or truncated to this
+            length). Defaults to the length of the packed mask.
+
+    Returns:
+        Boolean mask.
+    """
+    bits = np.frombuffer(base64.b64decode(bitmap["bits"]), dtype=np.uint8)
+    mask = np.unpackbits(bits, count=bitmap["n"]).astype(bool)
+    if n is None or n == mask.shape[0]:
+        return mask
+    if n < mask.shape[0]:
+        return mask[:n]
+    return np.concatenate((mask, np.zeros(n - mask.shape[0], dtype=bool)))
+
 
+def encode_rows(
+    rows: Union[Sequence[int], np.ndarray],
+) -> Union[List[int], Dict[str, Any]]:
+    """Encode row indices (or a boolean mask) as a list or a bitmap,
+    whichever is smaller."""
+    rows = np.asarray(rows)
+    if rows.dtype == bool:
+        rows = np.flatnonzero(rows)
+    rows = rows.astype(int)
+    if rows.shape[0] == 0:
+        return []
+    n = int(rows.max()) + 1
+    # Compare the JSON lengths of a list of indices and a base64 bitmap
+    if rows.shape[0] * (len(str(n)) + 2) > n // 6 + 32:
+        mask = np.zeros(n, dtype=bool)
+        mask[rows] = True
+        return pack_bitmap(mask)
+    return rows.tolist()
 
-def decode_aux(aux: str) -> pd.DataFrame:
+
+def decode_rows(
+    rows: Union[List[int], Dict[str, Any]], n: int
+) -> Union[np.ndarray, List[int]]:
+    """Decode rows from `encode_rows` (into something that can index a
+    numpy array of length `n`)."""
+    if isinstance(rows, dict):
+        return unpack_bitmap(rows, n)
+    return np.asarray(rows, dtype=int)
+
+
+def _count_rows(rows: Union[List[int], Dict[str, Any]]) -> int:
+    # Bitmaps are counted by their encoded length
+    return len(rows["bits"]) if isinstance(rows, dict) else len(rows)
+
+
+def aux_version(table: str) -> str:
+    """Compute the content version (hash) of an encoded auxiliary table."""
+    return hashlib.blake2b(table.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def decode_aux(aux: Union[str, Dict[str, Any], pd.DataFrame]) -> pd.DataFrame:
+    """Decode the auxiliary data from the store.
+
+    Decoded frames are memoized by their version, so that all callbacks
+    that are triggered by the same store update only parse it once.
+
+    Args:
+        aux: Auxiliary data from `encode_aux` (or a data frame).
+
+    Returns:
+        Auxiliary data frame (a copy that can be freely modified).
+    """
     if isinstance(aux, pd.DataFrame):
         return aux
-    return pd.read_json(aux, orient="table")
+    if isinstance(aux, dict):
+        version = aux["version"]
+    else:
+        version = aux_version(aux)
+        aux = dict(version=version, table=aux)
+
+    cached = AUX_CACHE.get(version)
+    if cached is None:
+        if "patches" in aux:
+            cached = _decode_aux_base(aux)
+            for patch in aux["patches"]:
+                cached = apply_aux_patch(cached, patch)
+        else:
+            cached = _decode_aux_table(aux)
+        AUX_CACHE.set(version, cached)
+    return cached.copy()
+
+
+def _decode_aux_table(aux: Dict[str, Any]) -> pd.DataFrame:
+    table = pd.read_json(aux["table"], orient="table")
+    if "selected" in aux:
+        selected = aux["selected"]
+        table.insert(
+            selected["loc"],
+            SELECTED_COLUMN_NAME,
+            unpack_bitmap(selected, table.shape[0]),
+        )
+    return table
+
+
+def _decode_aux_base(aux: Dict[str, Any]) -> pd.DataFrame:
+    base = AUX_CACHE.get(aux["base"])
+    if base is None:
+        base = AUX_BASES.get(_aux_base_key(aux["base"]))
+    if base is None:
+        if "table" not in aux:
+            raise Exception(
+                "The auxiliary data has expired on the server, please reload"
+                " the data file."
+            )
+        base = _decode_aux_table(aux)
+        AUX_CACHE.set(aux["base"], base)
+    return base.copy()
+
+
+def encode_aux(aux: pd.DataFrame) -> Dict[str, Any]:
+    """Encode the auxiliary data for the store.
+
+    Args:
+        aux: Auxiliary data frame.
+
+    The selected column is stored as a packed bitmap next to the table.
+
+    Returns:
+        The encoded table, its version, and the version of its content
+        other than the selection (see `aux_content`).
+    """
+    store = dict()
+    if (
+        SELECTED_COLUMN_NAME in aux
+        and aux.dtypes[SELECTED_COLUMN_NAME] == bool
+    ):
+        store["selected"] = dict(
+            loc=aux.columns.get_loc(SELECTED_COLUMN_NAME),
+            **pack_bitmap(aux[SELECTED_COLUMN_NAME]),
+        )
+        table = aux.drop(columns=SELECTED_COLUMN_NAME)
+    else:
+        table = aux
+    store["table"] = table.to_json(orient="table", index=False)
+    content = aux_version(store["table"])
+    version = aux_version(content + json.dumps(store.get("selected")))
+    if not AUX_CACHE.has(version):
+        AUX_CACHE.set(version, aux.reset_index(drop=True))
+    return dict(version=version, content=content, **store)
+
+
+def aux_content(aux: Union[str, Dict[str, Any]]) -> str:
+    """Get the version of the auxiliary data that ignores the selection, so
+    that it only changes when other columns change."""
+    if isinstance(aux, dict):
+        return aux.get("content", aux["version"])
+    return aux_version(aux)
+
+
+def set_aux_server_side(server_side: bool, store: Optional[Any] = None):
+    """Choose where the base table of a patched auxiliary store is kept.
+
+    By default a patched store carries its base table, so that the browser
+    remains the source of truth. If the server holds the state anyway (e.g.
+    with `--cache`), the base table is kept on the server and only the
+    patches are sent to the browser.
+
+    Args:
+        server_side: Keep the base tables on the server.
+        store: The server-side store (e.g. a `ServerSideStoreBackend`) that
+            keeps the base tables with the rest of the session state.
+            Defaults to None (a small cache in this process).
+    """
+    global AUX_SERVER_SIDE, AUX_BASES
+    AUX_SERVER_SIDE = server_side
+    if store is not None:
+        AUX_BASES = store
+
+
+def _aux_base_key(version: str) -> str:
+    return f"xiplot_aux_base_{version}"
+
+
+def patch_aux(
+    aux: Union[str, Dict[str, Any], pd.DataFrame],
+    column: str,
+    rows: Sequence[int],
+    value: Any = True,
+    op: Literal["set", "toggle", "intersect", "invert"] = "set",
+    fill: Optional[Any] = None,
+) -> Union[Dict[str, Any], pd.DataFrame]:
+    """Update some rows of an auxiliary column without re-encoding the
+    whole auxiliary data.
+
+    The update is appended as a patch to the store, so its cost is
+    proportional to the number of changed rows. Missing selection and
+    cluster columns are created with their default values.
+
+    Args:
+        aux: Auxiliary data from `encode_aux` (or a data frame, which is
+            modified in place).
+        column: Name of the column to update.
+        rows: Indices (or a boolean mask) of the rows to update.
+        value: New value for the rows (if `op="set"`). Defaults to True.
+        op: "set" the rows to `value`, or (for boolean columns) "toggle"
+            the rows, "intersect" the column with the rows, or "invert"
+            the whole column. Defaults to "set".
+        fill: Optional value that the whole column is set to before the
+            rows are updated. Defaults to None.
+
+    Returns:
+        Updated auxiliary data (of the same kind as `aux`).
+    """
+    patch = dict(column=column, rows=encode_rows(rows), op=op)
+    if op == "set":
+        patch["value"] = value
+    if fill is not None:
+        patch["fill"] = fill
+
+    if isinstance(aux, pd.DataFrame):
+        return apply_aux_patch(aux, patch)
+    if not isinstance(aux, dict):
+        aux = encode_aux(decode_aux(aux))
+
+    if "patches" in aux:
+        patches = aux["patches"] + [patch]
+        base = aux["base"]
+    else:
+        patches = [patch]
+        base = aux["version"]
+        if AUX_SERVER_SIDE and not AUX_BASES.has(_aux_base_key(base)):
+            AUX_BASES.set(
+                _aux_base_key(base), _decode_aux_base(dict(base=base, **aux))
+            )
+
+    # The content is derived from the patch whether or not the table is
+    # re-encoded below, so that the same content keeps the same version
+    if column == SELECTED_COLUMN_NAME:
+        content = aux_content(aux)
+    else:
+        content = aux_version(aux_content(aux) + json.dumps(patch))
+
+    if (
+        len(patches) > AUX_MAX_PATCHES
+        or sum(_count_rows(p["rows"]) for p in patches) > AUX_MAX_PATCHED_ROWS
+        # The base has expired on the server, so the full table is sent
+        or ("table" not in aux and not AUX_BASES.has(_aux_base_key(base)))
+    ):
+        encoded = encode_aux(apply_aux_patch(decode_aux(aux), patch))
+        encoded["content"] = content
+        return encoded
+
+    patched = dict(
+        version=aux_version(aux["version"] + json.dumps(patch)),
+        content=content,
+        base=base,
+        patches=patches,
+    )
+    if not AUX_SERVER_SIDE and "table" in aux:
+        patched["table"] = aux["table"]
+    return patched
+
 
+def apply_aux_patch(aux: pd.DataFrame, patch: Dict[str, Any]) -> pd.DataFrame:
+    """Apply a patch (from `patch_aux`) to an auxiliary data frame in place.
 
-def encode_aux(aux: pd.DataFrame) -> str:
-    return aux.to_json(orient="table", index=False)
+    Args:
+        aux: Auxiliary data frame.
+        patch: Patch to apply.
+
+    Returns:
+        The updated auxiliary data frame.
+    """
+    column = patch["column"]
+    rows = decode_rows(patch["rows"], aux.shape[0])
+
+    if column == SELECTED_COLUMN_NAME:
+        values = get_selected(aux).to_numpy(dtype=bool, copy=True)
+    elif column == CLUSTER_COLUMN_NAME:
+        values = get_clusters(aux)
+    elif column in aux:
+        values = aux[column].to_numpy(copy=True)
+    else:
+        values = np.full(aux.shape[0], np.nan, dtype=object)
+
+    if isinstance(values, pd.Categorical):
+        new = [patch[k] for k in ("fill", "value") if k in patch]
+        new = [c for c in dict.fromkeys(new) if c not in values.categories]
+        if len(new) > 0:
+            values = values.add_categories(new)
+
+    if "fill" in patch:
+        values[:] = patch["fill"]
+    if patch["op"] == "toggle":
+        values[rows] = ~values[rows]
+    elif patch["op"] == "intersect":
+        mask = np.zeros(values.shape[0], dtype=bool)
+        mask[rows] = True
+        values &= mask
+    elif patch["op"] == "invert":
+        values = ~values
+    else:
+        values[rows] = patch["value"]
+
+    if isinstance(values, pd.Categorical) and "fill" in patch:
+        values = values.remove_unused_categories()
+    aux[column] = values
+    return aux
 
 
 def merge_df_aux(
-    df: pd.DataFrame, aux: Union[str, pd.DataFrame]
+    df: pd.DataFrame,
+    aux: Union[str, pd.DataFrame],
+    columns: Optional[Sequence[Optional[str]]] = None,
 ) -> pd.DataFrame:
+    """Merge the data and auxiliary dataframes.
+
+    Args:
+        df: The data, possibly a `LazyDataFrame`.
+        aux: The auxiliary data (or its store data).
+        columns: Columns of the data that are used, only these columns of a
+            `LazyDataFrame` are read. Defaults to None (the merged frame stays
+            lazy).
+
+    Returns:
+        The merged dataframe.
+    """
     if not isinstance(aux, pd.DataFrame):
         aux = decode_aux(aux)
+    if isinstance(df, LazyDataFrame):
+        if columns is None:
+            return df.with_columns(aux)
+        df = df.materialize(
+            [c for c in dict.fromkeys(columns) if c in df and c not in aux]
+        )
     aux.index = df.index
     return pd.concat((df, aux), axis=1)
+
+
+def merge_df_aux_columns(
+    df: pd.DataFrame,
+    aux: Union[str, pd.DataFrame],
+    columns: Sequence[Optional[str]],
+) -> pd.DataFrame:
+    """Merge only some columns of the data with the auxiliary data.
+
+    This is cheaper than `merge_df_aux` for callbacks that only need a few
+    columns of a large dataframe (e.g. to draw the hover and selection).
+
+    Args:
+        df: The data, possibly a `LazyDataFrame`.
+        aux: The auxiliary data (or its store data).
+        columns: Columns of the data that are used.
+
+    Returns:
+        The merged dataframe.
+    """
+    if not isinstance(aux, pd.DataFrame):
+        aux = decode_aux(aux)
+    if isinstance(df, LazyDataFrame):
+        return merge_df_aux(df, aux, columns)
+    columns = [c for c in dict.fromkeys(columns) if c in df and c not in aux]
+    return merge_df_aux(df[columns], aux)
@@ -0,0 +1,62 @@
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+
+def explode_column(column: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """Flatten a column of lists (or arrays) into one value per element.
+
+    Args:
+        column: The list-valued column.
+
+    Returns:
+        The row (position) of every element and the elements.
+    """
+    column = column.reset_index(drop=True)
+    lengths = column.map(len).to_numpy(dtype=np.intp)
+    exploded = column.explode()
+    # `explode` turns empty lists into a single missing value
+    keep = np.repeat(lengths > 0, np.maximum(lengths, 1))
+    return exploded.index.to_numpy()[keep], exploded.to_numpy()[keep]
+
+
+def reldiff_scores(values: np.ndarray, errors: np.ndarray) -> np.ndarray:
+    """Score the categories by the largest relative difference between the
+    values of any two clusters, `|v1 - v2| / sqrt(e1^2 + e2^2)`.
+
+    Args:
+        values: Matrix of values with a row per category and a column per
+            cluster (NaN for missing values).
+        errors: Matrix of the standard errors of the values.
+
+    Returns:
+        The scores, 0.0 for categories with less than two values.
+    """
+    diff = np.abs(values[:, :, None] - values[:, None, :])
+    errors = errors * errors
+    scale = np.sqrt(errors[:, :, None] + errors[:, None, :])
+    # Two exact values are compared with a small error
+    scale[scale == 0.0] = 0.001
+    with np.errstate(invalid="ignore"):
+        scores = diff / scale
+    scores = np.where(np.isnan(scores), 0.0, scores)
+    return scores.reshape(len(scores), -1).max(axis=1, initial=0.0)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Find the `k` largest scores with `argpartition`.
+
+    Returns:
+        The indices of the largest scores in descending order (ties are
+        ordered by their index).
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    if len(scores) > k:
+        threshold = scores[np.argpartition(-scores, k - 1)[:k]].min()
+        above = np.flatnonzero(scores > threshold)
+        ties = np.flatnonzero(scores == threshold)[: k - len(above)]
+        index = np.sort(np.concatenate((above, ties)))
+    else:
+        index = np.arange(len(scores))
+    return index[np.argsort(-scores[index], kind="stable")]
@@ -0,0 +1,83 @@
+import hashlib
+from collections import OrderedDict
+from threading import RLock
+from typing import Any, Callable, Hashable, Optional
+
+import numpy as np
+
+
+class LRUCache:
+    def __init__(
+        self,
+        maxsize: int = 16,
+        max_memory: Optional[int] = None,
+        sizeof: Optional[Callable[[Any], int]] = None,
+    ):
+        """A thread-safe least-recently-used cache.
+
+        Args:
+            maxsize: The maximum number of entries. Defaults to 16.
+            max_memory: Optional memory budget in bytes, measured with
+                `sizeof`. Values larger than the budget are not cached.
+            sizeof: Function that estimates the size of a value in bytes.
+        """
+        self.maxsize = maxsize
+        self.max_memory = max_memory
+        self.sizeof = sizeof
+        self.memory = 0
+        self.entries = OrderedDict()
+        self.sizes = dict()
+        self.lock = RLock()
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        with self.lock:
+            try:
+                self.entries.move_to_end(key)
+            except KeyError:
+                return default
+            return self.entries[key]
+
+    def set(self, key: Hashable, value: Any):
+        with self.lock:
+            self.delete(key)
+            size = 0
+            if self.sizeof is not None:
+                size = self.sizeof(value)
+                if self.max_memory is not None and size > self.max_memory:
+                    return
+            self.entries[key] = value
+            self.sizes[key] = size
+            self.memory += size
+            while len(self.entries) > self.maxsize or (
+                self.max_memory is not None and self.memory > self.max_memory
+            ):
+                old, _ = self.entries.popitem(last=False)
+                self.memory -= self.sizes.pop(old)
+
+    def has(self, key: Hashable) -> bool:
+        with self.lock:
+            return key in self.entries
+
+    def delete(self, key: Hashable) -> bool:
+        with self.lock:
+            if key not in self.entries:
+                return False
+            del self.entries[key]
+            self.memory -= self.sizes.pop(key)
+            return True
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.sizes.clear()
+            self.memory = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+def data_version(values: np.ndarray) -> str:
+    """Compute the version (hash) of the values, so that cached results are
+    recomputed when the data changes."""
+    values = np.ascontiguousarray(values)
+    return hashlib.blake2b(values.view(np.uint8), digest_size=16).hexdigest()
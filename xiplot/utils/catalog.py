@@ -0,0 +1,229 @@
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+from threading import RLock, Thread
+from typing import Any, Dict, Optional
+
+# A prebuilt (read-only) index file in the data directory, e.g. for WASM
+CATALOG_FILENAME = ".xiplot-catalog.json"
+CATALOG_FORMAT = 2
+# Directory where the indices are saved (see `set_catalog_dir`), None keeps
+# them in memory
+CATALOG_DIR: Optional[Path] = None
+
+CATALOGS: Dict[str, "DataCatalog"] = dict()
+CATALOGS_LOCK = RLock()
+
+
+class DataCatalog:
+    def __init__(self, data_dir, index_dir: Optional[Path] = None):
+        """An index of the data files in a directory: their size,
+        modification time, number of rows, and column names (and dtypes).
+
+        Only cheap metadata is collected, see `describe_data_file`.
+        `refresh` only describes the files that have been added or changed
+        since they were indexed.
+
+        The index is saved in `index_dir` (not in the data directory), so
+        that it is available right away when xiplot starts. Without an
+        index directory, a prebuilt `CATALOG_FILENAME` in the data directory
+        is read (but never written).
+
+        Args:
+            data_dir: The data directory.
+            index_dir: Directory for saving the index. Defaults to None.
+        """
+        self.data_dir = Path(data_dir)
+        self.index_dir = None if index_dir is None else Path(index_dir)
+        self.entries: Dict[str, Dict[str, Any]] = dict()
+        # Incremented whenever the entries change
+        self.version = 0
+        self.lock = RLock()
+        self.thread: Optional[Thread] = None
+        if not self.load(self.path):
+            self.load(self.data_dir / CATALOG_FILENAME)
+
+    @property
+    def path(self) -> Optional[Path]:
+        if self.index_dir is None:
+            return None
+        key = str(self.data_dir.resolve()).encode("utf-8")
+        digest = hashlib.blake2b(key, digest_size=8).hexdigest()
+        return self.index_dir / f"catalog-{digest}.json"
+
+    def load(self, path: Optional[Path]) -> bool:
+        if path is None:
+            return False
+        try:
+            with open(path, "r") as file:
+                index = json.load(file)
+        except (OSError, ValueError):
+            return False
+        if (
+            not isinstance(index, dict)
+            or index.get("format") != CATALOG_FORMAT
+            or not isinstance(index.get("files"), dict)
+        ):
+            return False
+        with self.lock:
+            self.entries = index["files"]
+            self.version += 1
+        return True
+
+    def save(self):
+        path = self.path
+        if path is None:
+            return
+        with self.lock:
+            index = dict(format=CATALOG_FORMAT, files=self.entries)
+            tmp = path.with_name(f"{path.name}.{os.getpid()}")
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                with open(tmp, "w") as file:
+                    json.dump(index, file)
+                os.replace(tmp, path)
+            except OSError:
+                # E.g. a read-only cache directory, keep the index in memory
+                try:
+                    os.unlink(tmp)
+                except OSError:
+                    pass
+
+    def get(self, filepath) -> Optional[Dict[str, Any]]:
+        """Get the entry of a data file, if it is up to date."""
+        filepath = Path(filepath)
+        with self.lock:
+            entry = self.entries.get(filepath.name)
+        if entry is None:
+            return None
+        try:
+            stat = filepath.stat()
+        except OSError:
+            return None
+        if entry["size"] != stat.st_size or entry["mtime"] != stat.st_mtime_ns:
+            return None
+        return entry
+
+    def refresh(self) -> bool:
+        """Describe the new and changed data files and forget the removed
+        ones.
+
+        Returns:
+            True if the catalog changed.
+        """
+        from xiplot.utils.dataframe import get_data_filepaths
+
+        filepaths = get_data_filepaths(self.data_dir)
+        changed = False
+
+        for filepath in filepaths:
+            if self.get(filepath) is not None:
+                continue
+            try:
+                entry = describe_data_file(filepath)
+            except OSError:
+                continue
+            with self.lock:
+                self.entries[filepath.name] = entry
+                self.version += 1
+            changed = True
+
+        names = set(fp.name for fp in filepaths)
+        with self.lock:
+            removed = [name for name in self.entries if name not in names]
+            for name in removed:
+                del self.entries[name]
+            if len(removed) > 0:
+                self.version += 1
+                changed = True
+
+        if changed:
+            self.save()
+        return changed
+
+    def refresh_in_background(self):
+        """Start a `refresh` on a background thread, unless one is already
+        running. Does nothing in WASM, where only the prebuilt index is
+        used.
+        """
+        if sys.platform == "emscripten":
+            return
+        with self.lock:
+            if self.thread is not None and self.thread.is_alive():
+                return
+            self.thread = Thread(target=self.refresh, daemon=True)
+            self.thread.start()
+
+
+def describe_data_file(filepath: Path) -> Dict[str, Any]:
+    """Describe a data file: its size, modification time, number of rows,
+    and column names, without parsing the data.
+
+    The rows, columns and dtypes of columnar files are read from their
+    footers. The rows of CSV and NDJSON files are counted from the newlines
+    (multi-line quoted CSV values count as several rows), and their
+    columns are read from the header or the first line. Other (JSON) files
+    are only described by their size and modification time.
+    """
+    from xiplot.utils.lazy import read_schema
+
+    stat = filepath.stat()
+    entry = dict(size=stat.st_size, mtime=stat.st_mtime_ns)
+    try:
+        if filepath.suffix == ".csv":
+            import pandas as pd
+
+            columns = pd.read_csv(filepath, nrows=0).columns
+            entry["rows"] = max(count_lines(filepath) - 1, 0)
+            entry["columns"] = [str(c) for c in columns]
+            return entry
+        if filepath.suffix in (".ndjson", ".jsonl"):
+            with open(filepath, "rb") as file:
+                first = json.loads(file.readline() or b"{}")
+            entry["rows"] = count_lines(filepath)
+            if isinstance(first, dict):
+                entry["columns"] = [str(c) for c in first]
+            return entry
+
+        schema = read_schema(filepath)
+        if schema is None:
+            return entry
+        df, rows = schema
+        entry["rows"] = rows
+        entry["columns"] = [str(c) for c in df.columns]
+        entry["dtypes"] = [str(t) for t in df.dtypes]
+    except Exception as e:
+        entry.pop("rows", None)
+        entry["error"] = str(e)
+    return entry
+
+
+def count_lines(filepath: Path) -> int:
+    """Count the lines of a text file without parsing it."""
+    lines, last = 0, b"\n"
+    with open(filepath, "rb") as file:
+        for block in iter(lambda: file.read(2**20), b""):
+            lines += block.count(b"\n")
+            last = block[-1:]
+    # The last line does not need to end with a newline
+    return lines + (last != b"\n")
+
+
+def set_catalog_dir(index_dir: Optional[Path]):
+    """Set the directory where the catalogs are saved (e.g. the cache
+    directory), None keeps them in memory."""
+    global CATALOG_DIR
+    CATALOG_DIR = None if index_dir is None else Path(index_dir)
+
+
+def get_catalog(data_dir) -> DataCatalog:
+    """Get the (shared) catalog of a data directory."""
+    key = str(Path(data_dir).resolve())
+    with CATALOGS_LOCK:
+        catalog = CATALOGS.get(key)
+        if catalog is None:
+            catalog = DataCatalog(data_dir, CATALOG_DIR)
+            CATALOGS[key] = catalog
+        return catalog
@@ -27,8 +27,112 @@ def cli():
         action="store_true",
         help=(
             "Cache datasets on the server in order to reduce the amount of"
-            " data transferred. Might not be suitable for servers with"
-            " multiple users"
+            " data transferred. The cache is scoped to the browser session,"
+            " identical datasets are shared between sessions"
+        ),
+    )
+    parser.add_argument(
+        "--cache-memory",
+        type=float,
+        help=(
+            "Memory budget (in MB) for the datasets cached with --cache, the"
+            " least recently used datasets are evicted when it is exceeded"
+        ),
+    )
+    parser.add_argument(
+        "--cache-session-memory",
+        type=float,
+        help=(
+            "Memory quota (in MB) for the datasets cached with --cache by a"
+            " single browser session"
+        ),
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        help=(
+            "Time (in seconds) after which datasets cached with --cache"
+            " expire if they have not been used"
+        ),
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help=(
+            "Directory where datasets cached with --cache are spilled (as"
+            " memory-mapped Arrow files) instead of being evicted when"
+            " --cache-memory is exceeded, and where the index of the data"
+            " files is saved"
+        ),
+    )
+    parser.add_argument(
+        "--cache-stats",
+        action="store_true",
+        help=(
+            "Serve the usage statistics of the datasets cached with --cache"
+            " (of all sessions) at /_xiplot/store-stats, e.g. for tuning the"
+            " cache limits. Do not enable this on a public server"
+        ),
+    )
+    parser.add_argument(
+        "--file-cache-memory",
+        type=float,
+        help=(
+            "Memory budget (in MB) for keeping parsed data files, so that"
+            " loading an unchanged file again is instant (default 256, 0"
+            " disables the cache)"
+        ),
+    )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help=(
+            "Reduce the memory usage of loaded datasets by downcasting numeric"
+            " columns and converting repetitive text columns to categories"
+        ),
+    )
+    parser.add_argument(
+        "--compact-tolerance",
+        type=float,
+        default=0.0,
+        help=(
+            "Relative tolerance for downcasting floats with --compact"
+            " (default 0, i.e. only lossless downcasting)"
+        ),
+    )
+    parser.add_argument(
+        "--bundle-compression",
+        choices=["gz", "bz2", "xz", "none"],
+        default="gz",
+        help=(
+            "Compression of the downloaded plots and data bundles (default"
+            " gz)"
+        ),
+    )
+    parser.add_argument(
+        "--bundle-compression-level",
+        type=int,
+        help=(
+            "Compression level of the downloaded bundles (1-9, or the preset"
+            " 0-9 for xz)"
+        ),
+    )
+    parser.add_argument(
+        "--scatter-aggregate-threshold",
+        type=int,
+        default=200_000,
+        help=(
+            "Number of visible points above which scatterplots are rendered"
+            " as a density heatmap until zoomed in (0 disables this)"
+        ),
+    )
+    parser.add_argument(
+        "--store-codec",
+        choices=["json", "arrow"],
+        default="json",
+        help=(
+            "Encoding used for sending datasets to the browser (ignored with"
+            " --cache). 'arrow' is faster for large datasets and preserves"
+            " dtypes exactly, but requires pyarrow"
         ),
     )
     parser.add_argument(
@@ -58,5 +162,29 @@ def cli():
         unsafe_local_server=unsafe_local_server,
         data_dir=path,
         plugin_dir=plugin_dir,
+        store_codec=args.store_codec,
+        cache_max_memory=(
+            None
+            if args.cache_memory is None
+            else int(args.cache_memory * 1024 * 1024)
+        ),
+        cache_ttl=args.cache_ttl,
+        cache_dir=args.cache_dir,
+        cache_stats=args.cache_stats,
+        cache_session_max_memory=(
+            None
+            if args.cache_session_memory is None
+            else int(args.cache_session_memory * 1024 * 1024)
+        ),
+        file_cache_max_memory=(
+            None
+            if args.file_cache_memory is None
+            else int(args.file_cache_memory * 1024 * 1024)
+        ),
+        compact_data=args.compact,
+        compact_rtol=args.compact_tolerance,
+        bundle_compression=args.bundle_compression,
+        bundle_compression_level=args.bundle_compression_level,
+        scatter_aggregate_threshold=args.scatter_aggregate_threshold or None,
     )
     app.run(**kwargs)
@@ -22,6 +22,11 @@ from dash import (
 from xiplot.utils import generate_id
 from xiplot.utils.auxiliary import decode_aux, get_clusters
 from xiplot.utils.cluster import cluster_colours
+from xiplot.utils.download import (
+    CLIENTSIDE_DOWNLOAD,
+    create_download,
+    is_download_route_enabled,
+)
 from xiplot.utils.regex import dropdown_regex
 
 
@@ -398,7 +403,9 @@ try:
             id["plot"] = plot_name
             id2 = generate_id(type(self), index, "download")
             id2["plot"] = plot_name
-            children = [children, dcc.Download(id=id2)]
+            id3 = generate_id(type(self), index, "url")
+            id3["plot"] = plot_name
+            children = [children, dcc.Download(id=id2), dcc.Store(id=id3)]
             super().__init__(
                 children=children, id=id, className=className, **kwargs
             )
@@ -422,27 +429,49 @@ try:
             id["plot"] = plot_name
             id2 = generate_id(cls, MATCH, "download")
             id2["plot"] = plot_name
+            id3 = generate_id(cls, MATCH, "url")
+            id3["plot"] = plot_name
             graph_id["index"] = MATCH
 
             @app.callback(
                 Output(id2, "data"),
+                Output(id3, "data"),
                 Input(id, "n_clicks"),
                 State(graph_id, "figure"),
                 prevent_initial_call=True,
             )
             def download_as_pdf(n_clicks, figure):
                 if not figure:
-                    return no_update
+                    return no_update, no_update
                 fig_img = po.io.to_image(figure, format="pdf")
+
+                if is_download_route_enabled():
+
+                    def write(file):
+                        file.write(fig_img)
+                        return "xiplot.pdf", "application/pdf"
+
+                    return no_update, create_download(write)
+
                 file = BytesIO(fig_img)
                 encoded = base64.b64encode(file.getvalue()).decode("ascii")
-                return dict(
-                    base64=True,
-                    content=encoded,
-                    filename="xiplot.pdf",
-                    type="application/pdf",
+                return (
+                    dict(
+                        base64=True,
+                        content=encoded,
+                        filename="xiplot.pdf",
+                        type="application/pdf",
+                    ),
+                    no_update,
                 )
 
+            app.clientside_callback(
+                CLIENTSIDE_DOWNLOAD,
+                Output(id3, "clear_data"),
+                Input(id3, "data"),
+                prevent_initial_call=True,
+            )
+
 except ImportError:
 
     class PdfButton(html.Div):
@@ -1,7 +1,11 @@
+import copy
 import json
+import re
 import tarfile
 from collections import OrderedDict
-from io import BytesIO
+from contextlib import contextmanager
+from contextvars import ContextVar
+from io import SEEK_END, BytesIO
 from pathlib import Path
 from typing import (
     Any,
@@ -14,16 +18,47 @@ from typing import (
     Tuple,
 )
 
+import numpy as np
 import pandas as pd
 
 from xiplot.tabs.plugins import get_plugins_cached
-from xiplot.utils.io import FinallyCloseBytesIO
+from xiplot.utils.cache import LRUCache
+from xiplot.utils.io import FinallyCloseSpooledFile
+from xiplot.utils.registry import FormatRegistry, function_name
+
+# Parsed data files, keyed by (path, size, mtime, readers)
+DATAFRAME_CACHE = LRUCache(
+    maxsize=64,
+    max_memory=256 * 1024 * 1024,
+    sizeof=lambda value: int(
+        value[0].memory_usage(deep=True).sum()
+        + value[1].memory_usage(deep=True).sum()
+    ),
+)
+
+READ_PROGRESS = ContextVar("READ_PROGRESS", default=None)
+
+# Options for `compact_dataframe` when loading data, None disables compaction
+DATAFRAME_COMPACTION = None
+
+# Tar compression codecs: (tarfile mode, file suffix, MIME type)
+TAR_COMPRESSION = {
+    "gz": ("gz", ".tar.gz", "application/gzip"),
+    "bz2": ("bz2", ".tar.bz2", "application/x-bzip2"),
+    "xz": ("xz", ".tar.xz", "application/x-xz"),
+    "none": ("", ".tar", "application/x-tar"),
+}
+BUNDLE_COMPRESSION = dict(codec="gz", level=None)
 
 
 def get_data_filepaths(data_dir=""):
     try:
         return sorted(
-            (fp for fp in Path(data_dir).iterdir() if fp.is_file()),
+            (
+                fp
+                for fp in Path(data_dir).iterdir()
+                if fp.is_file() and not fp.name.startswith(".")
+            ),
             reverse=True,
         )
 
@@ -36,28 +71,347 @@ def read_functions() -> (
 ):
     """Generate all functions for reading to a dataframe.
 
+    A read function can optionally accept a `columns` keyword argument
+    (a list of column names), in which case only those columns are read.
+
     Yields:
         fn: Function that reads the data and returns a dataframe.
         ext: File extension that the readed can handle.
     """
-    for _, _, plugin in get_plugins_cached("read"):
-        plugin = plugin()
-        if plugin is not None:
-            yield plugin
+    for reader in DATAFRAME_FORMATS.readers():
+        yield reader.fn, reader.ext
+
+
+def builtin_read_functions() -> List[Tuple]:
+    return [
+        (read_csv_chunked, ".csv", dict(columns=True, streaming=True)),
+        (read_json, ".json", dict(columns=True)),
+        (read_ndjson, ".ndjson", dict(columns=True, streaming=True)),
+        (read_ndjson, ".jsonl", dict(columns=True, streaming=True)),
+    ]
+
+
+def read_json(data, columns=None):
+    """Read a JSON dataframe, detecting its orient from the first bytes.
+
+    The "split" orient (that xiplot writes) is parsed with `orjson` if it is
+    installed, other orients with `pd.read_json`.
+
+    Args:
+        data: File name or file-like object.
+        columns: Only return these columns. Defaults to all columns.
+
+    Returns:
+        The dataframe.
+    """
+    if isinstance(data, (str, Path)):
+        with open(data, "rb") as file:
+            data = file.read()
+    elif isinstance(data, BytesIO):
+        data = data.getvalue()
+    else:
+        data = data.read()
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+
+    orient = sniff_json_orient(data[:4096])
+    try:
+        df = parse_json(data, orient)
+    except Exception:
+        # The sniffing was wrong, try the other orient that xiplot accepts
+        df = parse_json(data, "columns" if orient == "split" else "split")
+    return df if columns is None else df[columns]
+
+
+def sniff_json_orient(head: bytes) -> str:
+    """Guess the `pd.read_json` orient of a JSON dataframe from the start of
+    the document (without parsing the whole document)."""
+    head = head.lstrip(b"\xef\xbb\xbf \t\r\n")
+    if head.startswith(b"["):
+        return "values" if head[1:].lstrip().startswith(b"[") else "records"
+    match = JSON_FIRST_KEY.match(head)
+    if match is not None:
+        key, value = match.group(1), match.group(2)
+        if key in (b"columns", b"index", b"data") and value == b"[":
+            return "split"
+        if key == b"schema" and value == b"{":
+            return "table"
+    return "columns"
 
-    def read_json(data):
-        if isinstance(data, BytesIO):
-            data = data.getvalue().decode("utf-8")
-        elif isinstance(data, tarfile.ExFileObject):
-            data = data.read().decode("utf-8")
 
+# The first key of a JSON object and the first character of its value
+JSON_FIRST_KEY = re.compile(rb'\{\s*"((?:[^"\\]|\\.)*)"\s*:\s*(.)', re.DOTALL)
+
+
+def parse_json(data: bytes, orient: str) -> pd.DataFrame:
+    """Parse a JSON dataframe like `pd.read_json` (with the default dtype
+    and date inference).
+
+    The "split" orient is decoded with `orjson` if it is installed, and the
+    result is then converted with the same inference as `pd.read_json`, so
+    that the dtypes do not depend on whether `orjson` is installed.
+
+    Args:
+        data: The JSON document.
+        orient: The `pd.read_json` orient.
+
+    Returns:
+        The dataframe.
+    """
+    loads = get_json_loads()
+    if orient == "split" and loads is not None:
+        obj = loads(data)
+        if not isinstance(obj, dict) or not set(obj) <= {
+            "columns",
+            "index",
+            "data",
+        }:
+            raise ValueError("JSON is not in the split orient")
+        df = pd.DataFrame(
+            obj.get("data"), index=obj.get("index"), columns=obj.get("columns")
+        )
+        return infer_json_dtypes(df)
+    return pd.read_json(data.decode("utf-8"), typ="frame", orient=orient)
+
+
+# Columns whose values `pd.read_json` tries to parse as dates
+JSON_DATE_COLUMN = re.compile(
+    r"(.*_at|.*_time|modified|date|datetime|timestamp.*)",
+    re.IGNORECASE | re.DOTALL,
+)
+# Numbers below one year (in seconds) after the epoch are not dates
+JSON_MIN_TIMESTAMP = 31536000
+
+
+def infer_json_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """Infer the dtypes of a dataframe decoded from "split"-oriented JSON,
+    like `pd.read_json` with the default `dtype`, `convert_axes`,
+    `convert_dates`, and `keep_default_dates` (the index is kept as is).
+    """
+    df.columns = convert_json_values(df.columns, convert_dates=True)
+    if len(df.index) == 0:
+        df.index = convert_json_values(df.index, convert_dates=True)
+    columns = df.columns
+    converted = dict()
+    for i, (name, column) in enumerate(df.items()):
+        if isinstance(name, str) and JSON_DATE_COLUMN.fullmatch(name):
+            column = convert_json_dates(column)
+        converted[i] = convert_json_values(column, convert_dates=False)
+    df = pd.DataFrame(converted, index=df.index)
+    df.columns = columns
+    return df
+
+
+def convert_json_values(data, convert_dates: bool):
+    """Convert JSON values (a series or an index) to dates if they look like
+    dates, or else to 64-bit floats or integers if possible."""
+    if convert_dates:
+        dates = convert_json_dates(data)
+        if dates is not data:
+            return dates
+
+    if data.dtype == "object":
         try:
-            return pd.read_json(data, typ="frame", orient="columns")
-        except Exception:
-            return pd.read_json(data, typ="frame", orient="split")
+            data = data.astype("float64")
+        except (TypeError, ValueError):
+            pass
+    if data.dtype.kind == "f" and data.dtype != "float64":
+        data = data.astype("float64")
+    if len(data) > 0 and data.dtype in ("float64", "object"):
+        try:
+            ints = data.astype("int64")
+            if (ints == data).all():
+                data = ints
+        except (TypeError, ValueError, OverflowError):
+            pass
+    return data
+
+
+def convert_json_dates(data):
+    """Convert JSON values (a series or an index) to dates if they are ISO
+    dates or epoch timestamps, otherwise return them unchanged."""
+    if len(data) == 0:
+        return data
+    values = data
+    if values.dtype == "object":
+        try:
+            values = data.astype("int64")
+        except (TypeError, ValueError, OverflowError):
+            pass
+    if np.issubdtype(values.dtype, np.number):
+        numbers = np.asarray(values)
+        if not (
+            pd.isna(numbers)
+            | (numbers > JSON_MIN_TIMESTAMP)
+            | (numbers == np.iinfo(np.int64).min)
+        ).all():
+            return data
+    for unit in ("s", "ms", "us", "ns"):
+        try:
+            return pd.to_datetime(values, errors="raise", unit=unit)
+        except (ValueError, OverflowError, TypeError):
+            continue
+    return data
 
-    yield pd.read_csv, ".csv"
-    yield read_json, ".json"
+
+def get_json_loads() -> Optional[Callable[[bytes], Any]]:
+    """Get the fast `orjson.loads` if `orjson` is installed."""
+    try:
+        import orjson
+    except ImportError:
+        return None
+    return orjson.loads
+
+
+def read_ndjson(
+    data, columns: Optional[List[str]] = None, chunksize: int = 2**14
+) -> pd.DataFrame:
+    """Read newline-delimited JSON (JSON Lines) records in chunks of lines
+    and report the progress with `report_read_progress`.
+
+    Args:
+        data: File name or binary file-like object.
+        columns: Only read these columns. Defaults to all columns.
+        chunksize: Number of lines per chunk. Defaults to 2**14.
+
+    Returns:
+        The dataframe.
+    """
+    if isinstance(data, (str, Path)):
+        with open(data, "rb") as file:
+            return read_ndjson(file, columns, chunksize)
+
+    try:
+        start = data.tell()
+        total = data.seek(0, SEEK_END) - start
+        data.seek(start)
+    except (AttributeError, OSError):
+        start, total = None, None
+
+    loads = get_json_loads() or json.loads
+    chunks = []
+    rows = 0
+
+    def parse(lines):
+        nonlocal rows
+        chunks.append(
+            pd.DataFrame([loads(line) for line in lines], columns=columns)
+        )
+        rows += len(lines)
+        report_read_progress(
+            rows, rows if start is None else data.tell() - start, total
+        )
+
+    lines = []
+    for line in data:
+        if line.strip():
+            lines.append(line)
+        if len(lines) == chunksize:
+            parse(lines)
+            lines = []
+    if len(lines) > 0 or len(chunks) == 0:
+        parse(lines)
+
+    if len(chunks) == 1:
+        return chunks[0]
+    return pd.concat(chunks, ignore_index=True, copy=False)
+
+
+@contextmanager
+def read_progress(callback: Callable[[int, int, Optional[int]], None]):
+    """Report the progress of the readers that support it (in this context)
+    to `callback(rows, bytes, total_bytes)`."""
+    token = READ_PROGRESS.set(callback)
+    try:
+        yield
+    finally:
+        READ_PROGRESS.reset(token)
+
+
+def report_read_progress(rows: int, nbytes: int, total: Optional[int]):
+    callback = READ_PROGRESS.get()
+    if callback is not None:
+        callback(rows, nbytes, total)
+
+
+def read_csv_chunked(
+    data, chunksize: int = 2**16, columns: Optional[List[str]] = None
+) -> pd.DataFrame:
+    """Read a CSV file in chunks of rows and report the progress with
+    `report_read_progress`.
+
+    Each column is concatenated separately and its chunks are released
+    right after, so the peak memory stays close to the size of the final
+    dataframe. Columns whose chunks were inferred as both text and numbers
+    are read again as text, so that the dtypes are the same as for the
+    whole file at once (`pd.read_csv(low_memory=False)`).
+
+    Args:
+        data: File name or seekable file-like object.
+        chunksize: Number of rows per chunk. Defaults to 2**16.
+        columns: Only read these columns. Defaults to all columns.
+
+    Returns:
+        The dataframe.
+    """
+    if isinstance(data, (str, Path)):
+        with open(data, "rb") as file:
+            return read_csv_chunked(file, chunksize, columns)
+
+    try:
+        start = data.tell()
+        total = data.seek(0, SEEK_END) - start
+        data.seek(start)
+    except (AttributeError, OSError):
+        return pd.read_csv(data, usecols=columns, low_memory=False)
+
+    pieces = None
+    rows = 0
+    with pd.read_csv(
+        data, chunksize=chunksize, usecols=columns, low_memory=False
+    ) as reader:
+        for chunk in reader:
+            if pieces is None:
+                pieces = {c: [] for c in chunk.columns}
+            for c in pieces:
+                pieces[c].append(chunk[c].copy())
+            rows += len(chunk)
+            del chunk
+            report_read_progress(rows, data.tell() - start, total)
+
+    if pieces is None:
+        data.seek(start)
+        return pd.read_csv(data, usecols=columns)
+    columns = list(pieces)
+    if all(len(p) == 1 for p in pieces.values()):
+        return pd.DataFrame(
+            {c: pieces[c][0] for c in columns}, columns=columns, copy=False
+        )
+
+    # Chunks with only missing values ("empty") do not affect the dtype
+    kinds = {
+        c: (
+            set(pd.api.types.infer_dtype(p, skipna=True) for p in chunks)
+            - {"empty"}
+        )
+        for c, chunks in pieces.items()
+    }
+    mixed = [c for c, k in kinds.items() if "string" in k and len(k) > 1]
+    if len(mixed) > 0:
+        data.seek(start)
+        text = pd.read_csv(data, usecols=mixed, dtype=str)
+        for c in mixed:
+            pieces[c] = [text[c]]
+        del text
+
+    return pd.DataFrame(
+        {
+            c: pd.concat(pieces.pop(c), ignore_index=True, copy=False)
+            for c in columns
+        },
+        columns=columns,
+        copy=False,
+    )
 
 
 def write_functions() -> (
@@ -70,18 +424,34 @@ def write_functions() -> (
         ext: File extension that matches the written data.
         mime: MIME type of the written data.
     """
-    for _, _, plugin in get_plugins_cached("write"):
-        plugin = plugin()
-        if plugin is not None:
-            yield plugin
+    for writer in DATAFRAME_FORMATS.writers():
+        yield writer.fn, writer.ext, writer.mime
+
+
+def builtin_write_functions() -> List[Tuple]:
+    return [
+        (write_csv, ".csv", "text/csv"),
+        (write_json, ".json", "application/json"),
+    ]
+
+
+def write_csv(df, file):
+    df.to_csv(file, index=False)
+
+
+def write_json(df, file):
+    df.to_json(file, orient="split", index=False)
+
 
-    yield lambda df, file: df.to_csv(file, index=False), ".csv", "text/csv"
-    yield lambda df, file: df.to_json(
-        file, orient="split", index=False
-    ), ".json", "application/json"
+# The readers and writers by extension, rebuilt when the plugins change
+DATAFRAME_FORMATS = FormatRegistry(
+    get_plugins_cached, builtin_read_functions, builtin_write_functions
+)
 
 
-def read_dataframe_with_extension(data, filename=None):
+def read_dataframe_with_extension(
+    data, filename=None, columns=None, mmap=False
+):
     """
     Read the given data and convert it to a pandas data frame
 
@@ -89,6 +459,9 @@ def read_dataframe_with_extension(data, filename=None):
 
         data: File name or File-like object
         filename: File name as a string
+        columns: Only read these columns of the data (optional)
+        mmap: Memory-map the file if the reader supports it (optional), only
+            if the result is not kept in a cache
 
     Returns:
 
@@ -159,7 +532,7 @@ def read_dataframe_with_extension(data, filename=None):
             )
             metadata["filename"] = str(df_name)
 
-            df = read_only_dataframe(df_file, df_name)
+            df = read_only_dataframe(df_file, df_name, columns)
 
             try:
                 aux = read_only_dataframe(aux_file, aux_name)
@@ -176,7 +549,7 @@ def read_dataframe_with_extension(data, filename=None):
 
             return df, aux, metadata
 
-    df = read_only_dataframe(data, filename)
+    df = read_only_dataframe(data, filename, columns, mmap)
     return (
         df,
         pd.DataFrame(index=df.index),
@@ -184,16 +557,97 @@ def read_dataframe_with_extension(data, filename=None):
     )
 
 
-def read_only_dataframe(data, filename):
+def dataframe_cache_key(filepath, filename=None, columns=None):
+    """Compute the key of a data file in the cache of parsed data files: the
+    resolved path, the size and modification time of the file, and the
+    readers that can handle its extension."""
+    filepath = Path(filepath)
+    if filename is None:
+        filename = filepath
+
+    stat = filepath.stat()
+    suffixes = Path(filename).suffixes
+    readers = tuple(
+        function_name(reader.fn)
+        for reader in DATAFRAME_FORMATS.readers()
+        if reader.ext in suffixes or ".tar" in suffixes
+    )
+    return (
+        str(filepath.resolve()),
+        str(filename),
+        stat.st_size,
+        stat.st_mtime_ns,
+        readers,
+        None if columns is None else tuple(columns),
+    )
+
+
+def cache_dataframe_from_path(filepath, filename=None, columns=None):
+    """Parse a data file into the cache of parsed data files, unless it is
+    already cached.
+
+    Returns:
+
+        The cached (df, aux, meta), which must not be modified
+    """
+    if filename is None:
+        filename = filepath
+    key = dataframe_cache_key(filepath, filename, columns)
+    value = DATAFRAME_CACHE.get(key)
+    if value is None:
+        value = read_dataframe_with_extension(filepath, filename, columns)
+        DATAFRAME_CACHE.set(key, value)
+    return value
+
+
+def read_dataframe_from_path_cached(filepath, filename=None, columns=None):
+    """Read a data file from disk, reusing the result of an earlier read if
+    the file has not changed since.
+
+    The cache is keyed by `dataframe_cache_key`. Every call returns fresh
+    copies, so the results can be modified freely.
+
+    Parameters:
+
+        filepath: Path to the data file
+        filename: File name as a string (defaults to the path)
+        columns: Only read these columns of the data (optional)
+
+    Returns:
+
+        df: Pandas data frame
+        aux: Pandas data frame
+        meta: dictionary of metadata
+    """
+    df, aux, meta = cache_dataframe_from_path(filepath, filename, columns)
+    return df.copy(), aux.copy(), copy.deepcopy(meta)
+
+
+def set_dataframe_cache_memory(max_memory: Optional[int]):
+    """Set the memory budget (in bytes) of the cache used by
+    `read_dataframe_from_path_cached` and clear it. Zero disables the cache.
+    """
+    with DATAFRAME_CACHE.lock:
+        DATAFRAME_CACHE.max_memory = max_memory
+        DATAFRAME_CACHE.clear()
+
+
+def read_only_dataframe(data, filename, columns=None, mmap=False):
     file_extension = Path(filename).suffix
     error = None
 
-    for fn, ext in read_functions():
-        if file_extension == ext:
-            try:
-                return fn(data)
-            except Exception as e:
-                error = e
+    for reader in DATAFRAME_FORMATS.readers(file_extension):
+        # Memory-mapped data must not end up in a cache, since the file may
+        # be overwritten or replaced while it is mapped
+        kwargs = dict(mmap=True) if mmap and reader.mmap else dict()
+        try:
+            if columns is None:
+                return reader.fn(data, **kwargs)
+            if reader.columns:
+                return reader.fn(data, columns=list(columns), **kwargs)
+            return reader.fn(data, **kwargs)[list(columns)]
+        except Exception as e:
+            error = e
 
     if error is not None:
         raise error
@@ -207,50 +661,97 @@ def write_dataframe_and_metadata(
     filepath: str,
     file,
     file_extension: Optional[str] = None,
+    compression: Optional[str] = None,
+    compresslevel: Optional[int] = None,
 ) -> Tuple[str, str]:
+    """Write the data, auxiliary data and metadata into a (compressed) tar
+    bundle.
+
+    The members are serialized into spooled temporary files (that move to
+    disk when they grow large) and streamed from there into the tar, so the
+    serialized data is never copied in memory.
+
+    Args:
+        df: The data.
+        aux: The auxiliary data.
+        meta: The metadata.
+        filepath: The (original) file name of the data.
+        file: Binary file to write the bundle into.
+        file_extension: Format of the data and auxiliary data. Defaults to
+            the extension of `filepath`.
+        compression: One of `TAR_COMPRESSION` ("gz", "bz2", "xz", "none").
+            Defaults to the codec set with `set_bundle_compression`.
+        compresslevel: Compression level (or preset for "xz"). Defaults to
+            the level set with `set_bundle_compression`.
+
+    Returns:
+        The file name and MIME type of the bundle.
+    """
     if not aux.empty and df.shape[0] != aux.shape[0]:
         raise Exception(
             "The dataframe and auxiliary data have different number of rows."
         )
     if file_extension is None:
         file_extension = Path(filepath).suffix
-
-    with tarfile.open(fileobj=file, mode="w:gz") as tar:
+    if compression is None:
+        compression = BUNDLE_COMPRESSION["codec"]
+    if compresslevel is None:
+        compresslevel = BUNDLE_COMPRESSION["level"]
+    if compression not in TAR_COMPRESSION:
+        raise Exception(f"Unsupported compression '{compression}'")
+    mode, suffix, mime = TAR_COMPRESSION[compression]
+
+    kwargs = dict()
+    if mode and compresslevel is not None:
+        kwargs["preset" if mode == "xz" else "compresslevel"] = compresslevel
+
+    with tarfile.open(
+        fileobj=file, mode=f"w:{mode}" if mode else "w", **kwargs
+    ) as tar:
         df_file = Path("data").with_suffix(file_extension).name
         aux_file = Path("aux").with_suffix(file_extension).name
         meta_file = "meta.json"
-        tar_file = Path(filepath).with_suffix(".tar.gz").name
-
-        with FinallyCloseBytesIO() as df_bytes:
-            write_only_dataframe(df, filepath, df_bytes, file_extension)
-            df_bytes = df_bytes.getvalue()
-
-        df_info = tarfile.TarInfo(df_file)
-        df_info.size = len(df_bytes)
-
-        tar.addfile(df_info, BytesIO(df_bytes))
-
-        with FinallyCloseBytesIO() as aux_bytes:
-            write_only_dataframe(aux, aux_file, aux_bytes, file_extension)
-            aux_bytes = aux_bytes.getvalue()
+        tar_file = Path(filepath).with_suffix(suffix).name
 
-        aux_info = tarfile.TarInfo(aux_file)
-        aux_info.size = len(aux_bytes)
-
-        tar.addfile(aux_info, BytesIO(aux_bytes))
+        add_tar_member(
+            tar,
+            df_file,
+            lambda f: write_only_dataframe(df, filepath, f, file_extension),
+        )
+        add_tar_member(
+            tar,
+            aux_file,
+            lambda f: write_only_dataframe(aux, aux_file, f, file_extension),
+        )
 
         meta = meta or OrderedDict()
         meta["filename"] = Path(filepath).name
 
-        meta_string = json.dumps(meta)
-        meta_bytes = meta_string.encode("utf-8")
+        add_tar_member(
+            tar, meta_file, lambda f: f.write(json.dumps(meta).encode("utf-8"))
+        )
+
+        return tar_file, mime
 
-        meta_info = tarfile.TarInfo(meta_file)
-        meta_info.size = len(meta_bytes)
 
-        tar.addfile(meta_info, BytesIO(meta_bytes))
+def add_tar_member(tar: tarfile.TarFile, name: str, write: Callable):
+    """Add a file to a tar by calling `write(file)` and streaming the result
+    into the tar."""
+    with FinallyCloseSpooledFile() as member:
+        write(member)
+        info = tarfile.TarInfo(name)
+        info.size = member.tell()
+        member.seek(0)
+        tar.addfile(info, member)
 
-        return tar_file, "application/gzip"
+
+def set_bundle_compression(codec: str = "gz", level: Optional[int] = None):
+    """Set the default compression of the tar bundles written by
+    `write_dataframe_and_metadata`."""
+    if codec not in TAR_COMPRESSION:
+        raise ValueError(f"Unsupported compression '{codec}'")
+    BUNDLE_COMPRESSION["codec"] = codec
+    BUNDLE_COMPRESSION["level"] = level
 
 
 def write_only_dataframe(
@@ -266,19 +767,108 @@ def write_only_dataframe(
         file_name = Path(filepath).with_suffix(file_extension).name
     error = None
 
-    for fn, ext, mime in write_functions():
-        if file_extension == ext:
-            try:
-                fn(df, file)
-                return file_name, mime
-            except Exception as e:
-                error = e
+    for writer in DATAFRAME_FORMATS.writers(file_extension):
+        try:
+            writer.fn(df, file)
+            return file_name, writer.mime
+        except Exception as e:
+            error = e
 
     if error is not None:
         raise error
     raise Exception(f"Unsupported dataframe format '{file_extension}'")
 
 
+def compact_dataframe(
+    df: pd.DataFrame, rtol: float = 0.0, max_category_ratio: float = 0.5
+) -> Tuple[pd.DataFrame, int]:
+    """Reduce the memory usage of a dataframe.
+
+    Integer columns are downcast to the smallest integer type that holds
+    all the values. Float columns are downcast to float32 if that is
+    lossless (or within the relative tolerance `rtol`). Object columns with
+    few unique values are converted to categoricals.
+
+    Args:
+        df: The dataframe.
+        rtol: Relative tolerance for downcasting floats. Defaults to 0.0.
+        max_category_ratio: Maximum ratio of unique values to rows for
+            converting object columns to categoricals. Defaults to 0.5.
+
+    Returns:
+        df: The compacted dataframe (a new dataframe).
+        saved: Memory saved in bytes.
+    """
+    import numpy as np
+
+    before = int(df.memory_usage(deep=True).sum())
+    columns = dict()
+
+    for name, column in df.items():
+        kind = column.dtype.kind
+
+        if kind in "iu":
+            column = pd.to_numeric(
+                column, downcast="signed" if kind == "i" else "unsigned"
+            )
+        elif column.dtype == np.float64:
+            values = column.to_numpy()
+            with np.errstate(over="ignore"):
+                down = values.astype(np.float32)
+            if rtol > 0:
+                lossless = np.allclose(
+                    down, values, rtol=rtol, atol=0.0, equal_nan=True
+                )
+            else:
+                lossless = np.array_equal(down, values, equal_nan=True)
+            if lossless:
+                column = pd.Series(down, index=column.index, name=name)
+        elif column.dtype == object and len(column) > 0:
+            try:
+                unique = column.nunique(dropna=True)
+            except TypeError:
+                # Unhashable values (e.g. lists) cannot be categories
+                unique = float("inf")
+            if unique <= max_category_ratio * len(column):
+                category = column.astype("category")
+                if category.memory_usage(deep=True) < column.memory_usage(
+                    deep=True
+                ):
+                    column = category
+
+        columns[name] = column
+
+    compact = pd.DataFrame(columns, index=df.index, columns=df.columns)
+    return compact, before - int(compact.memory_usage(deep=True).sum())
+
+
+def set_dataframe_compaction(
+    enabled: bool, rtol: float = 0.0, max_category_ratio: float = 0.5
+):
+    """Enable or disable compacting the data files when they are loaded, see
+    `compact_dataframe`."""
+    global DATAFRAME_COMPACTION
+    DATAFRAME_COMPACTION = (
+        dict(rtol=rtol, max_category_ratio=max_category_ratio)
+        if enabled
+        else None
+    )
+
+
+def compact_loaded_dataframe(df: pd.DataFrame) -> Tuple[pd.DataFrame, int]:
+    """Compact a loaded dataframe if compaction is enabled, see
+    `set_dataframe_compaction`.
+
+    Returns:
+        df: The (compacted) dataframe.
+        saved: Memory saved in bytes.
+    """
+    if DATAFRAME_COMPACTION is None or not isinstance(df, pd.DataFrame):
+        # Lazy dataframes compact the columns when they are read
+        return df, 0
+    return compact_dataframe(df, **DATAFRAME_COMPACTION)
+
+
 def get_numeric_columns(df, columns=None):
     """
     Return only columns, which are numeric
@@ -0,0 +1,101 @@
+from typing import Hashable, Optional, Tuple
+
+import numpy as np
+
+from xiplot.utils.cache import LRUCache, data_version
+
+# Number of points in a density curve (the same as in
+# `plotly.figure_factory.create_distplot`)
+KDE_GRID_SIZE = 500
+# Density curves keyed by the column, the group, and the version of the data
+KDE_CACHE = LRUCache(maxsize=64)
+# Upper limit for the number of markers per group in a rug plot
+RUG_MAX_POINTS = 2000
+
+
+def binned_kde(
+    values: np.ndarray, grid_size: int = KDE_GRID_SIZE
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Estimate the density of (finite) values with a Gaussian kernel.
+
+    The values are linearly binned onto an evenly spaced grid, which is then
+    convolved with the kernel using the FFT. The bandwidth is chosen with
+    Scott's rule (like `scipy.stats.gaussian_kde`).
+
+    Args:
+        values: The finite values.
+        grid_size: The number of points in the curve.
+
+    Returns:
+        The grid (from the minimum to the maximum of the values) and the
+        density at the grid points.
+    """
+    if len(values) == 0:
+        return np.zeros(0), np.zeros(0)
+    low, high = float(values.min()), float(values.max())
+    # The grid spans [min, max], with the maximum as the last grid point
+    step = (high - low) / max(grid_size - 1, 1)
+    x = np.linspace(low, high, grid_size)
+    bandwidth = (
+        values.std(ddof=1) * len(values) ** -0.2 if len(values) > 1 else 0
+    )
+    if step == 0.0 or not bandwidth > 0.0:
+        return x, np.zeros(grid_size)
+
+    # Linear binning onto the grid
+    position = (values - low) / step
+    index = np.clip(position.astype(np.intp), 0, grid_size - 1)
+    weight = position - index
+    counts = np.bincount(
+        index, weights=1.0 - weight, minlength=grid_size + 1
+    ) + np.bincount(index + 1, weights=weight, minlength=grid_size + 1)
+
+    # The kernel is cut off after five bandwidths
+    radius = min(int(np.ceil(5.0 * bandwidth / step)), grid_size)
+    offsets = np.arange(-radius, radius + 1) * (step / bandwidth)
+    kernel = np.exp(-0.5 * offsets * offsets) / (
+        np.sqrt(2.0 * np.pi) * bandwidth * len(values)
+    )
+
+    size = 1 << int(np.ceil(np.log2(grid_size + 1 + 2 * radius)))
+    density = np.fft.irfft(
+        np.fft.rfft(counts, size) * np.fft.rfft(kernel, size), size
+    )
+    return x, np.maximum(density[radius:][:grid_size], 0.0)
+
+
+def get_kde(
+    values: np.ndarray, key: Optional[Hashable] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Compute the density curve of values with `binned_kde`.
+
+    Args:
+        values: The finite values.
+        key: Optional key (e.g. the column and the group) for caching the
+            curve. The curve is cached together with the version of the
+            values, so that it is recomputed when the data changes.
+
+    Returns:
+        The grid and the density.
+    """
+    if key is not None:
+        key = (key, data_version(values))
+        curve = KDE_CACHE.get(key)
+        if curve is not None:
+            return curve
+    curve = binned_kde(values)
+    if key is not None:
+        KDE_CACHE.set(key, curve)
+    return curve
+
+
+def sample_rug(rows: np.ndarray) -> np.ndarray:
+    """Pick (at most) `RUG_MAX_POINTS` of the rows for a rug plot.
+
+    The sample is random, but the same for the same number of rows, so that
+    the rug does not change between renders.
+    """
+    if len(rows) <= RUG_MAX_POINTS:
+        return rows
+    rng = np.random.default_rng(len(rows))
+    return rows[np.sort(rng.choice(len(rows), RUG_MAX_POINTS, replace=False))]
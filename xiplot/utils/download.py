@@ -0,0 +1,138 @@
+import atexit
+import os
+import secrets
+import shutil
+import sys
+import tempfile
+import time
+from threading import RLock
+from typing import BinaryIO, Callable, Dict, Optional, Tuple
+from urllib.parse import quote
+
+# Pending downloads: token -> (path, filename, mime, expiry time)
+DOWNLOADS: Dict[str, Tuple[str, str, str, float]] = dict()
+DOWNLOADS_LOCK = RLock()
+# Seconds that a download URL stays valid
+DOWNLOAD_TTL = 60.0
+DOWNLOAD_CHUNK_SIZE = 2**16
+# URL prefix of the download route, None if the route is not registered
+DOWNLOAD_URL_PREFIX: Optional[str] = None
+DOWNLOAD_DIR: Optional[str] = None
+
+
+def is_download_route_enabled() -> bool:
+    return DOWNLOAD_URL_PREFIX is not None
+
+
+def register_download_route(app, ttl: float = DOWNLOAD_TTL):
+    """Register a Flask route that streams the files created with
+    `create_download`.
+
+    The route is not registered in WASM, where the browser cannot request
+    it, and the downloads fall back to base64 `dcc.Download` payloads.
+
+    Args:
+        app: The Dash app.
+        ttl: Seconds that a download URL stays valid. Defaults to 60.
+    """
+    global DOWNLOAD_URL_PREFIX, DOWNLOAD_DIR, DOWNLOAD_TTL
+
+    if sys.platform == "emscripten":
+        return
+
+    import flask
+
+    DOWNLOAD_TTL = ttl
+    DOWNLOAD_DIR = tempfile.mkdtemp(prefix="xiplot-downloads-")
+    atexit.register(shutil.rmtree, DOWNLOAD_DIR, ignore_errors=True)
+
+    route = app.config.routes_pathname_prefix + "_xiplot/download/<token>"
+    DOWNLOAD_URL_PREFIX = (
+        app.config.requests_pathname_prefix + "_xiplot/download/"
+    )
+
+    @app.server.route(route)
+    def download(token):
+        expire_downloads()
+        with DOWNLOADS_LOCK:
+            entry = DOWNLOADS.pop(token, None)
+        if entry is None:
+            flask.abort(404)
+        path, filename, mime, _ = entry
+
+        def stream():
+            try:
+                with open(path, "rb") as file:
+                    for chunk in iter(
+                        lambda: file.read(DOWNLOAD_CHUNK_SIZE), b""
+                    ):
+                        yield chunk
+            finally:
+                os.unlink(path)
+
+        ascii_name = filename.encode("ascii", "replace").decode("ascii")
+        return flask.Response(
+            stream(),
+            mimetype=mime,
+            headers={
+                "Content-Length": str(os.path.getsize(path)),
+                "Content-Disposition": (
+                    f'attachment; filename="{ascii_name}";'
+                    f" filename*=UTF-8''{quote(filename)}"
+                ),
+                "Cache-Control": "no-store",
+            },
+        )
+
+
+def create_download(write: Callable[[BinaryIO], Tuple[str, str]]) -> str:
+    """Write a file for the download route.
+
+    Args:
+        write: Function that writes the file into the given binary file and
+            returns the file name and MIME type.
+
+    Returns:
+        A short-lived, single-use URL for downloading the file.
+    """
+    expire_downloads()
+    fd, path = tempfile.mkstemp(dir=DOWNLOAD_DIR)
+    try:
+        with os.fdopen(fd, "wb") as file:
+            filename, mime = write(file)
+    except BaseException:
+        os.unlink(path)
+        raise
+
+    token = secrets.token_urlsafe(32)
+    with DOWNLOADS_LOCK:
+        DOWNLOADS[token] = (path, filename, mime, time.time() + DOWNLOAD_TTL)
+    return DOWNLOAD_URL_PREFIX + token
+
+
+def expire_downloads():
+    now = time.time()
+    with DOWNLOADS_LOCK:
+        expired = [t for t, d in DOWNLOADS.items() if d[3] < now]
+        for token in expired:
+            path = DOWNLOADS.pop(token)[0]
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+
+# Click a temporary link to the download URL
+CLIENTSIDE_DOWNLOAD = """
+function (url) {
+    if (url) {
+        const link = document.createElement("a");
+        link.href = url;
+        link.download = "";
+        document.body.appendChild(link);
+        link.click();
+        link.remove();
+    }
+    return window.dash_clientside.no_update;
+}
+"""
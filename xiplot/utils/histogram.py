@@ -0,0 +1,93 @@
+from typing import Hashable, Optional, Tuple
+
+import numpy as np
+
+from xiplot.utils.cache import LRUCache, data_version
+
+# Upper limit for the number of bins in a histogram
+HISTOGRAM_MAX_BINS = 200
+# Bin edges keyed by the column and the version of the data
+HISTOGRAM_EDGES = LRUCache(maxsize=64)
+
+
+def get_bin_edges(
+    values: np.ndarray, key: Optional[Hashable] = None
+) -> np.ndarray:
+    """Compute the (evenly spaced) bin edges of a histogram of (finite)
+    values.
+
+    Integer-valued data with a small range gets one bin per integer,
+    other data is binned with `numpy.histogram_bin_edges(bins="auto")`
+    (with at most `HISTOGRAM_MAX_BINS` bins).
+
+    Args:
+        values: The finite values.
+        key: Optional key (e.g. the column name) for caching the edges.
+            The edges are cached together with the version of the values,
+            so that they are recomputed when the data changes.
+
+    Returns:
+        The bin edges.
+    """
+    if len(values) == 0:
+        return np.array([0.0, 1.0])
+    low, high = float(values.min()), float(values.max())
+    if key is not None:
+        key = (key, data_version(values))
+        edges = HISTOGRAM_EDGES.get(key)
+        if edges is not None:
+            return edges
+
+    if low == high:
+        edges = np.array([low - 0.5, high + 0.5])
+    elif high - low < HISTOGRAM_MAX_BINS and np.all(np.mod(values, 1) == 0):
+        edges = np.arange(low - 0.5, high + 1.0)
+    else:
+        edges = np.histogram_bin_edges(values, bins="auto")
+        if len(edges) > HISTOGRAM_MAX_BINS + 1:
+            edges = np.linspace(low, high, HISTOGRAM_MAX_BINS + 1)
+
+    if key is not None:
+        HISTOGRAM_EDGES.set(key, edges)
+    return edges
+
+
+def grouped_histogram(
+    values: np.ndarray,
+    groups: np.ndarray,
+    n_groups: int,
+    key: Optional[Hashable] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Count the values per bin and group with a single `numpy.bincount`.
+
+    Args:
+        values: The values (non-finite values are ignored).
+        groups: The group index (`0 <= groups < n_groups`) of every value,
+            values with a negative group are only counted in the total.
+        n_groups: The number of groups.
+        key: Optional key for caching the bin edges (see `get_bin_edges`).
+
+    Returns:
+        The bin edges, and the counts with one row per group and a last row
+        for all the values.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    finite = np.isfinite(values)
+    if not finite.all():
+        values = values[finite]
+        groups = groups[finite]
+    edges = get_bin_edges(values, key)
+    n_bins = len(edges) - 1
+
+    # The edges are evenly spaced, so the bins are computed arithmetically
+    bins = ((values - edges[0]) * (n_bins / (edges[-1] - edges[0]))).astype(
+        np.intp
+    )
+    # The last bin includes its right edge
+    np.clip(bins, 0, n_bins - 1, out=bins)
+    groups = np.where(groups < 0, n_groups, groups)
+    counts = np.bincount(
+        groups * n_bins + bins, minlength=(n_groups + 1) * n_bins
+    ).reshape(n_groups + 1, n_bins)
+    counts[n_groups] = counts.sum(axis=0)
+    return edges, counts
@@ -1,4 +1,5 @@
 from io import BytesIO
+from tempfile import SpooledTemporaryFile
 
 
 class FinallyCloseBytesIO:
@@ -15,3 +16,35 @@ class FinallyCloseBytesIO:
 class NoCloseBytesIO(BytesIO):
     def close(self):
         pass
+
+
+class FinallyCloseSpooledFile:
+    def __init__(self, max_size: int = 2**26):
+        """A temporary binary file that is kept in memory until it grows
+        larger than `max_size` bytes, after which it is moved to disk.
+
+        Like `FinallyCloseBytesIO`, the file ignores `close()` calls until
+        the context is exited.
+        """
+        self.file = NoCloseSpooledTemporaryFile(max_size=max_size)
+
+    def __enter__(self):
+        return self.file
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        super(NoCloseSpooledTemporaryFile, self.file).close()
+
+
+class NoCloseSpooledTemporaryFile(SpooledTemporaryFile):
+    def close(self):
+        pass
+
+    # Not available before Python 3.11, but required by some writers
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def writable(self):
+        return True
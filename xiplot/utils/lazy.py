@@ -0,0 +1,374 @@
+from pathlib import Path
+from threading import RLock
+from typing import Callable, Dict, Hashable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Open columnar data files lazily (only with a server-side store)
+LAZY_LOADING = False
+
+
+class LazyColumns:
+    def __init__(
+        self,
+        loader: Callable[[List[Hashable]], pd.DataFrame],
+        schema: pd.DataFrame,
+        index: pd.Index,
+    ):
+        """The column data shared by all views of a `LazyDataFrame`.
+
+        Args:
+            loader: Function that reads the given columns into a dataframe.
+            schema: An empty dataframe with the columns and dtypes.
+            index: The index of the data.
+        """
+        self.loader = loader
+        self.schema = schema
+        self.index = index
+        self.loaded: Dict[Hashable, pd.Series] = dict()
+        # Called after columns are loaded or unloaded, a listener that
+        # returns False is removed
+        self.listeners: List[Callable[[], bool]] = []
+        self.lock = RLock()
+
+    def load(self, columns: List[Hashable]) -> List[pd.Series]:
+        with self.lock:
+            missing = [
+                c for c in dict.fromkeys(columns) if c not in self.loaded
+            ]
+            if len(missing) > 0:
+                df = self.loader(missing)
+                if len(df) != len(self.index):
+                    raise Exception(
+                        "The data file has a different number of rows than"
+                        " when it was opened, please load it again."
+                    )
+                for c in missing:
+                    column = df[c]
+                    column.index = self.index
+                    self.loaded[c] = column
+            loaded = [self.loaded[c] for c in columns]
+        # Outside of the lock, since listeners may measure the memory usage
+        if len(missing) > 0:
+            self.notify()
+        return loaded
+
+    def unload(self):
+        """Drop the loaded columns, they are read again when accessed."""
+        with self.lock:
+            unloaded = len(self.loaded) > 0
+            self.loaded = dict()
+        if unloaded:
+            self.notify()
+
+    def add_listener(self, listener: Callable[[], bool]):
+        with self.lock:
+            self.listeners.append(listener)
+
+    def notify(self):
+        with self.lock:
+            listeners = list(self.listeners)
+        stale = [listener for listener in listeners if not listener()]
+        if len(stale) > 0:
+            with self.lock:
+                self.listeners = [
+                    listener
+                    for listener in self.listeners
+                    if listener not in stale
+                ]
+
+    def memory_usage(self) -> int:
+        with self.lock:
+            return sum(
+                int(c.memory_usage(deep=True)) for c in self.loaded.values()
+            )
+
+
+class LazyDataFrame:
+    def __init__(
+        self,
+        data: LazyColumns,
+        columns: Optional[List[Hashable]] = None,
+        extra: Optional[pd.DataFrame] = None,
+    ):
+        """A read-only dataframe handle that knows the schema of the data
+        but only reads the columns when they are first accessed.
+
+        Accessing the columns, dtypes, `select_dtypes`, or selecting a list
+        of columns does not read any data. Selecting a single column or
+        calling `materialize` reads the (missing) columns. Any other
+        `pd.DataFrame` attribute materializes all the columns of the view
+        and is forwarded to the resulting dataframe.
+
+        Args:
+            data: The shared column data.
+            columns: The columns in this view. Defaults to all columns.
+            extra: Additional (materialized) columns, e.g. auxiliary data.
+        """
+        self._data = data
+        self._columns = (
+            list(data.schema.columns) if columns is None else list(columns)
+        )
+        self._extra = extra
+
+    @classmethod
+    def from_loader(
+        cls,
+        loader: Callable[[List[Hashable]], pd.DataFrame],
+        schema: pd.DataFrame,
+        index: pd.Index,
+    ) -> "LazyDataFrame":
+        return cls(LazyColumns(loader, schema, index))
+
+    @property
+    def columns(self) -> pd.Index:
+        columns = self._columns
+        if self._extra is not None:
+            columns = columns + self._extra.columns.to_list()
+        return pd.Index(columns)
+
+    @property
+    def dtypes(self) -> pd.Series:
+        return self._schema().dtypes
+
+    @property
+    def index(self) -> pd.Index:
+        return self._data.index
+
+    @property
+    def shape(self):
+        return (len(self._data.index), len(self.columns))
+
+    @property
+    def empty(self) -> bool:
+        return self.shape[0] == 0 or self.shape[1] == 0
+
+    def __len__(self) -> int:
+        return len(self._data.index)
+
+    def __contains__(self, key) -> bool:
+        return key in self.columns
+
+    def __iter__(self):
+        return iter(self.columns)
+
+    def __getitem__(self, key):
+        if isinstance(key, (slice, pd.Series, np.ndarray)) or callable(key):
+            return self.materialize()[key]
+        if isinstance(key, (list, pd.Index)):
+            missing = [c for c in key if c not in self.columns]
+            if len(missing) > 0:
+                raise KeyError(f"{missing} not in index")
+            own = [c for c in key if c in self._columns]
+            extra = [c for c in key if c not in own]
+            return LazyDataFrame(
+                self._data,
+                own,
+                None if len(extra) == 0 else self._extra[extra],
+            )
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        if key in self._columns:
+            return self._data.load([key])[0]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if self._extra is None:
+            extra = pd.DataFrame(index=self._data.index)
+        else:
+            extra = self._extra.copy(deep=False)
+        extra[key] = value
+        self._extra = extra
+        if key in self._columns:
+            self._columns.remove(key)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.materialize(), name)
+
+    def __array__(self, dtype=None):
+        return self.materialize().to_numpy(dtype)
+
+    def __sizeof__(self) -> int:
+        size = self._data.memory_usage()
+        if self._extra is not None:
+            size += int(self._extra.memory_usage(deep=True).sum())
+        return size
+
+    def __repr__(self) -> str:
+        return (
+            f"LazyDataFrame({self.shape[0]} rows, {self.shape[1]} columns,"
+            f" {len(self._data.loaded)} loaded)"
+        )
+
+    def _schema(self) -> pd.DataFrame:
+        schema = self._data.schema[self._columns]
+        if self._extra is not None:
+            schema = pd.concat((schema, self._extra.iloc[:0]), axis=1)
+        return schema
+
+    def select_dtypes(self, include=None, exclude=None) -> "LazyDataFrame":
+        columns = self._schema().select_dtypes(include, exclude).columns
+        return self[columns.to_list()]
+
+    def copy(self, deep: bool = True) -> "LazyDataFrame":
+        return LazyDataFrame(
+            self._data,
+            self._columns,
+            None if self._extra is None else self._extra.copy(deep=deep),
+        )
+
+    def with_columns(self, df: pd.DataFrame) -> "LazyDataFrame":
+        """Add (materialized) columns to a copy of this view."""
+        df = df.copy(deep=False)
+        df.index = self._data.index
+        if self._extra is not None:
+            df = pd.concat((self._extra, df), axis=1)
+        return LazyDataFrame(self._data, self._columns, df)
+
+    def materialize(
+        self, columns: Optional[List[Hashable]] = None
+    ) -> pd.DataFrame:
+        """Read the columns (defaults to all columns in this view) into a
+        `pd.DataFrame`."""
+        if columns is None:
+            columns = self.columns.to_list()
+        extra = self._extra if self._extra is not None else pd.DataFrame()
+        own = [c for c in columns if c not in extra and c in self._columns]
+        loaded = dict(zip(own, self._data.load(own)))
+        return pd.DataFrame(
+            {c: loaded[c] if c in loaded else extra[c] for c in columns},
+            index=self._data.index,
+            columns=columns,
+        )
+
+    def to_pandas(self) -> pd.DataFrame:
+        return self.materialize()
+
+    def add_listener(self, listener: Callable[[], bool]):
+        """Call `listener` whenever columns of the shared data are loaded
+        or unloaded (e.g. to measure the memory usage again). The listener
+        is removed once it returns False."""
+        self._data.add_listener(listener)
+
+    def unload(self):
+        """Drop the loaded columns of the shared data, they are read from the
+        file again when they are accessed."""
+        self._data.unload()
+
+
+def set_lazy_loading(enabled: bool):
+    """Enable or disable opening columnar data files as `LazyDataFrame`s,
+    see `read_lazy_dataframe`."""
+    global LAZY_LOADING
+    LAZY_LOADING = enabled
+
+
+def to_pandas(df):
+    """Materialize a `LazyDataFrame`, other values are returned as is."""
+    if isinstance(df, LazyDataFrame):
+        return df.to_pandas()
+    return df
+
+
+def read_schema(filepath: Path):
+    """Read the schema of a columnar data file without reading the data.
+
+    Returns:
+        The schema as an empty dataframe and the number of rows, or None if
+        the schema cannot be read separately from the data.
+    """
+    from xiplot.utils.dataframe import DATAFRAME_FORMATS
+
+    suffix = Path(filepath).suffix
+    if suffix not in (".parquet", ".feather", ".arrow"):
+        return None
+    if not any(r.columns for r in DATAFRAME_FORMATS.readers(suffix)):
+        # The columns could only be loaded by reading the whole file
+        return None
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        return None
+
+    try:
+        if suffix == ".parquet":
+            with pyarrow.parquet.ParquetFile(filepath) as file:
+                schema = file.schema_arrow
+                rows = file.metadata.num_rows
+        else:
+            with pa.memory_map(str(filepath), "r") as source:
+                reader = pyarrow.ipc.open_file(source)
+                schema = reader.schema
+                rows = sum(
+                    reader.get_batch(i).num_rows
+                    for i in range(reader.num_record_batches)
+                )
+    except (OSError, pa.ArrowException):
+        return None
+
+    empty = schema.empty_table().to_pandas()
+    if not isinstance(empty.index, pd.RangeIndex):
+        return None
+    return empty, rows
+
+
+def read_lazy_dataframe(filepath, filename=None):
+    """Open a columnar data file (Parquet, Feather or Arrow) as a
+    `LazyDataFrame`, reading only the schema.
+
+    Parameters:
+
+        filepath: Path to the data file
+        filename: File name as a string (defaults to the path)
+
+    Returns:
+
+        df: LazyDataFrame, or None if the file cannot be read lazily
+        aux: Pandas data frame
+        meta: dictionary of metadata
+    """
+    from collections import OrderedDict
+
+    from xiplot.utils.dataframe import (
+        compact_loaded_dataframe,
+        read_only_dataframe,
+    )
+
+    filepath = Path(filepath)
+    if filename is None:
+        filename = filepath
+
+    try:
+        stat = filepath.stat()
+    except OSError:
+        return None, None, None
+    schema = read_schema(filepath)
+    if schema is None:
+        return None, None, None
+    schema, rows = schema
+
+    def loader(columns):
+        # The columns must come from the same version of the file
+        current = filepath.stat()
+        if (current.st_size, current.st_mtime_ns) != (
+            stat.st_size,
+            stat.st_mtime_ns,
+        ):
+            raise Exception(
+                f"The data file {filename} has changed since it was opened,"
+                " please load it again."
+            )
+        df = read_only_dataframe(filepath, filename, columns)
+        return compact_loaded_dataframe(df)[0]
+
+    df = LazyDataFrame.from_loader(loader, schema, pd.RangeIndex(rows))
+    return (
+        df,
+        pd.DataFrame(index=df.index),
+        OrderedDict(filename=str(filename)),
+    )
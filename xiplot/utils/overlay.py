@@ -0,0 +1,189 @@
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+from dash import Input, Output, State
+
+from xiplot.utils.auxiliary import decode_rows, encode_rows
+
+# The hover and selection markers of a plot are drawn as an overlay: a
+# small figure fragment that the browser merges into the base figure. The
+# server only sends the overlay when the hover or the selection changes,
+# instead of rebuilding and re-sending the whole figure.
+#
+# An overlay is a dict with (optional) keys:
+#   shapes: Shapes that are appended to the layout of the base figure.
+#   traces: Traces that are appended to the data of the base figure.
+#   selected: The selected rows (see `encode_rows`) and the `marker` style
+#       that they are highlighted with (as `selectedpoints`) in the traces
+#       that have the row indices as their (first) customdata.
+
+CLIENTSIDE_MERGE = """
+function (base, overlay) {
+    if (!base) {
+        return window.dash_clientside.no_update;
+    }
+    if (!overlay) {
+        return base;
+    }
+
+    let data = base.data || [];
+    const selected = overlay.selected;
+    if (selected) {
+        let isSelected;
+        if (Array.isArray(selected.rows)) {
+            const rows = new Set(selected.rows);
+            isSelected = (i) => rows.has(i);
+        } else {
+            const bits = Uint8Array.from(
+                atob(selected.rows.bits), (c) => c.charCodeAt(0)
+            );
+            isSelected = (i) => (
+                i < selected.rows.n && (bits[i >> 3] >> (7 - (i & 7))) & 1
+            );
+        }
+        data = data.map((trace) => {
+            if (!Array.isArray(trace.customdata)) {
+                return trace;
+            }
+            const points = [];
+            trace.customdata.forEach((c, i) => {
+                if (isSelected(Array.isArray(c) ? c[0] : c)) {
+                    points.push(i);
+                }
+            });
+            return Object.assign({}, trace, {
+                selectedpoints: points.length > 0 ? points : null,
+                selected: {marker: selected.marker},
+                unselected: {marker: {opacity: 1}},
+            });
+        });
+    }
+
+    const layout = base.layout || {};
+    return Object.assign({}, base, {
+        data: data.concat(overlay.traces || []),
+        layout: Object.assign({}, layout, {
+            shapes: (layout.shapes || []).concat(overlay.shapes || []),
+        }),
+    });
+}
+"""
+
+# Changes when the auxiliary data changes in other ways than the selection,
+# or when a new data file is loaded
+CLIENTSIDE_AUX_CONTENT = """
+function (aux, df, previous) {
+    let content = aux;
+    if (aux && typeof aux === "object") {
+        content = aux.content || aux.version;
+    }
+    const epoch = previous ? previous.epoch : 0;
+    const triggered = window.dash_clientside.callback_context.triggered;
+    if (triggered.some((t) => t.prop_id === "data_frame_store.data")) {
+        return {content: content, epoch: epoch + 1};
+    }
+    if (previous && previous.content === content) {
+        return window.dash_clientside.no_update;
+    }
+    return {content: content, epoch: epoch};
+}
+"""
+
+
+def create_overlay(
+    fig=None,
+    selected: Optional[Sequence[int]] = None,
+    marker: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """Create an overlay for the hover and selection markers of a plot.
+
+    Args:
+        fig: A figure with only the overlay shapes and traces (e.g. drawn
+            with `add_vline` onto an empty `go.Figure`). Defaults to None.
+        selected: Rows (or a boolean mask) that are highlighted in the
+            traces of the base figure. Defaults to None.
+        marker: The marker style of the highlighted rows. Defaults to None.
+
+    Returns:
+        The overlay.
+    """
+    overlay = dict()
+    if fig is not None:
+        overlay["shapes"] = [s.to_plotly_json() for s in fig.layout.shapes]
+        overlay["traces"] = [t.to_plotly_json() for t in fig.data]
+    if selected is not None:
+        overlay["selected"] = dict(
+            rows=encode_rows(selected), marker=marker or dict()
+        )
+    return overlay
+
+
+def apply_overlay(fig, overlay: Optional[Dict[str, Any]]):
+    """Merge an overlay into a figure in place (like the browser does).
+
+    Args:
+        fig: The base figure.
+        overlay: Overlay from `create_overlay`.
+
+    Returns:
+        The figure.
+    """
+    if not overlay:
+        return fig
+    selected = overlay.get("selected")
+    if selected is not None:
+        for trace in fig.data:
+            if trace["customdata"] is None:
+                continue
+            rows = np.asarray(trace["customdata"])
+            if rows.ndim > 1:
+                rows = rows[:, 0]
+            rows = rows.astype(np.int64)
+            mask = np.zeros(max(rows.max(initial=-1) + 1, 0), dtype=bool)
+            mask[decode_rows(selected["rows"], mask.shape[0])] = True
+            points = np.flatnonzero(mask[rows])
+            trace.update(
+                selectedpoints=points if len(points) > 0 else None,
+                selected=dict(marker=selected["marker"]),
+                unselected=dict(marker=dict(opacity=1)),
+            )
+    fig.add_traces(overlay.get("traces", []))
+    for shape in overlay.get("shapes", []):
+        fig.add_shape(shape)
+    return fig
+
+
+def register_overlay_callback(app, graph_id, base_id, overlay_id):
+    """Register the clientside callback that merges the overlay into the
+    base figure of a graph.
+
+    Args:
+        app: The xiplot app.
+        graph_id: Id of the `dcc.Graph`.
+        base_id: Id of the `dcc.Store` with the base figure.
+        overlay_id: Id of the `dcc.Store` with the overlay.
+    """
+    app.clientside_callback(
+        CLIENTSIDE_MERGE,
+        Output(graph_id, "figure"),
+        Input(base_id, "data"),
+        Input(overlay_id, "data"),
+    )
+
+
+def register_aux_content_callback(app, content_id):
+    """Register the clientside callback that tracks the content of the
+    auxiliary data, except for the selection (see `ID_AUXILIARY_CONTENT`).
+
+    Args:
+        app: The xiplot app.
+        content_id: Id of the `dcc.Store` with the content key.
+    """
+    app.clientside_callback(
+        CLIENTSIDE_AUX_CONTENT,
+        Output(content_id, "data"),
+        Input("auxiliary_store", "data"),
+        Input("data_frame_store", "data"),
+        State(content_id, "data"),
+        prevent_initial_call=False,
+    )
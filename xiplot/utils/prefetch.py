@@ -0,0 +1,135 @@
+import sys
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from pathlib import Path
+from threading import Event, RLock, Thread
+from typing import Callable, Dict, Optional
+
+
+class PrefetchCancelled(Exception):
+    pass
+
+
+class Prefetch:
+    def __init__(self):
+        self.future = Future()
+        self.cancelled = Event()
+        # Number of clients that have selected the file
+        self.selections = 1
+        # The latest read progress: (rows, bytes, total bytes)
+        self.progress = None
+
+
+class Prefetcher:
+    def __init__(self):
+        """Parse data files on background threads into the cache of parsed
+        data files (see `read_dataframe_from_path_cached`), before they are
+        loaded."""
+        self.prefetches: Dict[str, Prefetch] = dict()
+        self.lock = RLock()
+
+    def prefetch(self, filepath: Path) -> bool:
+        """Start parsing a data file in the background, unless it is already
+        being parsed, cached, or it would not fit in the cache.
+
+        Returns:
+            True if the file is being prefetched.
+        """
+        from xiplot.utils import lazy
+        from xiplot.utils.dataframe import DATAFRAME_CACHE, dataframe_cache_key
+
+        if sys.platform == "emscripten":
+            return False
+        filepath = Path(filepath)
+        key = str(filepath)
+
+        with self.lock:
+            prefetch = self.prefetches.get(key)
+            if prefetch is not None and not prefetch.cancelled.is_set():
+                prefetch.selections += 1
+                return True
+
+        try:
+            size = filepath.stat().st_size
+            if DATAFRAME_CACHE.has(
+                dataframe_cache_key(filepath, filepath.name)
+            ):
+                return False
+        except OSError:
+            return False
+        if (
+            DATAFRAME_CACHE.max_memory is not None
+            and size > DATAFRAME_CACHE.max_memory
+        ):
+            return False
+        if lazy.LAZY_LOADING and lazy.read_schema(filepath) is not None:
+            # The file is opened lazily, parsing it would be wasted
+            return False
+
+        prefetch = Prefetch()
+        with self.lock:
+            self.prefetches[key] = prefetch
+        Thread(
+            target=self._run, args=(filepath, prefetch), daemon=True
+        ).start()
+        return True
+
+    def _run(self, filepath: Path, prefetch: Prefetch):
+        from xiplot.utils.dataframe import (
+            cache_dataframe_from_path,
+            read_progress,
+        )
+
+        def report_progress(rows, nbytes, total):
+            # Streaming readers stop at the next chunk when cancelled
+            if prefetch.cancelled.is_set():
+                raise PrefetchCancelled()
+            prefetch.progress = (rows, nbytes, total)
+
+        try:
+            with read_progress(report_progress):
+                # Only cached, so the frame is not copied
+                cache_dataframe_from_path(filepath, filepath.name)
+        except BaseException as e:
+            prefetch.future.set_exception(e)
+        else:
+            prefetch.future.set_result(None)
+        finally:
+            with self.lock:
+                if self.prefetches.get(str(filepath)) is prefetch:
+                    del self.prefetches[str(filepath)]
+
+    def cancel(self, filepath: Path):
+        """Cancel the prefetch of a data file once no client has it
+        selected anymore."""
+        with self.lock:
+            prefetch = self.prefetches.get(str(filepath))
+            if prefetch is None:
+                return
+            prefetch.selections -= 1
+            if prefetch.selections <= 0:
+                prefetch.cancelled.set()
+                del self.prefetches[str(filepath)]
+
+    def wait(
+        self,
+        filepath: Path,
+        report_progress: Optional[Callable[[int, int, int], None]] = None,
+    ):
+        """Wait for the prefetch of a data file (if any) to finish, so that
+        the file is not parsed twice. Its progress is forwarded to
+        `report_progress`."""
+        with self.lock:
+            prefetch = self.prefetches.get(str(filepath))
+        if prefetch is None:
+            return
+        while True:
+            try:
+                prefetch.future.exception(timeout=0.25)
+                return
+            except FutureTimeoutError:
+                if report_progress is not None and prefetch.progress:
+                    report_progress(*prefetch.progress)
+
+
+PREFETCHER = Prefetcher()
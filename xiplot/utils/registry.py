@@ -0,0 +1,176 @@
+import inspect
+from collections import OrderedDict
+from threading import RLock
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class Reader:
+    def __init__(
+        self,
+        fn: Callable,
+        ext: str,
+        name: str,
+        capabilities: Optional[Dict[str, bool]] = None,
+    ):
+        """A function for reading a file format into a dataframe.
+
+        Args:
+            fn: Function that reads the data and returns a dataframe.
+            ext: File extension that the reader can handle.
+            name: Name of the reader (the plugin or the function).
+            capabilities: Optional flags, see `Reader.CAPABILITIES`. By
+                default `columns` is detected from the signature of `fn`.
+        """
+        capabilities = dict(capabilities or dict())
+        capabilities.setdefault("columns", accepts_columns(fn))
+        self.fn = fn
+        self.ext = ext
+        self.name = name
+        self.columns = bool(capabilities.get("columns", False))
+        self.streaming = bool(capabilities.get("streaming", False))
+        self.mmap = bool(capabilities.get("mmap", False))
+
+    # columns: only reads the `columns` that are given as a keyword argument
+    # streaming: reads the data incrementally and reports the read progress
+    # mmap: memory-maps files on disk instead of reading them into memory
+    #   when it is called with `mmap=True`
+    CAPABILITIES = ("columns", "streaming", "mmap")
+
+    def __repr__(self) -> str:
+        flags = ", ".join(f for f in self.CAPABILITIES if getattr(self, f))
+        return f"Reader({self.name!r}, {self.ext!r}, [{flags}])"
+
+
+class Writer:
+    def __init__(self, fn: Callable, ext: str, mime: str, name: str):
+        """A function for writing a dataframe into a file format.
+
+        Args:
+            fn: Function that writes the dataframe to a binary file.
+            ext: File extension that matches the written data.
+            mime: MIME type of the written data.
+            name: Name of the writer (the plugin or the function).
+        """
+        self.fn = fn
+        self.ext = ext
+        self.mime = mime
+        self.name = name
+
+    def __repr__(self) -> str:
+        return f"Writer({self.name!r}, {self.ext!r}, {self.mime!r})"
+
+
+class FormatRegistry:
+    def __init__(
+        self,
+        get_plugins: Callable[[str], List[Tuple[str, str, Any]]],
+        builtin_readers: Callable[[], List[Tuple]],
+        builtin_writers: Callable[[], List[Tuple]],
+    ):
+        """The readers and writers of data files, indexed by extension.
+
+        The plugin factories are called (and any probes they run are
+        performed) only once, when the registry is first used. The registry
+        is rebuilt when the (cached) list of plugins changes, or after
+        `invalidate`.
+
+        Args:
+            get_plugins: Function that returns the loaded plugins of a type
+                (`get_plugins_cached`).
+            builtin_readers: Function that returns the built-in readers as
+                `(fn, ext[, capabilities])` tuples.
+            builtin_writers: Function that returns the built-in writers as
+                `(fn, ext, mime)` tuples.
+        """
+        self.get_plugins = get_plugins
+        self.builtin_readers = builtin_readers
+        self.builtin_writers = builtin_writers
+        self.lock = RLock()
+        self.invalidate()
+
+    def invalidate(self):
+        """Rebuild the registry on the next use, e.g. after reloading
+        the plugins."""
+        with self.lock:
+            self._plugins = None
+            self._readers: Dict[str, List[Reader]] = OrderedDict()
+            self._writers: Dict[str, List[Writer]] = OrderedDict()
+
+    def readers(self, ext: Optional[str] = None) -> List[Reader]:
+        """The readers for an extension (or all readers), in the order in
+        which they should be tried."""
+        readers = self._build()[0]
+        if ext is None:
+            return [r for rs in readers.values() for r in rs]
+        return list(readers.get(ext, ()))
+
+    def writers(self, ext: Optional[str] = None) -> List[Writer]:
+        """The writers for an extension (or all writers), in the order in
+        which they should be tried."""
+        writers = self._build()[1]
+        if ext is None:
+            return [w for ws in writers.values() for w in ws]
+        return list(writers.get(ext, ()))
+
+    def read_extensions(self) -> List[str]:
+        return list(self._build()[0].keys())
+
+    def write_extensions(self) -> List[str]:
+        return list(self._build()[1].keys())
+
+    def _build(self):
+        with self.lock:
+            plugins = (self.get_plugins("read"), self.get_plugins("write"))
+            if self._plugins is not None and all(
+                a is b for a, b in zip(plugins, self._plugins)
+            ):
+                return self._readers, self._writers
+
+            readers = OrderedDict()
+            for name, factory in [(n, f) for n, _, f in plugins[0]] + [
+                (None, lambda r=r: r) for r in self.builtin_readers()
+            ]:
+                reader = factory()
+                if reader is None:
+                    continue
+                fn, ext, *capabilities = reader
+                readers.setdefault(ext, []).append(
+                    Reader(
+                        fn,
+                        ext,
+                        name or function_name(fn),
+                        capabilities[0] if len(capabilities) > 0 else None,
+                    )
+                )
+
+            writers = OrderedDict()
+            for name, factory in [(n, f) for n, _, f in plugins[1]] + [
+                (None, lambda w=w: w) for w in self.builtin_writers()
+            ]:
+                writer = factory()
+                if writer is None:
+                    continue
+                fn, ext, mime = writer
+                writers.setdefault(ext, []).append(
+                    Writer(fn, ext, mime, name or function_name(fn))
+                )
+
+            self._plugins = plugins
+            self._readers = readers
+            self._writers = writers
+            return readers, writers
+
+
+def accepts_columns(fn: Callable) -> bool:
+    """Check if a read function accepts a `columns` keyword argument."""
+    try:
+        parameters = inspect.signature(fn).parameters
+    except (TypeError, ValueError):
+        return False
+    return "columns" in parameters or any(
+        p.kind == inspect.Parameter.VAR_KEYWORD for p in parameters.values()
+    )
+
+
+def function_name(fn: Callable) -> str:
+    return f"{getattr(fn, '__module__', '')}.{getattr(fn, '__qualname__', fn)}"
@@ -1,7 +1,128 @@
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+# Scatterplots with more (visible) points are rendered as a density heatmap
+SCATTER_AGGREGATE_THRESHOLD = 200_000
+# Number of bins per axis in the density heatmap
+SCATTER_AGGREGATE_BINS = 256
+
+
 def get_row(points):
     row = None
     for p in points:
         if p:
-            row = p["points"][0]["customdata"][0]["index"]
+            customdata = p["points"][0].get("customdata")
+            if customdata is not None:
+                row = int(customdata[0])
 
     return row
+
+
+def set_scatter_aggregation(
+    threshold: Optional[int] = SCATTER_AGGREGATE_THRESHOLD,
+    bins: int = SCATTER_AGGREGATE_BINS,
+):
+    """Set the number of visible points above which scatterplots are rendered
+    as a density heatmap (None disables the aggregation), and the number of
+    bins per axis in the heatmap."""
+    global SCATTER_AGGREGATE_THRESHOLD, SCATTER_AGGREGATE_BINS
+    SCATTER_AGGREGATE_THRESHOLD = threshold
+    SCATTER_AGGREGATE_BINS = bins
+
+
+def get_viewport(
+    relayout: Optional[Dict[str, Any]],
+) -> Tuple[Optional[Tuple[float, float]], Optional[Tuple[float, float]]]:
+    """Get the axis ranges that the user has zoomed to from `relayoutData`.
+
+    Returns:
+        The x and y ranges, None for an axis that is not zoomed.
+    """
+    ranges = []
+    for axis in ("xaxis", "yaxis"):
+        if not relayout or relayout.get(f"{axis}.autorange"):
+            ranges.append(None)
+        elif f"{axis}.range[0]" in relayout:
+            ranges.append(
+                (
+                    float(relayout[f"{axis}.range[0]"]),
+                    float(relayout[f"{axis}.range[1]"]),
+                )
+            )
+        elif f"{axis}.range" in relayout:
+            ranges.append(tuple(float(r) for r in relayout[f"{axis}.range"]))
+        else:
+            ranges.append(None)
+    return ranges[0], ranges[1]
+
+
+def is_viewport_change(relayout: Optional[Dict[str, Any]]) -> bool:
+    """Check if `relayoutData` changes the axis ranges (and not, e.g., only
+    the drag mode or the size of the plot)."""
+    return bool(relayout) and any(
+        key.startswith(
+            ("xaxis.range", "yaxis.range", "xaxis.auto", "yaxis.auto")
+        )
+        for key in relayout
+    )
+
+
+def is_aggregated(rows: int) -> bool:
+    """Check if a scatterplot of this many (visible) rows is aggregated."""
+    return (
+        SCATTER_AGGREGATE_THRESHOLD is not None
+        and rows > SCATTER_AGGREGATE_THRESHOLD
+    )
+
+
+def aggregate_points(
+    x: np.ndarray,
+    y: np.ndarray,
+    x_range: Tuple[float, float],
+    y_range: Tuple[float, float],
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Count the points in a grid of `SCATTER_AGGREGATE_BINS` bins per axis.
+
+    Returns:
+        The counts (with the y bins as rows), and the x and y bin centers.
+    """
+    counts, x_edges, y_edges = np.histogram2d(
+        x, y, bins=SCATTER_AGGREGATE_BINS, range=[x_range, y_range]
+    )
+    return (
+        counts.T.astype(np.int64),
+        (x_edges[:-1] + x_edges[1:]) / 2,
+        (y_edges[:-1] + y_edges[1:]) / 2,
+    )
+
+
+def get_axis_range(
+    values: np.ndarray, viewport: Optional[Tuple[float, float]]
+) -> Tuple[float, float]:
+    if viewport is not None:
+        return min(viewport), max(viewport)
+    finite = values[np.isfinite(values)]
+    if len(finite) == 0:
+        return 0.0, 1.0
+    low, high = float(finite.min()), float(finite.max())
+    if low == high:
+        low, high = low - 0.5, high + 0.5
+    return low, high
+
+
+def get_visible_rows(
+    x: np.ndarray, y: np.ndarray, relayout: Optional[Dict[str, Any]]
+) -> Tuple[Tuple[float, float], Tuple[float, float], np.ndarray]:
+    """Get the axis ranges of the viewport (see `get_viewport`) and the
+    indices of the points inside it."""
+    x_view, y_view = get_viewport(relayout)
+    x_range = get_axis_range(x, x_view)
+    y_range = get_axis_range(y, y_view)
+    rows = np.flatnonzero(
+        (x >= x_range[0])
+        & (x <= x_range[1])
+        & (y >= y_range[0])
+        & (y <= y_range[1])
+    )
+    return x_range, y_range, rows
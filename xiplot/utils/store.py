@@ -1,12 +1,508 @@
+import atexit
+import base64
+import hashlib
+import shutil
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from pathlib import Path
+from threading import RLock
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+import pandas as pd
+
+from xiplot.utils.lazy import LazyDataFrame
+
+
 class ServerSideStoreBackend:
-    def __init__(self):
-        self.store = dict()
+    def __init__(
+        self,
+        max_memory: Optional[int] = None,
+        ttl: Optional[float] = None,
+        session_max_memory: Optional[int] = None,
+    ):
+        """A server-side store for `ServersideOutput`s that keeps the values
+        in memory.
+
+        Dataframes with identical content are only stored once, even if they
+        were stored by different sessions.
+
+        Args:
+            max_memory: Memory budget in bytes. When it is exceeded the least
+                recently used values are evicted. Defaults to None
+                (unbounded).
+            ttl: Time in seconds after which values that have not been
+                accessed expire. Defaults to None (never).
+            session_max_memory: Memory quota in bytes for the values stored
+                by one session (shared dataframes count towards every session
+                that uses them). When it is exceeded the least recently used
+                values of that session are evicted. Defaults to None
+                (unbounded).
+        """
+        self.max_memory = max_memory
+        self.ttl = ttl
+        self.session_max_memory = session_max_memory
+        # key -> (value, memory usage, time of last access, session, digest)
+        self.store = OrderedDict()
+        # digest -> [dataframe, memory usage, number of keys]
+        self.frames = dict()
+        # id(dataframe) -> digest
+        self.frame_digests = dict()
+        # session -> memory usage
+        self.sessions = dict()
+        self.memory = 0
+        # Whether values are being evicted (or spilled) right now
+        self.evicting = False
+        self.lock = RLock()
+        self.stats = dict(
+            hits=0,
+            misses=0,
+            evictions=0,
+            evicted_memory=0,
+            expirations=0,
+            deduplications=0,
+        )
 
     def get(self, key, ignore_expired=False):
-        return self.store.get(key)
+        with self.lock:
+            if not ignore_expired:
+                self.expire()
+            entry = self.store.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+            self.store[key] = entry[:2] + (time.monotonic(),) + entry[3:]
+            self.store.move_to_end(key)
+            return entry[0]
 
     def set(self, key, value):
-        self.store[key] = value
+        with self.lock:
+            self.delete(key)
+            session = get_session_id()
+            digest = None
+            if isinstance(value, pd.DataFrame):
+                digest = self.frame_digests.get(id(value))
+                if digest is None:
+                    digest = get_content_hash(value)
+            if digest is not None and digest in self.frames:
+                shared = self.frames[digest]
+                shared[2] += 1
+                value, size = shared[0], shared[1]
+                self.stats["deduplications"] += 1
+            else:
+                size = get_memory_usage(value)
+                self.memory += size
+                if digest is not None:
+                    self.frames[digest] = [value, size, 1]
+                    self.frame_digests[id(value)] = digest
+            self.store[key] = (value, size, time.monotonic(), session, digest)
+            self.sessions[session] = self.sessions.get(session, 0) + size
+            if isinstance(value, LazyDataFrame):
+                # Columns are loaded after the value is stored
+                value.add_listener(lambda: self.measure(key, value))
+            self.expire()
+            self.evict(keep=key)
+
+    def measure(self, key, value) -> bool:
+        """Measure the memory usage of a stored value again, e.g. after more
+        columns of a `LazyDataFrame` were loaded.
+
+        Returns:
+            False if the value is no longer stored with the key.
+        """
+        with self.lock:
+            entry = self.store.get(key)
+            if entry is None or entry[0] is not value:
+                return False
+            _, size, accessed, session, digest = entry
+            change = get_memory_usage(value) - size
+            if change != 0:
+                self.store[key] = (value, size + change) + entry[2:]
+                self.memory += change
+                self.sessions[session] += change
+                if change > 0 and not self.evicting:
+                    self.evict(keep=key)
+            return True
 
     def has(self, key):
-        return key in self.store
+        with self.lock:
+            return key in self.store
+
+    def delete(self, key) -> bool:
+        with self.lock:
+            entry = self.store.pop(key, None)
+            if entry is None:
+                return False
+            _, size, _, session, digest = entry
+            if digest is None:
+                self.memory -= size
+            else:
+                shared = self.frames[digest]
+                shared[2] -= 1
+                if shared[2] == 0:
+                    del self.frames[digest]
+                    del self.frame_digests[id(shared[0])]
+                    self.memory -= size
+            self.sessions[session] -= size
+            if self.sessions[session] <= 0:
+                del self.sessions[session]
+            return True
+
+    def expire(self):
+        """Remove the values that have not been accessed within the TTL."""
+        if self.ttl is None:
+            return
+        with self.lock:
+            deadline = time.monotonic() - self.ttl
+            while len(self.store) > 0:
+                key, entry = next(iter(self.store.items()))
+                if entry[2] >= deadline:
+                    break
+                self.delete(key)
+                self.stats["expirations"] += 1
+
+    def evict(self, keep: Optional[Any] = None):
+        """Evict the least recently used values until the memory budget
+        and the session quota of `keep` are met (the value with the key
+        `keep` is never evicted)."""
+        with self.lock:
+            evicting, self.evicting = self.evicting, True
+            try:
+                self._evict(keep)
+            finally:
+                self.evicting = evicting
+
+    def _evict(self, keep: Optional[Any] = None):
+        if self.max_memory is not None:
+            for key in list(self.store.keys()):
+                if self.memory <= self.max_memory:
+                    break
+                if key != keep:
+                    self.evict_entry(key)
+
+        if self.session_max_memory is None or keep not in self.store:
+            return
+        session = self.store[keep][3]
+        for key in list(self.store.keys()):
+            if self.sessions[session] <= self.session_max_memory:
+                break
+            if key != keep and self.store[key][3] == session:
+                self.evict_entry(key)
+
+    def evict_entry(self, key):
+        """Evict the value with the key from memory."""
+        with self.lock:
+            size = self.store[key][1]
+            self.delete(key)
+            self.stats["evictions"] += 1
+            self.stats["evicted_memory"] += size
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get the usage and eviction statistics of the store."""
+        with self.lock:
+            return dict(
+                entries=len(self.store),
+                memory=self.memory,
+                max_memory=self.max_memory,
+                ttl=self.ttl,
+                sessions=len(self.sessions),
+                session_max_memory=self.session_max_memory,
+                shared_frames=sum(f[2] > 1 for f in self.frames.values()),
+                **self.stats,
+            )
+
+
+def get_session_id() -> Optional[str]:
+    """Get the id of the current user session (set by `dash_extensions` when
+    `session_check` is enabled), or None outside of a request."""
+    import flask
+
+    if not flask.has_request_context():
+        return None
+    return flask.session.get("session_id")
+
+
+def get_content_hash(df: pd.DataFrame) -> Optional[str]:
+    """Hash the content (values, index, columns and dtypes) of a dataframe.
+
+    Returns:
+        The hash, or None if the dataframe contains unhashable values.
+    """
+    try:
+        values = pd.util.hash_pandas_object(df, index=True).to_numpy()
+    except TypeError:
+        return None
+    digest = hashlib.blake2b(values.tobytes(), digest_size=16)
+    digest.update(repr(list(zip(df.columns, df.dtypes))).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class SpillingServerSideStoreBackend(ServerSideStoreBackend):
+    def __init__(
+        self,
+        cache_dir: Union[str, Path],
+        max_memory: Optional[int] = None,
+        ttl: Optional[float] = None,
+        session_max_memory: Optional[int] = None,
+    ):
+        """A server-side store that spills the least recently used
+        dataframes to disk (as Arrow IPC files) instead of dropping them.
+
+        Spilled dataframes are memory-mapped when they are accessed again,
+        so they are not read back into memory as a whole.
+
+        Args:
+            cache_dir: Directory for the spilled files (a temporary
+                subdirectory is created and removed on exit).
+            max_memory: See `ServerSideStoreBackend`. Defaults to None.
+            ttl: See `ServerSideStoreBackend` (also applies to the spilled
+                files). Defaults to None.
+            session_max_memory: See `ServerSideStoreBackend`. Defaults to
+                None.
+        """
+        super().__init__(
+            max_memory=max_memory,
+            ttl=ttl,
+            session_max_memory=session_max_memory,
+        )
+        Path(cache_dir).mkdir(parents=True, exist_ok=True)
+        self.cache_dir = Path(
+            tempfile.mkdtemp(prefix="xiplot-", dir=cache_dir)
+        )
+        atexit.register(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        # key -> (path, file size, time of last access)
+        self.spilled = OrderedDict()
+        self.stats.update(spills=0, spilled_bytes=0, reloads=0)
+
+    def get(self, key, ignore_expired=False):
+        with self.lock:
+            if key in self.store or key not in self.spilled:
+                return super().get(key, ignore_expired)
+            if not ignore_expired:
+                self.expire()
+            entry = self.spilled.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self.spilled[key] = (entry[0], entry[1], time.monotonic())
+            self.spilled.move_to_end(key)
+            self.stats["hits"] += 1
+            self.stats["reloads"] += 1
+            path = entry[0]
+
+        import pyarrow as pa
+
+        # The memory map stays open for as long as the data is referenced
+        source = pa.memory_map(str(path), "r")
+        table = pa.ipc.open_file(source).read_all()
+        return table.to_pandas(split_blocks=True)
+
+    def has(self, key):
+        with self.lock:
+            return key in self.store or key in self.spilled
+
+    def delete(self, key) -> bool:
+        with self.lock:
+            deleted = super().delete(key)
+            entry = self.spilled.pop(key, None)
+            if entry is None:
+                return deleted
+            self.stats["spilled_bytes"] -= entry[1]
+            # Existing memory maps of the file remain valid
+            try:
+                entry[0].unlink()
+            except FileNotFoundError:
+                pass
+            return True
+
+    def expire(self):
+        super().expire()
+        if self.ttl is None:
+            return
+        with self.lock:
+            deadline = time.monotonic() - self.ttl
+            while len(self.spilled) > 0:
+                key, (_, _, accessed) = next(iter(self.spilled.items()))
+                if accessed >= deadline:
+                    break
+                self.delete(key)
+                self.stats["expirations"] += 1
+
+    def evict_entry(self, key):
+        with self.lock:
+            value, _, accessed, _, _ = self.store[key]
+            if isinstance(value, LazyDataFrame):
+                # The data file is its own spill file, the columns are read
+                # from it again when accessed
+                size = self.store[key][1]
+                value.unload()
+                self.measure(key, value)
+                self.stats["spills"] += 1
+                self.stats["evicted_memory"] += size - self.store[key][1]
+                return
+            if not isinstance(value, pd.DataFrame):
+                return super().evict_entry(key)
+            try:
+                path = self.spill(key, value)
+            except Exception:
+                return super().evict_entry(key)
+            super().evict_entry(key)
+            size = path.stat().st_size
+            self.spilled[key] = (path, size, accessed)
+            self.stats["spills"] += 1
+            self.stats["spilled_bytes"] += size
+
+    def spill(self, key, df: pd.DataFrame) -> Path:
+        """Write a dataframe to an (uncompressed) Arrow IPC file."""
+        import pyarrow as pa
+
+        name = hashlib.md5(str(key).encode("utf-8")).hexdigest()
+        path = self.cache_dir / f"{name}.arrow"
+        table = pa.Table.from_pandas(df)
+        with pa.OSFile(str(path), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        return path
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return dict(
+                super().get_stats(),
+                spilled_entries=len(self.spilled),
+            )
+
+
+def get_memory_usage(value: Any) -> int:
+    """Estimate the memory usage of a stored value in bytes.
+
+    Dataframes are measured with `DataFrame.memory_usage(deep=True)`,
+    containers are measured recursively. A `LazyDataFrame` is measured by
+    its loaded columns (see `ServerSideStoreBackend.measure`).
+    """
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            get_memory_usage(k) + get_memory_usage(v) for k, v in value.items()
+        )
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(get_memory_usage(v) for v in value)
+    return sys.getsizeof(value)
+
+
+def json_df_to_store(df: pd.DataFrame) -> str:
+    """Encode a dataframe as a "split"-oriented JSON string."""
+    return df.to_json(date_format="iso", orient="split")
+
+
+def json_df_from_store(data: str) -> pd.DataFrame:
+    """Decode a dataframe from a "split"-oriented JSON string."""
+    return pd.read_json(data, orient="split")
+
+
+def arrow_df_to_store(df: pd.DataFrame) -> Dict[str, str]:
+    """Encode a dataframe as a base64 Arrow IPC stream.
+
+    The Arrow schema carries the pandas metadata, so the dtypes (and the
+    index) survive the round trip exactly. Dataframes that Arrow cannot
+    represent (e.g. object columns with mixed types) fall back to JSON.
+
+    Args:
+        df: Dataframe.
+
+    Returns:
+        A dictionary with the codec name and the encoded data.
+    """
+    import pyarrow as pa
+
+    try:
+        table = pa.Table.from_pandas(df)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        return dict(codec="json", data=json_df_to_store(df))
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+
+    return dict(
+        codec="arrow",
+        data=base64.b64encode(sink.getvalue()).decode("ascii"),
+    )
+
+
+def arrow_df_from_store(data: Dict[str, str]) -> pd.DataFrame:
+    """Decode a dataframe from a base64 Arrow IPC stream."""
+    import pyarrow as pa
+
+    buffer = pa.py_buffer(base64.b64decode(data["data"]))
+    with pa.ipc.open_stream(buffer) as reader:
+        return reader.read_all().to_pandas()
+
+
+STORE_CODECS: Dict[
+    str,
+    Tuple[Callable[[pd.DataFrame], Any], Callable[[Any], pd.DataFrame]],
+] = {
+    "json": (json_df_to_store, json_df_from_store),
+    "arrow": (arrow_df_to_store, arrow_df_from_store),
+}
+
+
+def is_store_codec_supported(codec: str) -> bool:
+    """Check if a dataframe store codec can be used in this environment.
+
+    Args:
+        codec: Name of the codec (see `STORE_CODECS`).
+
+    Returns:
+        `True` if the codec exists and its dependencies are installed.
+    """
+    if codec not in STORE_CODECS:
+        return False
+    if codec == "arrow":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            return False
+    return True
+
+
+def get_store_codec(
+    codec: str = "json",
+) -> Tuple[Callable[[pd.DataFrame], Any], Callable[[Any], pd.DataFrame]]:
+    """Get the functions for moving dataframes in and out of a `dcc.Store`.
+
+    The returned `df_from_store` understands every codec (the stored data is
+    self-describing), so only `df_to_store` depends on the selected codec.
+
+    Args:
+        codec: Name of the codec used for encoding (see `STORE_CODECS`).
+            Defaults to "json".
+
+    Returns:
+        df_to_store: Function that encodes a dataframe for the store.
+        df_from_store: Function that decodes a dataframe from the store.
+    """
+    if codec not in STORE_CODECS:
+        raise ValueError(
+            f"Unknown store codec '{codec}', expected one of"
+            f" {list(STORE_CODECS.keys())}"
+        )
+
+    df_to_store, _ = STORE_CODECS[codec]
+
+    def df_from_store(data: Optional[Any]) -> Optional[pd.DataFrame]:
+        if data is None:
+            return None
+        if isinstance(data, dict):
+            _, decode = STORE_CODECS[data["codec"]]
+            if decode is not json_df_from_store:
+                return decode(data)
+            data = data["data"]
+        return json_df_from_store(data)
+
+    return df_to_store, df_from_store
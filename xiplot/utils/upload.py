@@ -0,0 +1,290 @@
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import Future
+from copy import deepcopy
+from pathlib import Path
+from threading import RLock, Thread
+from typing import Dict, Optional
+
+# Folder of the uploaded files, shared with dash_uploader
+UPLOAD_DIR = Path("uploads")
+# Uploads in progress: upload id -> (part file path, hash, size, expiry,
+# whether a chunk is being received)
+UPLOADS: Dict[str, list] = dict()
+# Parses that have not been read yet: (content hash, file name) -> (future,
+# expiry), the expiry is set when the parse finishes
+PARSES: Dict[tuple, list] = dict()
+# Only guards the bookkeeping, not the reading or writing of files
+UPLOADS_LOCK = RLock()
+# Seconds that an unfinished upload, or an unread parse, is kept
+UPLOAD_TTL = 600.0
+UPLOAD_CHUNK_SIZE = 2**22
+# URL prefix of the upload route, None if the route is not registered
+UPLOAD_URL_PREFIX: Optional[str] = None
+
+UPLOAD_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+
+def is_upload_route_enabled() -> bool:
+    return UPLOAD_URL_PREFIX is not None
+
+
+def register_upload_route(app, ttl: float = UPLOAD_TTL):
+    """Register Flask routes that receive uploaded files in chunks.
+
+    The chunks of an upload are appended to a part file in the `uploads`
+    folder and hashed as they arrive. Completing the upload starts parsing
+    the file in the background, unless a file with the same content and
+    name has already been parsed (see `read_uploaded_dataframe`).
+
+    The routes are not registered in WASM, where the browser cannot request
+    them, and uploads fall back to base64 `dcc.Upload` contents.
+
+    Args:
+        app: The Dash app.
+        ttl: Seconds that an unfinished upload is kept. Defaults to 600.
+    """
+    global UPLOAD_URL_PREFIX, UPLOAD_TTL
+
+    if sys.platform == "emscripten":
+        return
+
+    import flask
+
+    UPLOAD_TTL = ttl
+
+    route = app.config.routes_pathname_prefix + "_xiplot/upload/<upload_id>"
+    UPLOAD_URL_PREFIX = app.config.requests_pathname_prefix + "_xiplot/upload/"
+
+    @app.server.route(route, methods=["POST"])
+    def upload_chunk(upload_id):
+        expire_uploads()
+        if not UPLOAD_ID_PATTERN.match(upload_id):
+            flask.abort(400)
+        offset = flask.request.args.get("offset", 0, type=int)
+
+        with UPLOADS_LOCK:
+            upload = UPLOADS.get(upload_id)
+            if upload is None and offset == 0:
+                UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+                path = UPLOAD_DIR / f"{upload_id}.part"
+                path.write_bytes(b"")
+                upload = [path, hashlib.sha256(), 0, 0.0, False]
+                UPLOADS[upload_id] = upload
+            if upload is None or upload[4] or upload[2] != offset:
+                # Chunks have to arrive in order
+                flask.abort(409)
+            upload[4] = True
+
+        # Other uploads are not blocked while the chunk is received
+        path, digest, size, _, _ = upload
+        try:
+            with open(path, "ab") as file:
+                for chunk in iter(
+                    lambda: flask.request.stream.read(2**16), b""
+                ):
+                    file.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+        except BaseException:
+            # The hash cannot be rewound, so the upload has to start over
+            with UPLOADS_LOCK:
+                UPLOADS.pop(upload_id, None)
+            _unlink(path)
+            raise
+
+        with UPLOADS_LOCK:
+            upload[2] = size
+            upload[3] = time.time() + UPLOAD_TTL
+            upload[4] = False
+
+        return flask.jsonify(size=size)
+
+    @app.server.route(route + "/complete", methods=["POST"])
+    def upload_complete(upload_id):
+        filename = Path(flask.request.args.get("filename", "")).name
+        with UPLOADS_LOCK:
+            upload = UPLOADS.get(upload_id)
+            if upload is not None and upload[4]:
+                # A chunk is still being received
+                flask.abort(409)
+            UPLOADS.pop(upload_id, None)
+        if upload is None or not filename:
+            flask.abort(400)
+        path, digest, size, _, _ = upload
+        digest = digest.hexdigest()
+        parse_upload(path, filename, digest)
+        return flask.jsonify(hash=digest, filename=filename, size=size)
+
+
+def expire_uploads():
+    now = time.time()
+    with UPLOADS_LOCK:
+        expired = [u for u, d in UPLOADS.items() if d[3] < now and not d[4]]
+        for upload_id in expired:
+            _unlink(UPLOADS.pop(upload_id)[0])
+        # Parses of abandoned uploads (or failed parses) that were not read
+        for key in [k for k, (_, e) in PARSES.items() if e < now]:
+            del PARSES[key]
+
+
+def hash_file(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(2**20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def parse_upload(path, filename: str, digest: str) -> Future:
+    """Parse an uploaded file on a background thread and delete it.
+
+    Files whose content and name match an earlier upload are not parsed
+    again, the earlier result is reused instead.
+
+    Args:
+        path: Path to the uploaded file.
+        filename: The name of the uploaded file.
+        digest: The SHA-256 hash of the file content.
+
+    Returns:
+        A future of the data frame, auxiliary data frame and metadata.
+    """
+    from xiplot.utils.dataframe import (
+        DATAFRAME_CACHE,
+        read_dataframe_with_extension,
+    )
+
+    key = ("upload", digest, filename)
+    with UPLOADS_LOCK:
+        entry = PARSES.get(key)
+        parsed = entry is not None
+        if parsed:
+            future = entry[0]
+        else:
+            future = Future()
+            value = DATAFRAME_CACHE.get(key)
+            parsed = value is not None
+            if parsed:
+                future.set_result(value)
+            elif not Path(path).exists():
+                # E.g. the parse of an earlier upload has expired
+                future.set_exception(
+                    FileNotFoundError(
+                        f"The upload of {filename} has expired, please upload"
+                        " the file again"
+                    )
+                )
+                return future
+            else:
+                PARSES[key] = [future, float("inf")]
+    if parsed:
+        _unlink(path)
+        return future
+
+    def parse():
+        value, error = None, None
+        try:
+            value = read_dataframe_with_extension(path, filename)
+            DATAFRAME_CACHE.set(key, value)
+        except BaseException as err:
+            error = err
+        finally:
+            _unlink(path)
+            # The result is kept until it is read (or it expires)
+            with UPLOADS_LOCK:
+                entry = PARSES.get(key)
+                if entry is not None and entry[0] is future:
+                    entry[1] = time.time() + UPLOAD_TTL
+        if error is None:
+            future.set_result(value)
+        else:
+            future.set_exception(error)
+
+    if sys.platform == "emscripten":
+        parse()
+    else:
+        Thread(target=parse, daemon=True).start()
+    return future
+
+
+def read_uploaded_dataframe(path, filename: str, digest: Optional[str] = None):
+    """Read an uploaded data file, reusing the result for files with the same
+    content and name. The file is deleted afterwards.
+
+    Parameters:
+
+        path: Path to the uploaded file (ignored if it has been parsed)
+        filename: The name of the uploaded file
+        digest: The SHA-256 hash of the file content (computed if None)
+
+    Returns:
+
+        df: Pandas data frame
+        aux: Pandas data frame
+        meta: dictionary of metadata
+    """
+    if digest is None:
+        digest = hash_file(path)
+    future = parse_upload(path, filename, digest)
+    try:
+        df, aux, meta = future.result()
+    finally:
+        # Later uploads of the same file are found in the dataframe cache
+        with UPLOADS_LOCK:
+            entry = PARSES.get(("upload", digest, filename))
+            if entry is not None and entry[0] is future:
+                del PARSES[("upload", digest, filename)]
+    return df.copy(), aux.copy(), deepcopy(meta)
+
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def clientside_upload() -> str:
+    """A clientside callback that sends the contents of a `dcc.Upload` to
+    the upload route in chunks, and returns the result of the upload."""
+    return """
+async function (contents, filename) {
+    if (!contents) {
+        throw window.dash_clientside.PreventUpdate;
+    }
+    try {
+        const blob = await (await fetch(contents)).blob();
+        const url = %s + Date.now().toString(36)
+            + Math.random().toString(36).slice(2);
+        let offset = 0;
+        do {
+            const chunk = blob.slice(offset, offset + %d);
+            const response = await fetch(
+                url + "?offset=" + offset, {method: "POST", body: chunk}
+            );
+            if (!response.ok) {
+                throw new Error(response.statusText);
+            }
+            offset += chunk.size;
+        } while (offset < blob.size);
+        const response = await fetch(
+            url + "/complete?filename=" + encodeURIComponent(filename),
+            {method: "POST"}
+        );
+        if (!response.ok) {
+            throw new Error(response.statusText);
+        }
+        return [null, null, await response.json()];
+    } catch (err) {
+        return [null, null, {filename: filename, error: String(err)}];
+    }
+}
+""" % (
+        json.dumps(UPLOAD_URL_PREFIX),
+        UPLOAD_CHUNK_SIZE,
+    )